@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+bench_strategies.py
+
+Offline benchmark of configuration-search strategies on the recorded sweep,
+using :class:`replay.ReplayEvaluator` so no kernel is ever run.
+
+Strategies (each one an ask / tell object, like :class:`tuner.TPETuner`):
+
+* ``random``       – recorded configurations in random order.
+* ``top10``        – configurations ordered by how often they fall in the
+  robust top-10 % subset (``get_best_subset_of_params.top_subsets``) of the
+  *other* kernels, then random.  Leave-one-kernel-out, so the kernel's own
+  results never leak into its ordering.
+* ``llm``          – ``seed_configs`` of the kernel's seed-picker answer
+  (``-seeds``, JSONL from ``batch_seeds.py``), then random.
+* ``bayesian``     – :class:`tuner.TPETuner` from scratch.
+* ``bayesian+llm`` – :class:`tuner.TPETuner` warm-started from the seeds.
+
+The incumbent after each evaluation is the configuration with the best
+*observed* (noisy) median; its regret is measured against the *true* median
+over all recorded repeats:  ``true(incumbent) / true(best) - 1``.  Per
+strategy the report gives the median number of evaluations until the
+incumbent is within ``-tolerance`` (5 %) of the best, how often that
+happened within the budget, and the mean and median regret curves (the
+table prints the median: a few kernels with 50x slow corners dominate the
+mean).
+
+``-parity REFERENCE CANDIDATE`` compares two seed JSONL files instead (e.g. the
+fp16 and a quantised GGUF picker): per kernel, how often the top-ranked value
+of each knob agrees, the overlap of the value sets, and the regret of the best
+of the first 1 / 3 / 9 ``seed_configs`` for both.
+
+Example
+-------
+python bench_strategies.py -csv ../performance_data/all_results_amd.csv -budget 30 -trials 5
+python bench_strategies.py -csv ../performance_data/all_results_amd.csv -executable 'DRB0*' \
+    -seeds ../seed/seeds.jsonl -output bench.json -curves curves.csv
+python bench_strategies.py -csv ../performance_data/all_results_amd.csv \
+    -parity ../seed/seeds_fp16.jsonl ../seed/seeds_q4.jsonl
+"""
+
+from __future__ import annotations
+
+import argparse
+import collections
+import json
+import math
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from replay import REPLAY_KNOBS, ReplayEvaluator, config_key, load_tables
+from tuner import TPETuner, _key, seed_configs
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "utils"))
+from get_best_subset_of_params import resolve_executables, top_subsets  # noqa: E402
+from perf_store import load_results  # noqa: E402
+
+STRATEGIES = ("random", "top10", "llm", "bayesian", "bayesian+llm")
+TOLERANCE = 0.05
+REPORT_AT = (1, 5, 10, 20, 30, 50)
+PARITY_AT = (1, 3, 9)
+
+
+class OrderedStrategy:
+    """Ask / tell wrapper around a fixed evaluation order."""
+
+    def __init__(self, order: List[Dict[str, Any]], budget: int):
+        self.order = order
+        self.budget = budget
+        self.history: List[tuple] = []
+        self._next = 0
+
+    def ask(self) -> Dict[str, Any] | None:
+        if len(self.history) >= self.budget or self._next >= len(self.order):
+            return None
+        cfg = self.order[self._next]
+        self._next += 1
+        return cfg
+
+    def tell(self, params: Dict[str, Any], value: float):
+        self.history.append((dict(params), value))
+
+
+def _then_random(first: List[Dict[str, Any]], configs: List[Dict[str, Any]],
+                 rng: np.random.Generator) -> List[Dict[str, Any]]:
+    seen = {_key(c) for c in first}
+    rest = [configs[i] for i in rng.permutation(len(configs)) if _key(configs[i]) not in seen]
+    return list(first) + rest
+
+
+def top10_priors(df, names: List[str], n_boot: int = 200) -> Dict[str, List[Dict[str, Any]]]:
+    """Per kernel, configs ranked by top-10 % membership among the other kernels."""
+    subsets = top_subsets(df, names, n_boot=n_boot)
+    members = {exe: {config_key(r) for r in sub["stats"]} for exe, sub in subsets.items()}
+    total = collections.Counter(k for keys in members.values() for k in keys)
+    priors = {}
+    for exe in names:
+        counts = total.copy()
+        counts.subtract(members.get(exe, ()))
+        ranked = [k for k, c in counts.most_common() if c > 0]
+        priors[exe] = [dict(zip(REPLAY_KNOBS, k)) for k in ranked]
+    return priors
+
+
+def load_seeds(path: Path | None) -> Dict[str, Dict[str, Any]]:
+    """``{kernel: seeds}`` from a ``batch_seeds.py`` JSONL file."""
+    if path is None:
+        return {}
+    seeds = {}
+    with open(path) as fp:
+        for line in fp:
+            if line.strip():
+                rec = json.loads(line)
+                if rec.get("seeds"):
+                    seeds[rec["kernel"]] = rec["seeds"]
+    return seeds
+
+
+def make_strategy(name: str, evaluator: ReplayEvaluator, budget: int, rng: np.random.Generator,
+                  prior: List[Dict[str, Any]], seeds: Dict[str, Any] | None):
+    configs = evaluator.configs()
+    space = evaluator.space()
+    if name == "random":
+        return OrderedStrategy(_then_random([], configs, rng), budget)
+    if name == "top10":
+        # configs the sweep never ran for this kernel cannot be replayed
+        prior = [c for c in prior if config_key(c) in evaluator.table]
+        return OrderedStrategy(_then_random(prior, configs, rng), budget)
+    if name == "llm":
+        return OrderedStrategy(_then_random(seed_configs(seeds, space), configs, rng), budget)
+    tuner_seeds = seeds if name == "bayesian+llm" else None
+    return TPETuner(space, tuner_seeds, budget=budget, patience=0,
+                    random_state=int(rng.integers(2 ** 31)))
+
+
+def run_trial(strategy, evaluator: ReplayEvaluator, budget: int) -> List[float]:
+    """Regret of the incumbent after each of (up to) *budget* evaluations."""
+    best = evaluator.best_median
+    incumbent, observed = None, math.inf
+    regrets: List[float] = []
+    while len(regrets) < budget:
+        cfg = strategy.ask()
+        if cfg is None:
+            break
+        res = evaluator.evaluate(cfg)
+        value = res.median if res.correct else math.inf
+        strategy.tell(cfg, value)
+        if value < observed:
+            incumbent, observed = cfg, value
+        regrets.append(evaluator.true_median(incumbent) / best - 1 if incumbent else math.inf)
+    # an exhausted strategy keeps its incumbent for the rest of the budget
+    regrets += regrets[-1:] * (budget - len(regrets))
+    return regrets
+
+
+def evals_to_tolerance(regrets: List[float], tolerance: float) -> int | None:
+    for i, r in enumerate(regrets):
+        if r <= tolerance:
+            return i + 1
+    return None
+
+
+def benchmark(tables, names: List[str], strategies: List[str], budget: int, trials: int,
+              priors: Dict[str, List], seeds: Dict[str, Dict], tolerance: float = TOLERANCE,
+              repeats: int = 5, random_state: int = 0,
+              progress: Callable[[str], None] | None = None) -> Dict[str, Dict[str, Any]]:
+    rng = np.random.default_rng(random_state)
+    curves = {s: [] for s in strategies}
+    hits = {s: [] for s in strategies}
+    for exe in names:
+        for s in strategies:
+            if s in ("llm", "bayesian+llm") and exe not in seeds:
+                continue
+            for _ in range(trials):
+                ev = ReplayEvaluator(tables[exe], repeats=repeats, name=exe,
+                                     random_state=int(rng.integers(2 ** 31)))
+                strat = make_strategy(s, ev, budget, rng, priors.get(exe, []), seeds.get(exe))
+                regrets = run_trial(strat, ev, budget)
+                curves[s].append(regrets)
+                hits[s].append(evals_to_tolerance(regrets, tolerance))
+        if progress:
+            progress(exe)
+
+    report = {}
+    for s in strategies:
+        if not curves[s]:
+            continue
+        runs = np.array(curves[s])
+        reached = [h for h in hits[s] if h is not None]
+        report[s] = {
+            "runs": len(hits[s]),
+            "reached": round(len(reached) / len(hits[s]), 4),
+            "median_evals_to_tolerance": float(np.median(reached)) if reached else None,
+            "mean_regret": [round(float(r), 5) for r in runs.mean(axis=0)],
+            "median_regret": [round(float(r), 5) for r in np.median(runs, axis=0)],
+        }
+    return report
+
+
+def seed_regret(seeds: Dict[str, Any], table, at=PARITY_AT) -> List[float]:
+    """Regret of the best of the first *n* seed configurations, per *n* in *at*."""
+    ev = ReplayEvaluator(table)
+    configs = seed_configs(seeds, ev.space())
+    return [min((ev.true_median(c) for c in configs[:n]), default=math.inf) / ev.best_median - 1
+            for n in at]
+
+
+def seed_parity(tables, names: List[str], reference: Dict[str, Dict], candidate: Dict[str, Dict],
+                tolerance: float = TOLERANCE, at=PARITY_AT) -> Dict[str, Any]:
+    """Seed quality of *candidate* against *reference* on the kernels both answered."""
+    rows = []
+    for exe in names:
+        ref, cand = reference.get(exe), candidate.get(exe)
+        if not ref or not cand:
+            continue
+        knobs = [k for k in REPLAY_KNOBS if ref.get(k) and cand.get(k)]
+        top1 = [str(ref[k][0]).lower() == str(cand[k][0]).lower() for k in knobs]
+        overlap = []
+        for k in knobs:
+            a, b = ({str(v).lower() for v in s[k]} for s in (ref, cand))
+            overlap.append(len(a & b) / len(a | b))
+        rows.append({"kernel": exe,
+                     "top1_agree": float(np.mean(top1)) if top1 else math.nan,
+                     "overlap": float(np.mean(overlap)) if overlap else math.nan,
+                     "reference": seed_regret(ref, tables[exe], at),
+                     "candidate": seed_regret(cand, tables[exe], at)})
+    if not rows:
+        return {"kernels": 0, "rows": []}
+    ref = np.array([r["reference"] for r in rows])
+    cand = np.array([r["candidate"] for r in rows])
+    return {"kernels": len(rows),
+            "top1_agree": float(np.nanmean([r["top1_agree"] for r in rows])),
+            "overlap": float(np.nanmean([r["overlap"] for r in rows])),
+            "at": list(at),
+            "median_regret_reference": [float(v) for v in np.median(ref, axis=0)],
+            "median_regret_candidate": [float(v) for v in np.median(cand, axis=0)],
+            # the candidate is "as good" on a kernel if within tolerance of the reference
+            "as_good": [float(v) for v in np.mean(cand <= (1 + ref) * (1 + tolerance) - 1, axis=0)],
+            "rows": rows}
+
+
+def print_parity(parity: Dict[str, Any], tolerance: float):
+    if not parity["kernels"]:
+        print("No kernel has seeds in both files.")
+        return
+    print(f"{parity['kernels']} kernel(s); top-ranked value agrees on {parity['top1_agree']:.0%} "
+          f"of the knobs, value sets overlap {parity['overlap']:.0%}")
+    print(f"{'':<22}" + "".join(f"{'reg@' + str(n):>9}" for n in parity["at"]))
+    print(f"{'reference':<22}" + "".join(f"{v:>9.1%}" for v in parity["median_regret_reference"]))
+    print(f"{'candidate':<22}" + "".join(f"{v:>9.1%}" for v in parity["median_regret_candidate"]))
+    print(f"{'as good (' + format(tolerance, '.0%') + ')':<22}" + "".join(f"{v:>9.0%}" for v in parity["as_good"]))
+
+
+def print_report(report: Dict[str, Dict[str, Any]], budget: int, tolerance: float):
+    at = [n for n in REPORT_AT if n <= budget]
+    head = f"{'strategy':<14}{'runs':>6}{'reached':>9}{'evals@' + format(tolerance, '.0%'):>10}"
+    print(head + "".join(f"{'reg@' + str(n):>9}" for n in at))
+    for s, r in report.items():
+        evals = r["median_evals_to_tolerance"]
+        line = f"{s:<14}{r['runs']:>6}{r['reached']:>9.0%}{(f'{evals:g}' if evals else '-'):>10}"
+        print(line + "".join(f"{r['median_regret'][n - 1]:>9.1%}" for n in at))
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Replay benchmark of configuration-search strategies.")
+    parser.add_argument("-csv", type=Path, required=True, help="Sweep CSV.")
+    parser.add_argument("-executable", nargs="+", default=None,
+                        help="Executable names or glob patterns (default: all).")
+    parser.add_argument("-strategies", nargs="+", choices=STRATEGIES, default=list(STRATEGIES))
+    parser.add_argument("-seeds", type=Path, default=None, help="Seed JSONL from batch_seeds.py.")
+    parser.add_argument("-parity", type=Path, nargs=2, default=None, metavar=("REFERENCE", "CANDIDATE"),
+                        help="Compare the seed quality of two seed JSONL files instead.")
+    parser.add_argument("-budget", type=int, default=30, help="Evaluations per run (default: %(default)s).")
+    parser.add_argument("-trials", type=int, default=5, help="Runs per kernel and strategy (default: %(default)s).")
+    parser.add_argument("-repeats", type=int, default=5, help="Recorded repeats drawn per evaluation.")
+    parser.add_argument("-tolerance", type=float, default=TOLERANCE, help="Within this of the best (default: 0.05).")
+    parser.add_argument("-random-state", type=int, default=0)
+    parser.add_argument("-output", type=Path, default=None, help="Write the full report as JSON.")
+    parser.add_argument("-curves", type=Path, default=None, help="Write median regret curves as CSV.")
+    return parser
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    df = load_results(args.csv)
+    tables = load_tables(args.csv)
+    names = resolve_executables(tables, args.executable)
+    if args.parity:
+        parity = seed_parity(tables, names, *(load_seeds(p) for p in args.parity), args.tolerance)
+        print_parity(parity, args.tolerance)
+        if args.output:
+            args.output.parent.mkdir(parents=True, exist_ok=True)
+            with open(args.output, "w") as fp:
+                json.dump(parity, fp, indent=2)
+        return
+    priors = top10_priors(df, sorted(tables)) if "top10" in args.strategies else {}
+    seeds = load_seeds(args.seeds)
+    if args.seeds is not None:
+        print(f"Seeds for {len(set(seeds) & set(names))}/{len(names)} kernel(s).", file=sys.stderr)
+
+    report = benchmark(tables, names, args.strategies, args.budget, args.trials, priors, seeds,
+                       args.tolerance, args.repeats, args.random_state,
+                       progress=lambda exe: print(f"  {exe}", file=sys.stderr))
+    print_report(report, args.budget, args.tolerance)
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w") as fp:
+            json.dump({"kernels": names, "budget": args.budget, "trials": args.trials,
+                       "tolerance": args.tolerance, "strategies": report}, fp, indent=2)
+    if args.curves:
+        args.curves.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.curves, "w") as fp:
+            fp.write("evaluations," + ",".join(report) + "\n")
+            for i in range(args.budget):
+                fp.write(f"{i + 1}," + ",".join(str(r["median_regret"][i]) for r in report.values()) + "\n")
+
+
+if __name__ == "__main__":
+    main()
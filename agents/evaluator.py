@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+evaluator.py
+
+Real replacement for the old ``evaluate_kernel`` stub: compile an OpenMP kernel
+once, run it under a given OMP_NUM_THREADS / OMP_PROC_BIND / OMP_SCHEDULE /
+OMP_PLACES environment with warm-up and repeat counts, check its output against
+the reference checksum and return timing statistics.
+
+Kernel contract
+---------------
+* The checksum is the last non-empty line on stdout (one or more numbers or a
+  plain string).  Numbers are compared with a relative tolerance, so reduction
+  order differences between thread counts are not flagged.
+* If the kernel prints ``TIME: <seconds>`` that value is used as the run time
+  (excludes process start-up); otherwise the wall-clock of the process is used.
+
+With a :class:`result_cache.ResultCache` attached, a configuration that is
+already cached for (kernel, machine) with at least ``repeats`` timings is
+answered from the cache without launching the kernel.
+
+``evaluate`` can also be driven incrementally (see racing.py): *repeats*
+overrides the default count, *resume* continues an earlier result with only
+the missing runs, and a run that exceeds *cutoff* seconds is killed and the
+result is flagged ``pruned``.
+
+Example
+-------
+python evaluator.py -src ../kernels/axpy.c -threads 4 -bind close -schedule static \
+    -correct 3.666784e+06 -repeats 5 -max-cores 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Sequence, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "utils"))
+from machines import local_machine  # noqa: E402
+from result_cache import DEFAULT_CC, DEFAULT_CFLAGS, build_id, kernel_key  # noqa: E402
+from search_space import to_env  # noqa: E402
+from tracing import count, span  # noqa: E402
+
+if TYPE_CHECKING:
+    from result_cache import ResultCache
+
+SOURCE_SUFFIXES = {".c", ".cc", ".cpp", ".cxx"}
+TIME_RE = re.compile(r"^TIME:\s*([0-9.eE+-]+)\s*$", re.M)
+OMP_KNOBS = ("OMP_NUM_THREADS", "OMP_PROC_BIND", "OMP_SCHEDULE", "OMP_SCHEDULE_CHUNK", "OMP_PLACES",
+             "OMP_WAIT_POLICY", "GOMP_SPINCOUNT", "KMP_BLOCKTIME")
+KILL_GRACE = 0.5   # s of process start-up allowed on top of a cutoff before the kill
+
+
+@dataclass
+class EvalResult:
+    """Outcome of one :meth:`KernelEvaluator.evaluate` call."""
+
+    params: Dict[str, Any]
+    correct: bool
+    times: List[float] = field(default_factory=list)
+    output: str = ""
+    error: str | None = None
+    cached: bool = False
+    pruned: bool = False
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.times) if self.times else math.inf
+
+    @property
+    def mean(self) -> float:
+        return statistics.fmean(self.times) if self.times else math.inf
+
+    @property
+    def stdev(self) -> float:
+        return statistics.stdev(self.times) if len(self.times) > 1 else 0.0
+
+    @property
+    def best(self) -> float:
+        return min(self.times) if self.times else math.inf
+
+    def summary(self) -> Dict[str, Any]:
+        return {"params": self.params,
+                "correct": self.correct,
+                "n": len(self.times),
+                "median": self.median,
+                "mean": self.mean,
+                "stdev": self.stdev,
+                "min": self.best,
+                "error": self.error,
+                "cached": self.cached,
+                "pruned": self.pruned}
+
+
+def _tokens(value: Any) -> List[str]:
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value]
+    return str(value).split()
+
+
+def checksum_line(output: str) -> str | None:
+    """The checksum: last non-empty stdout line that is not a ``TIME:`` line."""
+    lines = [ln for ln in output.splitlines() if ln.strip() and not TIME_RE.match(ln)]
+    return lines[-1] if lines else None
+
+
+def checksum_matches(output: str, correct_result: Any, rtol: float = 1e-6) -> bool:
+    """Compare the last non-empty stdout line against *correct_result*."""
+    line = checksum_line(output)
+    if line is None:
+        return False
+    got, want = _tokens(line), _tokens(correct_result)
+    if len(got) != len(want):
+        return False
+    for g, w in zip(got, want):
+        try:
+            if not math.isclose(float(g), float(w), rel_tol=rtol, abs_tol=0.0):
+                return False
+        except ValueError:
+            if g != w:
+                return False
+    return True
+
+
+def omp_env(params: Dict[str, Any], max_cores: int | None = None,
+            base: Dict[str, str] | None = None) -> Dict[str, str]:
+    """Environment for one run; thread count is capped at *max_cores*.
+
+    Any knob of ``search_space`` is passed through (``OMP_SCHEDULE_CHUNK`` is
+    folded into ``OMP_SCHEDULE=<kind>,<chunk>``).
+    """
+    env = dict(os.environ if base is None else base)
+    env.update(to_env({k: v for k, v in params.items() if k in OMP_KNOBS}))
+    if max_cores is not None and "OMP_NUM_THREADS" in env:
+        env["OMP_NUM_THREADS"] = str(min(int(env["OMP_NUM_THREADS"]), max_cores))
+    return env
+
+
+class KernelEvaluator:
+    """Compile-once, run-many evaluator for one kernel.
+
+    *kernel* is either a C/C++ source file (compiled into *build_dir*, keyed by
+    a hash of source + compiler flags so it is only rebuilt on change) or an
+    already built executable.  *max_cores* caps OMP_NUM_THREADS and pins runs
+    to the first *max_cores* CPUs this process may use.
+
+    *cache* / *machine* / *kernel_id* enable the persistent result cache;
+    *kernel_id* should be the LLVM-IR content hash (defaults to the hash of
+    *kernel* itself) and *machine* a descriptor from ``utils/machines.py``.
+    The build (*cc* + *cflags*) and the kernel's *args* are part of the cache
+    key (:func:`result_cache.kernel_key`, as for imported sweeps), and a
+    cached checksum is compared against each call's *correct_result* again.
+    """
+
+    def __init__(
+        self,
+        kernel: Path,
+        args: Sequence[str] = (),
+        build_dir: Path = Path(".build"),
+        cc: str = DEFAULT_CC,
+        cflags: Sequence[str] = DEFAULT_CFLAGS,
+        warmup: int = 1,
+        repeats: int = 5,
+        max_cores: int | None = None,
+        timeout: float | None = 600.0,
+        rtol: float = 1e-6,
+        cache: ResultCache | None = None,
+        machine: Dict[str, Any] | None = None,
+        kernel_id: str | None = None,
+    ):
+        self.kernel = Path(kernel)
+        self.args = list(args)
+        self.build_dir = Path(build_dir)
+        self.cc = cc
+        self.cflags = list(cflags)
+        self.warmup = warmup
+        self.repeats = repeats
+        self.max_cores = max_cores
+        self.timeout = timeout
+        self.rtol = rtol
+        self.cache = cache
+        self.machine = machine
+        self.kernel_id = kernel_id
+        self._exe: Path | None = None
+
+    # -- build --------------------------------------------------------------- #
+    @property
+    def kernel_hash(self) -> str:
+        h = hashlib.sha256(self.kernel.read_bytes())
+        if self.kernel.suffix in SOURCE_SUFFIXES:
+            h.update(" ".join([self.cc] + self.cflags).encode())
+        return h.hexdigest()
+
+    @property
+    def cache_kernel(self) -> str:
+        """Result-cache kernel key: *kernel_id*, the build and the run arguments."""
+        if self.kernel_id is None:
+            # a source hash already covers the build
+            return kernel_key(self.kernel_hash, args=self.args)
+        return kernel_key(self.kernel_id, build_id(self.cc, self.cflags), self.args)
+
+    def compile(self) -> Path:
+        """Build the kernel (once) and return the executable path."""
+        if self._exe is not None:
+            return self._exe
+        if self.kernel.suffix not in SOURCE_SUFFIXES:
+            self._exe = self.kernel.resolve()
+            return self._exe
+
+        exe = self.build_dir / f"{self.kernel.stem}-{self.kernel_hash[:12]}"
+        if not exe.exists():
+            self.build_dir.mkdir(parents=True, exist_ok=True)
+            cmd = [self.cc, *self.cflags, str(self.kernel), "-o", str(exe)]
+            with span("kernel.compile", kernel=self.kernel.name):
+                proc = subprocess.run(cmd, capture_output=True, text=True)
+            if proc.returncode != 0:
+                raise RuntimeError(f"Compilation failed ({' '.join(cmd)}):\n{proc.stderr}")
+        self._exe = exe.resolve()
+        return self._exe
+
+    # -- run ----------------------------------------------------------------- #
+    def _allowed_cpus(self, cpus: Sequence[int] | None) -> List[int] | None:
+        if cpus is not None:
+            return list(cpus)
+        if self.max_cores is None:
+            return None
+        return sorted(os.sched_getaffinity(0))[:self.max_cores]
+
+    def run_once(self, env: Dict[str, str], cpus: Sequence[int] | None = None,
+                 timeout: float | None = None) -> Tuple[float, str]:
+        """One execution; returns (seconds, stdout)."""
+        exe = self.compile()
+        preexec = (lambda: os.sched_setaffinity(0, cpus)) if cpus else None
+        count("kernel.runs")
+        with span("kernel.run"):
+            t0 = time.perf_counter()
+            proc = subprocess.run([str(exe), *self.args], env=env, capture_output=True,
+                                  text=True, timeout=timeout or self.timeout,
+                                  preexec_fn=preexec)
+            wall = time.perf_counter() - t0
+        if proc.returncode != 0:
+            raise RuntimeError(f"{exe.name} exited with {proc.returncode}:\n{proc.stderr}")
+        m = TIME_RE.search(proc.stdout)
+        return (float(m.group(1)) if m else wall), proc.stdout
+
+    def evaluate(self, params: Dict[str, Any], correct_result: Any,
+                 cpus: Sequence[int] | None = None, repeats: int | None = None,
+                 cutoff: float | None = None, resume: EvalResult | None = None) -> EvalResult:
+        """Warm up, then time ``repeats`` runs of the kernel under *params*.
+
+        With *resume* the earlier timings are kept, the warm-up is skipped and
+        only the runs still missing up to *repeats* are made.  A run (warm-up
+        included) that takes longer than *cutoff* seconds is killed and the
+        result comes back ``pruned`` and not correct.
+        """
+        count("evaluations")
+        with span("evaluate", params=dict(params), cutoff=cutoff) as sp:
+            result = self._evaluate(params, correct_result, cpus, repeats, cutoff, resume)
+            sp.set(runs=len(result.times), correct=result.correct,
+                   pruned=result.pruned, cached=result.cached)
+        return result
+
+    def _evaluate(self, params: Dict[str, Any], correct_result: Any,
+                  cpus: Sequence[int] | None, repeats: int | None,
+                  cutoff: float | None, resume: EvalResult | None) -> EvalResult:
+        repeats = self.repeats if repeats is None else repeats
+        cpus = self._allowed_cpus(cpus)
+        cap = self.max_cores if cpus is None else min(len(cpus), self.max_cores or len(cpus))
+        env = omp_env(params, cap)
+        result = EvalResult(params=dict(params), correct=False)
+        if resume is not None:
+            result.times, result.output = list(resume.times), resume.output
+
+        # key the cache on what actually runs (thread count after capping)
+        effective = {k: env[k] for k in to_env(params) if k in OMP_KNOBS}
+        if self.cache is not None:
+            if self.machine is None:
+                self.machine = local_machine()
+            hit = self.cache.get(self.cache_kernel, self.machine, effective)
+            if hit is not None and len(hit[0]) >= repeats:
+                result.times, correct, checksum = hit
+                # imported sweeps carry no output: their stored flag is all there is
+                result.correct = correct if checksum is None else \
+                    checksum_matches(checksum, correct_result, self.rtol)
+                result.output = checksum or ""
+                result.cached = True
+                return result
+
+        # the wall-clock kill allows for start-up; a reported TIME: above the
+        # cutoff is caught after the run
+        timeout = self.timeout if cutoff is None else min(cutoff + KILL_GRACE, self.timeout or math.inf)
+        pruned = False
+        try:
+            for _ in range(self.warmup if resume is None else 0):
+                self.run_once(env, cpus, timeout)
+            while len(result.times) < repeats:
+                seconds, result.output = self.run_once(env, cpus, timeout)
+                if cutoff is not None and seconds > cutoff:
+                    pruned = True
+                    raise subprocess.TimeoutExpired(str(self.compile()), cutoff)
+                result.times.append(seconds)
+        except subprocess.TimeoutExpired as exc:
+            result.error = str(exc)
+            # a wall-clock kill is a prune once the run got past the cutoff;
+            # killed earlier, it hit the evaluator's own timeout
+            result.pruned = pruned or (cutoff is not None and exc.timeout >= cutoff)
+            return result
+        except (RuntimeError, OSError) as exc:     # OSError: binary not executable, ENOEXEC, ...
+            result.error = str(exc)
+            return result
+        result.correct = checksum_matches(result.output, correct_result, self.rtol) and \
+            (resume is None or resume.correct)
+        if self.cache is not None:
+            self.cache.put(self.cache_kernel, self.machine, effective,
+                           result.times, result.correct, output=checksum_line(result.output))
+        return result
+
+
+def evaluate_kernel(params: Dict[str, Any], correct_result: List[Any] | Any,
+                    evaluator: KernelEvaluator) -> Tuple[bool, float]:
+    """Run the kernel under *params*; returns (is_correct, median seconds)."""
+    result = evaluator.evaluate(params, correct_result)
+    return result.correct, result.median
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Compile and time an OpenMP kernel under one configuration.")
+    parser.add_argument("-src", type=Path, required=True, help="Kernel source (.c/.cpp) or prebuilt executable.")
+    parser.add_argument("-args", nargs="*", default=[], help="Arguments passed to the kernel.")
+    parser.add_argument("-threads", type=int, default=None, help="OMP_NUM_THREADS")
+    parser.add_argument("-bind", type=str, default=None, help="OMP_PROC_BIND")
+    parser.add_argument("-schedule", type=str, default=None, help="OMP_SCHEDULE")
+    parser.add_argument("-chunk", type=int, default=None, help="Schedule chunk size (OMP_SCHEDULE=<kind>,<chunk>).")
+    parser.add_argument("-places", type=str, default=None, help="OMP_PLACES")
+    parser.add_argument("-wait-policy", type=str, default=None, help="OMP_WAIT_POLICY")
+    parser.add_argument("-correct", type=str, required=True, help="Reference checksum (last stdout line).")
+    parser.add_argument("-warmup", type=int, default=1, help="Warm-up runs (default: %(default)s).")
+    parser.add_argument("-repeats", type=int, default=5, help="Timed runs (default: %(default)s).")
+    parser.add_argument("-max-cores", type=int, default=None, help="Cap on cores / threads used by a run.")
+    parser.add_argument("-cache", type=Path, default=None, help="SQLite result cache to consult / fill.")
+    parser.add_argument("-machine", type=str, default=None, help="Machine preset (amd/intel) or JSON descriptor for cache keys.")
+    parser.add_argument("-ir", type=Path, default=None, help="LLVM-IR of the kernel; its hash (+ build and -args) is the cache key.")
+    return parser
+
+
+def main():
+    parser = build_arg_parser()
+    args = parser.parse_args()
+
+    params = {"OMP_NUM_THREADS": args.threads,
+              "OMP_PROC_BIND": args.bind,
+              "OMP_SCHEDULE": args.schedule,
+              "OMP_SCHEDULE_CHUNK": args.chunk,
+              "OMP_PLACES": args.places,
+              "OMP_WAIT_POLICY": args.wait_policy}
+    params = {k: v for k, v in params.items() if v is not None}
+
+    evaluator = KernelEvaluator(args.src, args=args.args, warmup=args.warmup,
+                                repeats=args.repeats, max_cores=args.max_cores)
+    if args.cache is not None:
+        from machines import resolve_machine
+        from result_cache import ResultCache, file_hash
+        evaluator.cache = ResultCache(args.cache)
+        evaluator.machine = resolve_machine(args.machine) if args.machine else None
+        if args.ir:
+            evaluator.kernel_id = file_hash(args.ir)
+    result = evaluator.evaluate(params, args.correct)
+    print(json.dumps(result.summary(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,138 +1,201 @@
+import asyncio
 import json
 import os
-import time
-from typing import Dict, List, Any, Tuple
-import requests
+import sys
+from typing import Dict, List, Any
 from pathlib import Path
 from prompt_gen import PromptGenerationAgent
 from seed_picker import SeedPickerAgent
+from evaluator import KernelEvaluator
+from scheduler import CoreScheduler, expand_candidates
+from racing import Racer, best_result
+from tuner import TPETuner
+from llm_client import OpenRouterClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "utils"))
+from machines import AMD_EPYC_9654  # noqa: E402
+from search_space import SearchSpace, omp_space  # noqa: E402
+from tracing import span  # noqa: E402
 from dotenv import load_dotenv
 
 load_dotenv()
 
-MAX_PROMPT_TOKENS = os.getenv('MAX_PROMPT_TOKENS') 
+MAX_PROMPT_TOKENS = int(os.getenv('MAX_PROMPT_TOKENS', 8000))
 OPENROUTER_ENDPOINT = os.getenv('OPEN_ROUTER_URL')
 OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')
 
-def call_openrouter(model: str, messages: List[Dict[str, str]], temperature: float = 0.4, **kwargs) -> str:
-    if OPENROUTER_API_KEY is None:
-        raise EnvironmentError("OPENROUTER_API_KEY environment variable not set.")
-
-    headers = {"Authorization": f"Bearer {OPENROUTER_API_KEY}", "Content-Type": "application/json"}
-    payload = {"model": model, "messages": messages, "temperature": temperature}
-    payload.update(kwargs)
-    response = requests.post(OPENROUTER_ENDPOINT, headers=headers, json=payload, timeout=180)
-    response.raise_for_status()
-    return response.json()["choices"][0]["message"]["content"]
-
-# def evaluate_kernel(params: Dict[str, Any], correct_result: List[Any] | Any) -> Tuple[bool, float]:
-#     """Simulate running the kernel under *params* and checking correctness.
-
-#     Replace this with actual compilation + measurement code that launches the
-#     kernel on the target system. The example simply sleeps and fakes numbers.
-#     """
-#     time.sleep(0.2)  # pretend compile/runtime cost
-#     import random
-#     is_correct = random.choice([True, False])  # replace with real check
-#     metric = random.uniform(0.5, 5.0)          # lower is better
-#     return is_correct, metric
-
-# class OptimisationOrchestrator:
-#     """High‑level driver gluing both agents + verification loop.
-
-#     ‑ *max_attempts* is capped at 5, per the user requirement.
-#     ‑ On success the final prompt is written to *final_prompt.txt*.
-#     """
-
-#     def __init__(
-#         self,
-#         pg_agent: PromptGenerationAgent,
-#         sp_agent: SeedPickerAgent,
-#         max_attempts: int = 5,
-#         prompt_out_path: str = "final_prompt.txt",
-#     ):
-#         self.pg_agent = pg_agent
-#         self.sp_agent = sp_agent
-#         self.max_attempts = max_attempts
-#         self.prompt_out_path = prompt_out_path
-
-#     def optimise(
-#         self,
-#         programl_json: Dict[str, Any],
-#         machine_info: Dict[str, Any],
-#         config_space: Dict[str, List[Any]],
-#         correct_result: Any,
-#     ) -> Dict[str, Any]:
-#         """Returns the best parameter set found (early exit if perfect)."""
-
-#         feedback: str | None = None
-#         best_params: Dict[str, Any] | None = None
-#         best_metric: float = float("inf")
-
-#         for attempt in range(self.max_attempts):
-#             # 1) Craft or refine prompt
-#             prompt_txt = self.pg_agent.generate_prompt(
-#                 programl_graph=programl_json,
-#                 machine_info=machine_info,
-#                 config_space=config_space,
-#                 attempt_idx=attempt,
-#                 previous_feedback=feedback,
-#             )
-
-#             # 2) Ask seed picker for params
-#             params = self.sp_agent.pick_parameters(prompt_txt)
-
-#             # 3) Evaluate
-#             is_correct, metric_val = evaluate_kernel(params, correct_result)
-#             feedback = (
-#                 f"Attempt {attempt + 1}: correctness={is_correct}; objective={metric_val:.4f}"
-#             )
-#             print(feedback)
-
-#             # 4) Keep best
-#             if is_correct and metric_val < best_metric:
-#                 best_metric = metric_val
-#                 best_params = params
-
-#             # 5) Early exit if perfect & short‑circuit
-#             if is_correct:
-#                 print("✅   Found correct parameter subset – stopping early.")
-#                 # Persist final prompt
-#                 with open(self.prompt_out_path, "w", encoding="utf-8") as fp:
-#                     fp.write(prompt_txt)
-#                 return best_params or params
-
-#         print("⚠️   Reached maximum attempts; returning best‑seen parameters (may be incorrect).")
-#         return best_params or params
+class OptimisationOrchestrator:
+    """High‑level driver gluing both agents + verification loop.
+
+    ‑ *max_attempts* is capped at 5, per the user requirement.
+    ‑ Candidates are run for real through *evaluator* (see evaluator.py).
+    ‑ With a *scheduler*, list-valued picks are expanded into all combinations
+      and evaluated concurrently on disjoint core sets (see scheduler.py).
+    ‑ With a *tuner_budget*, the first usable pick is treated as warm-start
+      seeds and a TPE search (see tuner.py) spends up to that many kernel
+      evaluations instead of re-asking the LLM.
+    ‑ With a *racer*, list-valued picks are raced with successive halving
+      (see racing.py) instead, and tuner runs slower than its kill factor
+      times the best so far are killed in flight.
+    ‑ Prompt generation, seed picking and every evaluation are traced when
+      ``AATUNE_TRACE`` is set (see utils/tracing.py).
+    ‑ On success the final prompt is written to *final_prompt.txt*.
+    """
+
+    def __init__(
+        self,
+        pg_agent: PromptGenerationAgent,
+        sp_agent: SeedPickerAgent,
+        evaluator: KernelEvaluator,
+        max_attempts: int = 5,
+        prompt_out_path: str = "final_prompt.txt",
+        scheduler: CoreScheduler | None = None,
+        tuner_budget: int | None = None,
+        racer: Racer | None = None,
+    ):
+        self.pg_agent = pg_agent
+        self.sp_agent = sp_agent
+        self.evaluator = evaluator
+        self.scheduler = scheduler
+        self.max_attempts = max_attempts
+        self.prompt_out_path = prompt_out_path
+        self.tuner_budget = tuner_budget
+        self.racer = racer
+        self.tuner: TPETuner | None = None
+
+    def optimise(
+        self,
+        programl_json: Dict[str, Any],
+        machine_info: Dict[str, Any],
+        config_space: Dict[str, List[Any]] | SearchSpace,
+        correct_result: Any,
+    ) -> Dict[str, Any]:
+        """Returns the best parameter set found (early exit if perfect)."""
+
+        feedback: str | None = None
+        best_params: Dict[str, Any] | None = None
+        best_metric: float = float("inf")
+
+        for attempt in range(self.max_attempts):
+            # 1) Craft or refine prompt
+            with span("prompt.generate", attempt=attempt):
+                prompt_txt = self.pg_agent.generate_prompt(
+                    programl_graph=programl_json,
+                    machine_info=machine_info,
+                    config_space=config_space,
+                    attempt_idx=attempt,
+                    previous_feedback=feedback,
+                )
+
+            # 2) Ask seed picker for params
+            with span("seed_picker.pick", attempt=attempt):
+                params = self.sp_agent.pick_parameters(prompt_txt)
+
+            # 2b) Seeds in hand: let the tuner spend the evaluation budget
+            if self.tuner_budget:
+                with open(self.prompt_out_path, "w", encoding="utf-8") as fp:
+                    fp.write(prompt_txt)
+                return self.tune(params, config_space, correct_result)
+
+            # 3) Evaluate (all combinations raced, or at once when a scheduler is available)
+            candidates = expand_candidates(params)
+            if isinstance(config_space, SearchSpace):
+                # drop combinations the space rules out (e.g. chunk with "auto")
+                candidates = [c for c in candidates if config_space.is_valid(c)] or candidates
+            if self.racer is not None:
+                result = best_result(self.racer.race(candidates, correct_result))
+                params = result.params
+            elif self.scheduler is not None:
+                results = self.scheduler.evaluate_many(candidates, correct_result)
+                result = min(results, key=lambda r: (not r.correct, r.median))
+                params = result.params
+            else:
+                result = self.evaluator.evaluate(params, correct_result)
+            is_correct, metric_val = result.correct, result.median
+            feedback = (
+                f"Attempt {attempt + 1}: correctness={is_correct}; objective={metric_val:.4f}"
+                f" (median of {len(result.times)} runs, stdev={result.stdev:.4f})"
+            )
+            if result.error:
+                feedback += f"; error: {result.error.splitlines()[0]}"
+            print(feedback)
+
+            # 4) Keep best
+            if is_correct and metric_val < best_metric:
+                best_metric = metric_val
+                best_params = params
+
+            # 5) Early exit if perfect & short‑circuit
+            if is_correct:
+                print("✅   Found correct parameter subset – stopping early.")
+                # Persist final prompt
+                with open(self.prompt_out_path, "w", encoding="utf-8") as fp:
+                    fp.write(prompt_txt)
+                return best_params or params
+
+        print("⚠️   Reached maximum attempts; returning best‑seen parameters (may be incorrect).")
+        return best_params or params
+
+    def tune(
+        self,
+        seeds: Dict[str, Any],
+        config_space: Dict[str, List[Any]] | SearchSpace,
+        correct_result: Any,
+    ) -> Dict[str, Any]:
+        """TPE search over *config_space* warm-started from *seeds*."""
+        self.tuner = TPETuner(config_space, seeds, budget=self.tuner_budget)
+        while (params := self.tuner.ask()) is not None:
+            cutoff = self.racer.kill_after(self.tuner.best[1]) if self.racer else None
+            result = self.evaluator.evaluate(params, correct_result, cutoff=cutoff)
+            value = result.median if result.correct else float("inf")
+            self.tuner.tell(params, value)
+            outcome = f"{value:.4f}s" if result.correct else "killed" if result.pruned else "incorrect"
+            print(f"Tuner eval {len(self.tuner.history)}: {json.dumps(params)} -> {outcome}")
+        best, value = self.tuner.best
+        print(f"Tuner stopped ({self.tuner.stop_reason}) after {len(self.tuner.history)} "
+              f"evaluation(s); best {value:.4f}s.")
+        return best
+
+async def seed_many(
+    pg_agent: PromptGenerationAgent,
+    sp_agent: SeedPickerAgent,
+    graphs: Dict[str, Dict[str, Any]],
+    machine_info: Dict[str, Any],
+    config_space: Dict[str, List[Any]] | SearchSpace,
+    max_concurrency: int = 8,
+) -> Dict[str, Dict[str, Any]]:
+    """Prompt + pick for many kernels concurrently over one pooled client."""
+    async with OpenRouterClient(max_concurrency=max_concurrency) as client:
+        async def one(name: str, graph: Dict[str, Any]):
+            prompt_txt = await pg_agent.agenerate_prompt(client, graph, machine_info, config_space)
+            return name, await sp_agent.apick_parameters(prompt_txt, client)
+
+        picks = dict(await asyncio.gather(*(one(n, g) for n, g in graphs.items())))
+        print("LLM usage:", client.stats.summary())
+        return picks
 
 if __name__ == "__main__":
     with open(Path('programl/3mm_kernel_p1.json').resolve(), 'r') as f:
         graph = json.load(f)
 
-    machine = {
-        "cpu": "AMD EPYC 9654",
-        "num_sockets": 2,
-        "cores_per_socket": 96,
-        "l3_cache_per_socket": "256 MB",
-        "memory": "512 GB DDR5",
-        "os": "Ubuntu 22.04",
-    }
-
-    omp_space = {
-        "OMP_NUM_THREADS": [4, 8, 16, 32, 64, 96, 128, 192],
-        "OMP_SCHEDULE": ["static", "dynamic", "guided"],
-        "OMP_PROC_BIND": ["true", "false"],
-        "OMP_PLACES": ["cores", "sockets"],
-    }
+    machine = dict(AMD_EPYC_9654)
+
+    config_space = omp_space(machine, ["OMP_NUM_THREADS", "OMP_PROC_BIND", "OMP_PLACES",
+                                       "OMP_SCHEDULE", "OMP_SCHEDULE_CHUNK"])
 
     correct = "<<reference checksum or output>>"
+    kernel_src = Path(os.getenv("KERNEL_SRC", "kernels/axpy.c"))
+    max_cores = os.getenv("MAX_CORES")
 
     print(MAX_PROMPT_TOKENS)
     print(OPENROUTER_API_KEY)
     print(OPENROUTER_ENDPOINT)
 
-    # pg = PromptGenerationAgent(model_name="openai/gpt-4o-mini")
-    # sp = SeedPickerAgent(model_name="google/gemma-7b-it")
-    # orchestrator = OptimisationOrchestrator(pg, sp)
-    # best = orchestrator.optimise(graph, machine, omp_space, correct)
+    # pg = PromptGenerationAgent(model_name="openai/gpt-4o-mini", max_prompt_tokens=MAX_PROMPT_TOKENS)
+    # sp = SeedPickerAgent(model_name="google/gemma-7b-it", space=config_space)
+    # ev = KernelEvaluator(kernel_src, max_cores=int(max_cores) if max_cores else None,
+    #                      cache=ResultCache(), machine=machine)
+    # orchestrator = OptimisationOrchestrator(pg, sp, ev, scheduler=CoreScheduler(ev), tuner_budget=24)
+    # orchestrator = OptimisationOrchestrator(pg, sp, ev, racer=Racer(ev))   # successive halving
+    # best = orchestrator.optimise(graph, machine, config_space, correct)
     # print("Best parameters:", best)
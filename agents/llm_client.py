@@ -0,0 +1,319 @@
+"""
+llm_client.py
+
+OpenRouter chat client shared by the agents.
+
+* :class:`OpenRouterClient` – asyncio client on one pooled keep-alive
+  ``aiohttp`` session, with a semaphore bounding in-flight requests, so many
+  kernels' prompts can be generated / answered concurrently.
+* :func:`call_openrouter` – the original blocking helper, now on a pooled
+  ``requests.Session``.
+
+Both retry 429 / 5xx / connection errors with exponential back-off (honouring
+``Retry-After``) and record per-request latency and token usage in
+``CallStats`` (and as ``utils/tracing.py`` spans / counters) so a run can
+report what the LLM side cost.  Replies go through
+the on-disk response cache in ``utils/llm_cache.py`` (pass ``cache=`` to use
+another one, or disable it there).  Only temperature-0 replies are cached
+unless a call passes ``cache_sampled=True``, and with ``validate=`` a reply is
+only stored once that callable accepts it, so an unusable answer is not
+replayed.
+
+``python llm_client.py -selftest`` checks the async client against a local
+stub server (429 + Retry-After, retry, stats, cache) without an API key.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import requests
+from dotenv import load_dotenv
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "utils"))
+from llm_cache import ResponseCache, cache_key, cacheable, default_cache  # noqa: E402
+from tracing import count, span  # noqa: E402
+
+load_dotenv()
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+DEFAULT_TIMEOUT = 180.0
+
+
+@dataclass
+class CallStats:
+    """Accumulated accounting for one client."""
+
+    requests: int = 0
+    retries: int = 0
+    failures: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latencies: List[float] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, latency: float, usage: Dict[str, Any] | None, retries: int):
+        with self._lock:
+            self.requests += 1
+            self.retries += retries
+            self.latencies.append(latency)
+            if usage:
+                self.prompt_tokens += int(usage.get("prompt_tokens") or 0)
+                self.completion_tokens += int(usage.get("completion_tokens") or 0)
+        count("llm.requests")
+        count("llm.retries", retries)
+        if usage:
+            count("llm.tokens_in", int(usage.get("prompt_tokens") or 0))
+            count("llm.tokens_out", int(usage.get("completion_tokens") or 0))
+
+    def summary(self) -> Dict[str, Any]:
+        lat = sorted(self.latencies)
+        return {"requests": self.requests,
+                "retries": self.retries,
+                "failures": self.failures,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "latency_total": sum(lat),
+                "latency_p50": lat[len(lat) // 2] if lat else None,
+                "latency_max": lat[-1] if lat else None}
+
+
+def _backoff(attempt: int, base: float, cap: float, retry_after: str | None = None) -> float:
+    """Full-jitter exponential back-off; ``Retry-After`` (seconds) wins if set."""
+    if retry_after:
+        try:
+            return min(cap, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def _payload(model: str, messages: List[Dict[str, str]], temperature: float, **kwargs) -> Dict[str, Any]:
+    payload = {"model": model, "messages": messages, "temperature": temperature}
+    payload.update(kwargs)
+    return payload
+
+
+def _headers(api_key: str | None) -> Dict[str, str]:
+    if api_key is None:
+        raise EnvironmentError("OPENROUTER_API_KEY environment variable not set.")
+    return {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+
+
+class OpenRouterClient:
+    """Pooled, bounded-concurrency, retrying async chat client.
+
+    Use as ``async with OpenRouterClient() as client: await client.chat(...)``.
+    """
+
+    def __init__(
+        self,
+        endpoint: str | None = None,
+        api_key: str | None = None,
+        max_concurrency: int = 8,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        timeout: float = DEFAULT_TIMEOUT,
+        cache: ResponseCache | None = None,
+    ):
+        if aiohttp is None:
+            raise ImportError("OpenRouterClient needs aiohttp (pip install aiohttp)")
+        self.endpoint = endpoint or os.getenv("OPEN_ROUTER_URL")
+        self.api_key = api_key or os.getenv("OPENROUTER_API_KEY")
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.cache = cache if cache is not None else default_cache()
+        self.stats = CallStats()
+        self._session: aiohttp.ClientSession | None = None
+        self._sem: asyncio.Semaphore | None = None
+
+    async def __aenter__(self) -> "OpenRouterClient":
+        await self._ensure_session()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _ensure_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency,
+                                             keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=_headers(self.api_key),
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def chat_raw(self, model: str, messages: List[Dict[str, str]],
+                       temperature: float = 0.4, **kwargs) -> Dict[str, Any]:
+        """POST one chat completion and return the decoded JSON body."""
+        await self._ensure_session()
+        payload = _payload(model, messages, temperature, **kwargs)
+
+        async with self._sem:
+            with span("llm.openrouter", model=model):
+                t0 = time.perf_counter()
+                for attempt in range(self.max_retries + 1):
+                    retry_after = None
+                    try:
+                        async with self._session.post(self.endpoint, json=payload) as resp:
+                            if resp.status not in RETRY_STATUS:
+                                resp.raise_for_status()
+                                body = await resp.json(content_type=None)
+                                self.stats.record(time.perf_counter() - t0,
+                                                  body.get("usage"), attempt)
+                                return body
+                            retry_after = resp.headers.get("Retry-After")
+                            error: Exception = aiohttp.ClientResponseError(
+                                resp.request_info, resp.history, status=resp.status,
+                                message=await resp.text())
+                    except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as exc:
+                        error = exc
+                    if attempt < self.max_retries:
+                        await asyncio.sleep(_backoff(attempt, self.backoff_base,
+                                                     self.backoff_max, retry_after))
+                self.stats.failures += 1
+                raise error
+
+    async def chat(self, model: str, messages: List[Dict[str, str]],
+                   temperature: float = 0.4, validate: Callable[[str], Any] | None = None,
+                   cache_sampled: bool = False, **kwargs) -> str:
+        use_cache = cacheable(temperature, cache_sampled)
+        key = cache_key(backend="openrouter", model=model, messages=messages,
+                        temperature=temperature, params=kwargs)
+        hit = self.cache.get(key) if use_cache else None
+        if hit is not None:
+            return hit
+        body = await self.chat_raw(model, messages, temperature, **kwargs)
+        content = body["choices"][0]["message"]["content"]
+        if validate is not None:
+            validate(content)           # raises: the reply is not cached
+        if use_cache:
+            self.cache.put(key, content, model)
+        return content
+
+
+# --------------------------------------------------------------------------- #
+# Blocking helper (pooled session, same retry policy)                          #
+# --------------------------------------------------------------------------- #
+_SESSION = requests.Session()
+SYNC_STATS = CallStats()
+
+
+def call_openrouter(model: str, messages: List[Dict[str, str]], temperature: float = 0.4,
+                    max_retries: int = 5, backoff_base: float = 1.0,
+                    timeout: float = DEFAULT_TIMEOUT, cache: ResponseCache | None = None,
+                    validate: Callable[[str], Any] | None = None, cache_sampled: bool = False,
+                    **kwargs) -> str:
+    cache = cache if cache is not None else default_cache()
+    use_cache = cacheable(temperature, cache_sampled)
+    key = cache_key(backend="openrouter", model=model, messages=messages,
+                    temperature=temperature, params=kwargs)
+    hit = cache.get(key) if use_cache else None
+    if hit is not None:
+        return hit
+
+    endpoint = os.getenv("OPEN_ROUTER_URL")
+    headers = _headers(os.getenv("OPENROUTER_API_KEY"))
+    payload = _payload(model, messages, temperature, **kwargs)
+
+    with span("llm.openrouter", model=model):
+        t0 = time.perf_counter()
+        for attempt in range(max_retries + 1):
+            retry_after = None
+            try:
+                response = _SESSION.post(endpoint, headers=headers, json=payload, timeout=timeout)
+                if response.status_code not in RETRY_STATUS:
+                    response.raise_for_status()
+                    body = response.json()
+                    SYNC_STATS.record(time.perf_counter() - t0, body.get("usage"), attempt)
+                    content = body["choices"][0]["message"]["content"]
+                    if validate is not None:
+                        validate(content)   # raises: the reply is not cached
+                    if use_cache:
+                        cache.put(key, content, model)
+                    return content
+                retry_after = response.headers.get("Retry-After")
+                error: Exception = requests.HTTPError(
+                    f"{response.status_code} from {endpoint}: {response.text[:200]}",
+                    response=response)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                error = exc
+            if attempt < max_retries:
+                time.sleep(_backoff(attempt, backoff_base, 60.0, retry_after))
+        SYNC_STATS.failures += 1
+        raise error
+
+
+async def selftest() -> CallStats:
+    """Run :class:`OpenRouterClient` against a local stub: one 429, then a reply."""
+    from aiohttp import web
+    hits = []
+
+    async def handler(request):
+        hits.append(request)
+        if len(hits) == 1:
+            return web.Response(status=429, headers={"Retry-After": "0"}, text="slow down")
+        return web.json_response({"choices": [{"message": {"content": "ok"}}],
+                                  "usage": {"prompt_tokens": 3, "completion_tokens": 1}})
+
+    app = web.Application()
+    app.router.add_post("/", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    cache = ResponseCache(Path(tempfile.mkdtemp()) / "selftest.sqlite")
+    try:
+        async with OpenRouterClient(f"http://127.0.0.1:{port}/", api_key="stub",
+                                    backoff_base=0.01, cache=cache) as client:
+            messages = [{"role": "user", "content": "hi"}]
+            assert await client.chat("stub", messages, temperature=0.0) == "ok"
+            assert await client.chat("stub", messages, temperature=0.0) == "ok"    # cache hit
+            stats = client.stats
+    finally:
+        await runner.cleanup()
+    assert len(hits) == 2, f"expected 2 requests to the stub, saw {len(hits)}"
+    assert (stats.requests, stats.retries, stats.failures) == (1, 1, 0), stats.summary()
+    assert (stats.prompt_tokens, stats.completion_tokens) == (3, 1), stats.summary()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenRouter client utilities.")
+    parser.add_argument("-selftest", action="store_true",
+                        help="Check the async client against a local stub server.")
+    args = parser.parse_args()
+    if args.selftest:
+        print(f"selftest ok: {asyncio.run(selftest()).summary()}")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,19 @@
 import json
+import sys
+from pathlib import Path
 from typing import Dict, List, Any
-import tiktoken
-import programl as pg
+
+from llm_client import call_openrouter, OpenRouterClient
+from prompt_packer import PromptPacker, count_tokens
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "utils"))
+from feature_index import FeatureIndex, default_index  # noqa: E402
+from programl_graph import fit_budget  # noqa: E402
+from search_space import SearchSpace  # noqa: E402
+from tracing import span  # noqa: E402
+
+GRAPH_SHARE = 0.5      # default budget share of distill_graph()
+FEEDBACK_SHARE = 0.25  # budget share kept free for verification feedback
 
 class PromptGenerationAgent:
     def __init__(self, model_name: str = "openai/gpt-4o"):
@@ -52,49 +64,45 @@ class PromptGenerationAgent:
     
 
 class PromptGenerationAgent:
-    def __init__(self, model_name: str = "openai/gpt-4o-mini", openrouter_url:str='', openrouter_key:str='', max_prompt_tokens: int=8000):
+    def __init__(self, model_name: str = "openai/gpt-4o-mini", openrouter_url:str='', openrouter_key:str='', max_prompt_tokens: int=8000,
+                 feature_index: FeatureIndex | None = None):
         self.model_name = model_name
         self.url = openrouter_url
         self.key = openrouter_key
         self.max_prompt_token = max_prompt_tokens
-
-    def n_tokens(text: str, model: str = "gpt-4o-mini") -> int:
-        try:
-            enc = tiktoken.encoding_for_model(model)
-            return len(enc.encode(text))
-        except ImportError:
-            # fallback: estimate 4 chars ≈ 1 token
-            return max(1, len(text) // 4)
-
-    def _maybe_distil(self, prog: Dict[str, Any]) -> Dict[str, Any] | str:
-        full_json = json.dumps(prog)
-        if self.n_tokens(full_json, self.model_name) > self.max_prompt_token:
-            return self.distill_graph(prog)
-        return prog
-    
-    def distill_graph(prog_dict: Dict[str, Any]) -> Dict[str, Any]:
-        if pg is None:
-            # Fallback: static metrics only
-            return {
-                "n_nodes": len(prog_dict.get("nodes", [])),
-                "n_edges": len(prog_dict.get("edges", [])),
-                "note": "programl not installed, deep metrics skipped",
-            }
-
-        g = _safe_program_graph(prog_dict)
-
-        n_instr = sum(1 for _, d in g.nodes(data=True) if d.get("type") == "instruction")
-        n_funcs = sum(1 for _, d in g.nodes(data=True) if d.get("type") == "function")
-
-        summary = {
-            "n_nodes": g.number_of_nodes(),
-            "n_edges": g.number_of_edges(),
-            "n_instructions": n_instr,
-            "n_functions": n_funcs,
-        }
-        summary.update(extract_loop_info(g))
-        summary.update(summarise_mem(g))
-        return summary
+        self.feature_index = feature_index if feature_index is not None else default_index()
+        self._graph_memo: Dict[str, Any] | None = None
+        self.last_report: Dict[str, str] = {}
+
+    def n_tokens(self, text: str, model: str | None = None) -> int:
+        return count_tokens(text, model or self.model_name)
+
+    def distill_graph(self, prog_dict: Dict[str, Any], max_tokens: int | None = None) -> Dict[str, Any]:
+        """Loop / memory / call-graph summary (see utils/programl_graph.py),
+        trimmed to *max_tokens* (default ``GRAPH_SHARE`` of the prompt budget)."""
+        memo = self._graph(prog_dict)
+        if memo["summary"] is None:
+            memo["summary"] = self.feature_index.graph_summary(prog_dict)
+        if max_tokens is None:
+            max_tokens = int(self.max_prompt_token * GRAPH_SHARE)
+        return fit_budget(memo["summary"], max_tokens, self.n_tokens)
+
+    def _graph(self, prog: Dict[str, Any]) -> Dict[str, Any]:
+        # The retry loop hands the same graph back on every attempt: serialise
+        # and measure it once; the summary is also persisted in the index.
+        if self._graph_memo is None or self._graph_memo["graph"] is not prog:
+            raw = json.dumps(prog, separators=(",", ":"))
+            self._graph_memo = {"graph": prog, "raw": raw,
+                                "tokens": self.n_tokens(raw), "summary": None}
+        return self._graph_memo
+
+    def _graph_body(self, prog: Dict[str, Any], budget: int) -> str | None:
+        """Raw graph if it fits *budget*, else the distilled summary trimmed to it."""
+        memo = self._graph(prog)
+        if memo["tokens"] <= budget:
+            return memo["raw"]
+        summary = self.distill_graph(prog, budget)
+        return json.dumps(summary, separators=(",", ":")) if summary else None
 
     def generate_prompt(
         self,
@@ -104,28 +112,61 @@ class PromptGenerationAgent:
         attempt_idx: int = 0,
         previous_feedback: str | None = None,
     ) -> str:
-        graph_payload = self._maybe_distil(programl_graph)
-        if isinstance(graph_payload, dict):
-            graph_section = f"### Programl Summary\n{json.dumps(graph_payload, indent=2)}\n\n"
-        else:
-            graph_section = f"### Programl Graph (raw)\n{json.dumps(graph_payload, indent=2)[:12000]}\n\n"
+        messages = self._messages(programl_graph, machine_info, config_space,
+                                  attempt_idx, previous_feedback)
+        return call_openrouter(self.model_name, messages)
 
+    async def agenerate_prompt(
+        self,
+        client: OpenRouterClient,
+        programl_graph: Dict[str, Any],
+        machine_info: Dict[str, Any],
+        config_space: Dict[str, List[Any]],
+        attempt_idx: int = 0,
+        previous_feedback: str | None = None,
+    ) -> str:
+        """Async variant; many kernels can share one pooled *client*."""
+        messages = self._messages(programl_graph, machine_info, config_space,
+                                  attempt_idx, previous_feedback)
+        return await client.chat(self.model_name, messages)
+
+    def _messages(
+        self,
+        programl_graph: Dict[str, Any],
+        machine_info: Dict[str, Any],
+        config_space: Dict[str, List[Any]] | SearchSpace,
+        attempt_idx: int = 0,
+        previous_feedback: str | None = None,
+    ) -> List[Dict[str, str]]:
         system_msg = (
             "You are an HPC optimisation expert. Craft a complete prompt for a Seed‑Picker agent that will choose OpenMP "
             "parameters. Include (1) kernel summary, (2) hardware details, (3) entire configuration search space, "
             "(4) optimisation objective, (5) required JSON schema. If feedback exists, refine to avoid previous mistakes."
         )
 
-        messages = [{"role": "system", "content": system_msg}]
-
-        user_content = (
-            graph_section +
-            f"### Machine Info\n{json.dumps(machine_info, indent=2)}\n\n" +
-            f"### Configuration Space\n{json.dumps(config_space, indent=2)}\n\n"
-        )
+        # Machine info, config space and the instruction must go in.  The graph
+        # (raw if it fits, else distilled) comes next but leaves room for up to
+        # FEEDBACK_SHARE of the budget of feedback, which is cut on a token
+        # boundary if it is longer than what remains.
+        packer = PromptPacker(self.model_name, self.max_prompt_token)
+        packer.reserve(system_msg)
+        held = min(self.n_tokens(previous_feedback) + 8,
+                   int(self.max_prompt_token * FEEDBACK_SHARE)) if previous_feedback else 0
+        packer.add("graph", lambda budget: self._graph_body(programl_graph, budget - held),
+                   heading="Programl Graph", priority=10)
+        packer.add("machine", json.dumps(machine_info, indent=2), heading="Machine Info", required=True)
+        if isinstance(config_space, SearchSpace):
+            # typed knobs with their conditions and machine constraints
+            config_space = config_space.describe()
+        packer.add("config_space", json.dumps(config_space, indent=2), heading="Configuration Space", required=True)
         if previous_feedback:
-            user_content += f"### Feedback\n{previous_feedback}\n\n"
-        user_content += "Write the Seed‑Picker prompt now."
+            packer.add("feedback", previous_feedback, heading="Feedback", priority=20, truncatable=True)
+        packer.add("instruction", "Write the Seed‑Picker prompt now.", required=True)
 
-        messages.append({"role": "user", "content": user_content})
-        return call_openrouter(self.model_name, messages)
\ No newline at end of file
+        with span("prompt.pack", budget=self.max_prompt_token):
+            user_content = packer.pack()
+        self.last_report = dict(packer.report, total=f"{packer.used}/{self.max_prompt_token} tokens")
+
+        messages = [{"role": "system", "content": system_msg},
+                    {"role": "user", "content": user_content}]
+        return messages
\ No newline at end of file
@@ -0,0 +1,147 @@
+"""
+prompt_packer.py
+
+Token-budgeted prompt assembly.
+
+Every section (graph, machine info, config space, feedback, ...) is measured
+in real tokens with the target model's tokenizer and the prompt is filled in
+priority order up to ``max_tokens``:
+
+* required sections always go in (``ValueError`` if they alone overflow),
+* a section whose body is a callable is asked for a body that fits the
+  tokens still free (used for "raw graph if it fits, else its distilled
+  summary trimmed to what is left"),
+* free-text sections marked ``truncatable`` are cut on a token boundary,
+* anything else that does not fit is dropped whole – JSON is never cut.
+
+Sections keep the order they were added in; only the packing follows
+priority.  ``PromptPacker.report`` records what was kept, trimmed or dropped.
+
+Encoders are resolved once per model and token counts of repeated texts
+(machine info, config space on every retry) are memoised.  Without
+``tiktoken`` counts fall back to ~4 characters per token.
+"""
+
+from __future__ import annotations
+
+import functools
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Union
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+FALLBACK_ENCODING = "o200k_base"
+MESSAGE_OVERHEAD = 4          # per chat message (role / separators)
+TRUNCATION_MARK = " …"
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoder(model: str):
+    """tiktoken encoder for *model* (``provider/`` prefix ignored), or ``None``."""
+    if tiktoken is None:
+        return None
+    name = model.split("/", 1)[-1]
+    try:
+        return tiktoken.encoding_for_model(name)
+    except KeyError:
+        try:
+            return tiktoken.get_encoding(FALLBACK_ENCODING)
+        except Exception:
+            return None
+    except Exception:
+        return None
+
+
+@functools.lru_cache(maxsize=1024)
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    enc = get_encoder(model)
+    if enc is None:
+        return max(1, len(text) // 4)
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, budget: int, model: str = "gpt-4o-mini") -> str:
+    """Longest prefix of *text* within *budget* tokens (cut on a token boundary)."""
+    if count_tokens(text, model) <= budget:
+        return text
+    mark = count_tokens(TRUNCATION_MARK, model)
+    if budget <= mark:
+        return ""
+    enc = get_encoder(model)
+    if enc is None:
+        return text[:(budget - mark) * 4] + TRUNCATION_MARK
+    return enc.decode(enc.encode(text, disallowed_special=())[:budget - mark]) + TRUNCATION_MARK
+
+
+Body = Union[str, Callable[[int], Union[str, None]]]
+
+
+@dataclass
+class Section:
+    name: str
+    heading: str | None
+    body: Body
+    priority: int = 50            # lower is packed first
+    required: bool = False
+    truncatable: bool = False
+
+
+class PromptPacker:
+    """Fill a prompt by priority up to ``max_tokens`` (see module docstring)."""
+
+    def __init__(self, model: str, max_tokens: int, reserved: int = 0):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.reserved = reserved
+        self.sections: List[Section] = []
+        self.report: Dict[str, str] = {}
+        self.used = 0
+
+    def count(self, text: str) -> int:
+        return count_tokens(text, self.model)
+
+    def reserve(self, text: str):
+        """Account for text sent outside the packed block (e.g. the system message)."""
+        self.reserved += self.count(text) + MESSAGE_OVERHEAD
+
+    def add(self, name: str, body: Body, heading: str | None = None, priority: int = 50,
+            required: bool = False, truncatable: bool = False) -> "PromptPacker":
+        self.sections.append(Section(name, heading, body, priority, required, truncatable))
+        return self
+
+    def _render(self, sec: Section, body: str) -> str:
+        return f"### {sec.heading}\n{body}\n\n" if sec.heading else body
+
+    def pack(self) -> str:
+        self.report = {}
+        free = self.max_tokens - self.reserved - MESSAGE_OVERHEAD
+        chosen: Dict[int, str] = {}
+
+        for idx, sec in sorted(enumerate(self.sections), key=lambda p: (not p[1].required, p[1].priority, p[0])):
+            frame = self.count(self._render(sec, "")) if sec.heading else 0
+            body = sec.body(free - frame) if callable(sec.body) else sec.body
+            if body is None:
+                self.report[sec.name] = "dropped"
+                continue
+            text = self._render(sec, body)
+            cost = self.count(text)
+            if cost > free:
+                if sec.required:
+                    raise ValueError(f"required prompt section '{sec.name}' needs {cost} tokens, "
+                                     f"only {free} of {self.max_tokens} left")
+                if not sec.truncatable or free - frame <= 0:
+                    self.report[sec.name] = "dropped"
+                    continue
+                text = self._render(sec, truncate_tokens(body, free - frame - 1, self.model))
+                cost = self.count(text)
+                self.report[sec.name] = f"truncated to {cost} tokens"
+            else:
+                self.report.setdefault(sec.name, f"{cost} tokens")
+            chosen[idx] = text
+            free -= cost
+
+        self.used = self.max_tokens - free
+        return "".join(chosen[i] for i in sorted(chosen))
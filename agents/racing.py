@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+racing.py
+
+Successive-halving race over candidate configurations, so most of the
+kernel time goes to the contenders rather than to configurations that are
+several times slower than the best.
+
+* Rung 0 times every candidate with ``min_repeats`` run(s).
+* After each rung a candidate is dropped when even its fastest run is slower
+  than ``margin`` x the incumbent's median (clearly worse, not just noisy),
+  and of the rest only the best ``1 / eta`` go on.
+* Each following rung tops the survivors up to ``eta`` times as many runs
+  (``resume``: earlier timings are kept), until ``max_repeats``; a lone
+  survivor goes straight to ``max_repeats``.
+* Any single run slower than ``kill_factor`` x the incumbent's median is
+  killed while in flight (``cutoff`` of ``KernelEvaluator.evaluate``).
+
+Every decision is appended to :attr:`Racer.log` (and printed with
+``verbose``); ``-log`` writes it as JSONL.  Results come back in input order;
+dropped and killed candidates are flagged ``pruned``, the survivor(s) carry
+the full ``max_repeats`` timings.
+
+``-csv`` / ``-executable`` race against recorded data (replay.py) instead of
+compiling and running ``-src``.
+
+Example
+-------
+python racing.py -src ../kernels/axpy.c -correct 3.666784e+06 \
+    -threads 1 2 4 -schedule static dynamic guided
+python racing.py -csv ../performance_data/all_results_amd.csv -executable DRB045-doall1-orig-no \
+    -threads 16 32 64 128 -bind close spread -schedule static dynamic guided -log race.jsonl
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+from evaluator import EvalResult
+from scheduler import expand_candidates
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "utils"))
+from tracing import count, span  # noqa: E402
+
+
+class Racer:
+    """Successive halving with in-flight kills over one evaluator."""
+
+    def __init__(self, evaluator, eta: int = 2, min_repeats: int = 1,
+                 max_repeats: int | None = None, margin: float = 1.25,
+                 kill_factor: float | None = 3.0, verbose: bool = True):
+        self.evaluator = evaluator
+        self.eta = max(2, eta)
+        self.min_repeats = min_repeats
+        self.max_repeats = max_repeats or evaluator.repeats
+        self.margin = margin
+        self.kill_factor = kill_factor
+        self.verbose = verbose
+        self.log: List[Dict[str, Any]] = []
+
+    def kill_after(self, incumbent: float) -> float | None:
+        """Per-run cutoff given the incumbent's median (``None``: no cutoff yet)."""
+        if not self.kill_factor or not math.isfinite(incumbent):
+            return None
+        return self.kill_factor * incumbent
+
+    def _decide(self, rung: int, idx: int, result: EvalResult, action: str,
+                incumbent: float, reason: str):
+        entry = {"rung": rung, "candidate": idx, "params": result.params, "action": action,
+                 "runs": len(result.times), "median": result.median,
+                 "incumbent": incumbent, "reason": reason}
+        self.log.append(entry)
+        count(f"race.{action}")
+        if self.verbose and action != "kept":
+            print(f"[race] rung {rung}: {action} {json.dumps(result.params)} ({reason})")
+
+    def race(self, candidates: List[Dict[str, Any]], correct_result: Any) -> List[EvalResult]:
+        """Race *candidates*; results come back in input order."""
+        results: List[EvalResult | None] = [None] * len(candidates)
+        alive = list(range(len(candidates)))
+        incumbent = math.inf
+        target, rung = min(self.min_repeats, self.max_repeats), 0
+
+        while alive:
+            if len(alive) == 1:
+                target = self.max_repeats
+            # best-known first, so the incumbent (and the kill cutoff) tightens early
+            with span("race.rung", rung=rung, alive=len(alive), repeats=target):
+                for idx in sorted(alive, key=lambda i: results[i].median if results[i] else math.inf):
+                    cutoff = self.kill_after(incumbent)
+                    res = self.evaluator.evaluate(candidates[idx], correct_result, repeats=target,
+                                                  cutoff=cutoff, resume=results[idx])
+                    results[idx] = res
+                    if res.pruned:
+                        alive.remove(idx)
+                        self._decide(rung, idx, res, "killed", incumbent,
+                                     f"run exceeded {cutoff:.4g}s = {self.kill_factor:g}x incumbent")
+                    elif not res.correct:
+                        alive.remove(idx)
+                        self._decide(rung, idx, res, "failed", incumbent,
+                                     (res.error or "wrong result").splitlines()[0])
+                    else:
+                        incumbent = min(incumbent, res.median)
+            if not alive or target >= self.max_repeats:
+                break
+
+            alive.sort(key=lambda i: results[i].median)
+            incumbent = results[alive[0]].median
+            keep = max(1, math.ceil(len(alive) / self.eta))
+            for pos, idx in enumerate(list(alive)):
+                res = results[idx]
+                if res.best > self.margin * incumbent:
+                    reason = f"fastest run {res.best:.4g}s > {self.margin:g}x incumbent {incumbent:.4g}s"
+                elif pos >= keep:
+                    reason = f"rank {pos + 1} of {len(alive)}, keeping {keep}"
+                else:
+                    self._decide(rung, idx, res, "kept", incumbent, f"rank {pos + 1}")
+                    continue
+                res.pruned = True
+                self._decide(rung, idx, res, "dropped", incumbent, reason)
+            alive = [i for i in alive if not results[i].pruned]
+            target, rung = min(self.max_repeats, target * self.eta), rung + 1
+
+        return results
+
+    def stats(self, results: List[EvalResult]) -> Dict[str, Any]:
+        """Runs made versus timing every candidate ``max_repeats`` times."""
+        killed = sum(1 for e in self.log if e["action"] == "killed")
+        runs = sum(len(r.times) for r in results) + killed
+        return {"candidates": len(results), "runs": runs,
+                "full_runs": len(results) * self.max_repeats,
+                "killed": killed,
+                "dropped": sum(1 for e in self.log if e["action"] == "dropped")}
+
+
+def best_result(results: List[EvalResult]) -> EvalResult:
+    """Fastest correct survivor (pruned candidates only if nothing survived)."""
+    return min(results, key=lambda r: (not r.correct, r.pruned, r.median))
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Race a grid of OpenMP configurations with successive halving.")
+    parser.add_argument("-src", type=Path, default=None, help="Kernel source (.c/.cpp) or prebuilt executable.")
+    parser.add_argument("-args", nargs="*", default=[], help="Arguments passed to the kernel.")
+    parser.add_argument("-correct", type=str, default=None, help="Reference checksum (last stdout line).")
+    parser.add_argument("-csv", type=Path, default=None, help="Replay recorded runs from this sweep CSV instead.")
+    parser.add_argument("-executable", type=str, default=None, help="Executable to replay (with -csv).")
+    parser.add_argument("-threads", type=int, nargs="+", required=True, help="OMP_NUM_THREADS values.")
+    parser.add_argument("-bind", nargs="+", default=["true"], help="OMP_PROC_BIND values.")
+    parser.add_argument("-schedule", nargs="+", default=["static"], help="OMP_SCHEDULE values.")
+    parser.add_argument("-places", nargs="+", default=None, help="OMP_PLACES values.")
+    parser.add_argument("-repeats", type=int, default=5, help="Timed runs for the survivors (default: %(default)s).")
+    parser.add_argument("-eta", type=int, default=2, help="Keep 1/eta per rung (default: %(default)s).")
+    parser.add_argument("-margin", type=float, default=1.25, help="Drop when fastest run > margin x incumbent.")
+    parser.add_argument("-kill-factor", type=float, default=3.0, help="Kill runs slower than this x incumbent.")
+    parser.add_argument("-max-cores", type=int, default=None, help="Cap on cores / threads used by a run.")
+    parser.add_argument("-log", type=Path, default=None, help="Write the pruning decisions as JSONL.")
+    return parser
+
+
+def main():
+    parser = build_arg_parser()
+    args = parser.parse_args()
+
+    if args.csv is not None:
+        from replay import ReplayEvaluator
+        if args.executable is None:
+            parser.error("-csv needs -executable")
+        evaluator = ReplayEvaluator.from_csv(args.csv, args.executable, repeats=args.repeats)
+    elif args.src is not None and args.correct is not None:
+        from evaluator import KernelEvaluator
+        evaluator = KernelEvaluator(args.src, args=args.args, repeats=args.repeats,
+                                    max_cores=args.max_cores)
+    else:
+        parser.error("give -src and -correct, or -csv and -executable")
+
+    grid = {"OMP_NUM_THREADS": args.threads, "OMP_PROC_BIND": args.bind, "OMP_SCHEDULE": args.schedule}
+    if args.places:
+        grid["OMP_PLACES"] = args.places
+    racer = Racer(evaluator, eta=args.eta, max_repeats=args.repeats,
+                  margin=args.margin, kill_factor=args.kill_factor)
+    results = racer.race(expand_candidates(grid), args.correct)
+
+    best = best_result(results)
+    print(json.dumps(best.summary()))
+    print(json.dumps(racer.stats(results)))
+    if args.log is not None:
+        with open(args.log, "w") as fp:
+            for entry in racer.log:
+                fp.write(json.dumps(entry) + "\n")
+
+
+if __name__ == "__main__":
+    main()
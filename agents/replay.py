@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+replay.py
+
+Offline stand-in for :class:`evaluator.KernelEvaluator`: answers
+``evaluate(params, correct_result)`` from a recorded sweep CSV instead of
+running the kernel.  Every configuration of the sweep has ~5 recorded
+repeats; each evaluation draws ``repeats`` of them with replacement, so two
+evaluations of the same configuration differ the way real reruns would.
+
+Only the knobs present in the CSV (threads, bind, schedule) select a row;
+others such as ``OMP_PLACES`` are ignored.  A configuration that was never
+recorded comes back ``correct=False`` with an error, like a failed run.
+*repeats* / *cutoff* / *resume* behave as in ``KernelEvaluator.evaluate``: a
+drawn time above *cutoff* counts as a killed run.
+
+:func:`load_tables` parses the CSV (through ``perf_store``) into one
+``{config: times}`` table per executable in a single pass, so benchmarks
+can build evaluators for all 121 kernels cheaply.
+
+Example
+-------
+python replay.py -csv ../performance_data/all_results_amd.csv -executable DRB045-doall1-orig-no \
+    -threads 64 -bind close -schedule dynamic
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from evaluator import EvalResult
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "utils"))
+from perf_store import load_results  # noqa: E402
+
+REPLAY_KNOBS = ("OMP_NUM_THREADS", "OMP_PROC_BIND", "OMP_SCHEDULE")
+TIME_COL = "Execution Time (s)"
+
+ConfigKey = Tuple[int, str, str]
+
+
+def config_key(params: Dict[str, Any]) -> ConfigKey:
+    return (int(params["OMP_NUM_THREADS"]),
+            str(params["OMP_PROC_BIND"]).strip().lower(),
+            str(params["OMP_SCHEDULE"]).strip().lower())
+
+
+def load_tables(csv_path: Path) -> Dict[str, Dict[ConfigKey, np.ndarray]]:
+    """``{executable: {(threads, bind, schedule): recorded times}}``."""
+    df = load_results(csv_path)
+    tables: Dict[str, Dict[ConfigKey, np.ndarray]] = {}
+    grouped = df.groupby(["Executable", *REPLAY_KNOBS], observed=True, sort=False)[TIME_COL]
+    for (exe, threads, bind, sched), times in grouped:
+        key = (int(threads), str(bind).lower(), str(sched).lower())
+        tables.setdefault(str(exe), {})[key] = times.to_numpy(dtype=float)
+    return tables
+
+
+class ReplayEvaluator:
+    """``KernelEvaluator``-compatible evaluator backed by recorded runs."""
+
+    def __init__(self, table: Dict[ConfigKey, np.ndarray], repeats: int = 5,
+                 random_state: int | None = 0, name: str | None = None):
+        self.table = table
+        self.repeats = repeats
+        self.name = name
+        self.rng = np.random.default_rng(random_state)
+        self.medians = {k: float(np.median(v)) for k, v in table.items()}
+        self.n_evals = 0
+        self.n_runs = 0
+        self.run_seconds = 0.0   # simulated kernel time spent (killed runs count up to the cutoff)
+
+    @classmethod
+    def from_csv(cls, csv_path: Path, executable: str, **kwargs) -> "ReplayEvaluator":
+        tables = load_tables(csv_path)
+        if executable not in tables:
+            raise KeyError(f"'{executable}' has no rows in {csv_path}")
+        return cls(tables[executable], name=executable, **kwargs)
+
+    @property
+    def best_median(self) -> float:
+        return min(self.medians.values())
+
+    def configs(self) -> List[Dict[str, Any]]:
+        return [dict(zip(REPLAY_KNOBS, k)) for k in self.table]
+
+    def space(self) -> Dict[str, List[Any]]:
+        return {knob: sorted({k[i] for k in self.table}) for i, knob in enumerate(REPLAY_KNOBS)}
+
+    def true_median(self, params: Dict[str, Any]) -> float:
+        """Median over *all* recorded repeats (``inf`` if never recorded)."""
+        return self.medians.get(config_key(params), float("inf"))
+
+    def evaluate(self, params: Dict[str, Any], correct_result: Any = None, cpus=None,
+                 repeats: int | None = None, cutoff: float | None = None,
+                 resume: EvalResult | None = None) -> EvalResult:
+        self.n_evals += 1
+        repeats = self.repeats if repeats is None else repeats
+        result = EvalResult(params=dict(params), correct=False)
+        times = self.table.get(config_key(params))
+        if times is None:
+            result.error = f"configuration not recorded for {self.name or 'this kernel'}"
+            return result
+        result.times = list(resume.times) if resume is not None else []
+        while len(result.times) < repeats:
+            seconds = float(self.rng.choice(times))
+            self.n_runs += 1
+            if cutoff is not None and seconds > cutoff:
+                self.run_seconds += cutoff
+                result.error = f"killed after {cutoff:.4g}s"
+                result.pruned = True
+                return result
+            self.run_seconds += seconds
+            result.times.append(seconds)
+        result.correct = True
+        return result
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Answer one evaluation from a recorded sweep.")
+    parser.add_argument("-csv", type=Path, required=True, help="Sweep CSV.")
+    parser.add_argument("-executable", type=str, required=True, help="Executable (kernel) name.")
+    parser.add_argument("-threads", type=int, required=True, help="OMP_NUM_THREADS")
+    parser.add_argument("-bind", type=str, required=True, help="OMP_PROC_BIND")
+    parser.add_argument("-schedule", type=str, required=True, help="OMP_SCHEDULE")
+    parser.add_argument("-repeats", type=int, default=5, help="Repeats drawn (default: %(default)s).")
+    return parser
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    ev = ReplayEvaluator.from_csv(args.csv, args.executable, repeats=args.repeats)
+    params = {"OMP_NUM_THREADS": args.threads, "OMP_PROC_BIND": args.bind, "OMP_SCHEDULE": args.schedule}
+    print(json.dumps(dict(ev.evaluate(params).summary(), true_median=ev.true_median(params),
+                          best_median=ev.best_median), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+result_cache.py
+
+Persistent SQLite cache of kernel evaluations, keyed by
+
+* kernel   – content hash of the kernel's LLVM-IR (or of its source / binary)
+             plus how it was built and run (:func:`kernel_key`),
+* machine  – :func:`machines.machine_key` of the machine descriptor,
+* config   – the normalised OMP configuration (see :func:`normalize_config`).
+
+:class:`evaluator.KernelEvaluator` consults it before launching a run, and
+existing CSV sweeps can be imported so configurations that were already
+measured come back instantly.  Both sides build the kernel key with
+:func:`kernel_key`: a sweep is imported with the compiler / flags / arguments
+it was built and run with (default: the evaluator's defaults), so it is hit
+by an evaluator configured the same way.
+
+Example
+-------
+python result_cache.py -db results.sqlite -import-csv ../performance_data/all_results_amd.csv \
+    -machine amd -ir-dir ../llvm-ir -build "cc -O3 -fopenmp"
+python result_cache.py -selftest
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "utils"))
+from machines import machine_key, resolve_machine  # noqa: E402
+from tracing import count  # noqa: E402
+
+DEFAULT_DB = Path(__file__).resolve().parents[1] / "performance_data" / "results.sqlite"
+DEFAULT_CC = os.getenv("CC", "cc")
+DEFAULT_CFLAGS = ("-O3", "-fopenmp")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    kernel  TEXT NOT NULL,
+    machine TEXT NOT NULL,
+    config  TEXT NOT NULL,
+    times   TEXT NOT NULL,
+    correct INTEGER NOT NULL,
+    source  TEXT,
+    created REAL,
+    output  TEXT,
+    PRIMARY KEY (kernel, machine, config)
+);
+CREATE TABLE IF NOT EXISTS machines (
+    machine    TEXT PRIMARY KEY,
+    descriptor TEXT NOT NULL
+);
+"""
+
+
+def file_hash(path: Path) -> str:
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def build_id(cc: str = DEFAULT_CC, cflags: Sequence[str] = DEFAULT_CFLAGS) -> str:
+    """Compiler and flags a kernel was built with."""
+    return " ".join([cc, *cflags])
+
+
+def kernel_key(kernel: str, build: str | None = None, args: Sequence[str] = ()) -> str:
+    """Kernel key of runs and imports alike: content hash, build, run arguments."""
+    key = kernel + (f"|{build}" if build else "")
+    return key + (f"|args={json.dumps(list(args))}" if args else "")
+
+
+def kernel_key_for(executable: str, ir_dir: Path | None, build: str | None = None,
+                   args: Sequence[str] = ()) -> str:
+    """Kernel key for a CSV executable name (IR hash, ``exe:<name>`` if no IR)."""
+    kernel = f"exe:{executable}"
+    if ir_dir is not None:
+        ir = Path(ir_dir) / f"{executable}.ll"
+        if ir.exists():
+            kernel = file_hash(ir)
+    return kernel_key(kernel, build, args)
+
+
+def _norm_value(knob: str, value: Any) -> Any:
+    if knob == "OMP_NUM_THREADS":
+        return int(value)
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return "".join(str(value).split()).lower()
+
+
+def normalize_config(params: Dict[str, Any]) -> str:
+    """Canonical JSON of a config: upper-case knobs, trimmed lower-case values."""
+    norm = {k.upper(): _norm_value(k.upper(), v)
+            for k, v in params.items() if v is not None}
+    return json.dumps(norm, sort_keys=True, separators=(",", ":"))
+
+
+class ResultCache:
+    """Thread-safe (one connection + lock) evaluation cache."""
+
+    def __init__(self, db_path: Path = DEFAULT_DB):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(results)")}
+        if "output" not in columns:           # databases from before checksums were kept
+            self._conn.execute("ALTER TABLE results ADD COLUMN output TEXT")
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _machine(self, machine: Dict[str, Any]) -> str:
+        key = machine_key(machine)
+        self._conn.execute("INSERT OR IGNORE INTO machines VALUES (?, ?)",
+                           (key, json.dumps(machine, sort_keys=True)))
+        return key
+
+    def get(self, kernel: str, machine: Dict[str, Any],
+            params: Dict[str, Any]) -> Tuple[List[float], bool, str | None] | None:
+        """Cached (times, correct, checksum line) or ``None``."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT times, correct, output FROM results WHERE kernel=? AND machine=? AND config=?",
+                (kernel, machine_key(machine), normalize_config(params))).fetchone()
+            if row is None:
+                self.misses += 1
+                count("result_cache.misses")
+                return None
+            self.hits += 1
+            count("result_cache.hits")
+            return json.loads(row[0]), bool(row[1]), row[2]
+
+    def put(self, kernel: str, machine: Dict[str, Any], params: Dict[str, Any],
+            times: List[float], correct: bool, source: str = "run", output: str | None = None):
+        """Store a result; *output* is the run's checksum line, re-checked on a hit."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (kernel, self._machine(machine), normalize_config(params),
+                 json.dumps(list(times)), int(correct), source, time.time(), output))
+
+    def import_csv(self, csv_path: Path, machine: Dict[str, Any], ir_dir: Path | None = None,
+                   build: str | None = build_id(), args: Sequence[str] = ()) -> int:
+        """Load a sweep CSV (all repeats per config) as cache entries.
+
+        *build* / *args* are how the sweep's kernels were compiled and run;
+        they go into the kernel key exactly as :class:`evaluator.KernelEvaluator`
+        puts its own in.
+        """
+        from perf_store import load_results
+
+        df = load_results(csv_path)
+        keys = ["Executable", "OMP_NUM_THREADS", "OMP_PROC_BIND", "OMP_SCHEDULE"]
+        grouped = df.groupby(keys, observed=True, sort=False)["Execution Time (s)"]
+
+        kernels: Dict[str, str] = {}
+        rows = []
+        now = time.time()
+        with self._lock:
+            mkey = self._machine(machine)
+        for (exe, threads, bind, sched), times in grouped:
+            exe = str(exe)
+            if exe not in kernels:
+                kernels[exe] = kernel_key_for(exe, ir_dir, build, args)
+            params = {"OMP_NUM_THREADS": threads, "OMP_PROC_BIND": bind, "OMP_SCHEDULE": sched}
+            rows.append((kernels[exe], mkey, normalize_config(params),
+                         json.dumps(times.tolist()), 1, f"csv:{Path(csv_path).name}", now, None))
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def close(self):
+        self._conn.close()
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Manage the persistent kernel evaluation cache.")
+    parser.add_argument("-db", type=Path, default=DEFAULT_DB, help="SQLite file (default: %(default)s).")
+    parser.add_argument("-import-csv", type=Path, default=None, help="Sweep CSV to import.")
+    parser.add_argument("-machine", type=str, default="amd", help="Machine preset (amd/intel) or JSON descriptor path.")
+    parser.add_argument("-ir-dir", type=Path, default=None, help="Directory of <executable>.ll files used for kernel hashes.")
+    parser.add_argument("-build", type=str, default=build_id(), help="Compiler and flags the sweep was built with (default: '%(default)s').")
+    parser.add_argument("-args", nargs="*", default=[], help="Arguments the sweep's kernels were run with.")
+    parser.add_argument("-selftest", action="store_true", help="Import a small sweep and hit it through KernelEvaluator.")
+    return parser
+
+
+def selftest():
+    """Import a one-configuration sweep and answer it through ``KernelEvaluator.evaluate``."""
+    from evaluator import KernelEvaluator
+
+    tmp = Path(tempfile.mkdtemp())
+    ir = tmp / "axpy.ll"
+    ir.write_text("; stand-in IR: only its hash matters here\n")
+    rows = "".join(f"axpy,4,close,static,{t}\n" for t in (0.5, 0.4, 0.6))
+    (tmp / "sweep.csv").write_text("Executable,OMP_NUM_THREADS,OMP_PROC_BIND,OMP_SCHEDULE,"
+                                   "Execution Time (s)\n" + rows)
+    machine = resolve_machine("amd")
+    cache = ResultCache(tmp / "results.sqlite")
+    assert cache.import_csv(tmp / "sweep.csv", machine, tmp) == 1
+
+    # configured like ``evaluator.py -ir axpy.ll``: cached, so nothing is compiled
+    kernel = Path(__file__).resolve().parents[1] / "kernels" / "axpy.c"
+    evaluator = KernelEvaluator(kernel, repeats=3, cache=cache, machine=machine,
+                                kernel_id=file_hash(ir))
+    params = {"OMP_NUM_THREADS": 4, "OMP_PROC_BIND": "close", "OMP_SCHEDULE": "static"}
+    result = evaluator.evaluate(params, correct_result="unchecked")
+    assert result.cached and result.correct and sorted(result.times) == [0.4, 0.5, 0.6], result.summary()
+    # other run arguments are another kernel key
+    assert cache.get(kernel_key(file_hash(ir), build_id(), ["9"]), machine, params) is None
+    cache.close()
+    return result
+
+
+def main():
+    parser = build_arg_parser()
+    args = parser.parse_args()
+
+    if args.selftest:
+        print(f"selftest ok: {selftest().summary()}")
+        return
+
+    cache = ResultCache(args.db)
+    if args.import_csv is not None:
+        n = cache.import_csv(args.import_csv, resolve_machine(args.machine), args.ir_dir,
+                             args.build, args.args)
+        print(f"Imported {n} configuration(s) from '{args.import_csv}' into '{args.db}'.")
+    n_rows = cache._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+    print(f"'{args.db}' holds {n_rows} cached evaluation(s).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+scheduler.py
+
+Core-partitioned parallel evaluation of candidate configurations.
+
+Low-thread-count candidates are packed onto *disjoint* sets of physical cores
+and run at the same time, each pinned to its set with an affinity mask (the
+OpenMP runtime only places threads inside the mask it starts with, so
+OMP_PLACES / OMP_PROC_BIND act within the partition).  Candidates that need
+at least ``exclusive_threads`` threads get the whole node to themselves.
+
+Packing is first-fit-decreasing: the largest pending candidate that fits in the
+free cores is launched next, so a 4-thread run never holds up a 96-thread one
+that could already start.
+
+Example
+-------
+python scheduler.py -src ../kernels/axpy.c -correct 3.666784e+06 \
+    -threads 1 2 4 -schedule static dynamic guided
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+from evaluator import EvalResult, KernelEvaluator
+
+
+def physical_cores(cpus: Sequence[int] | None = None) -> List[List[int]]:
+    """Group the usable logical CPUs by physical core (SMT siblings together)."""
+    cpus = sorted(os.sched_getaffinity(0) if cpus is None else cpus)
+    allowed = set(cpus)
+    cores: Dict[tuple, List[int]] = {}
+    for cpu in cpus:
+        topo = Path(f"/sys/devices/system/cpu/cpu{cpu}/topology")
+        try:
+            key = (int((topo / "physical_package_id").read_text()),
+                   int((topo / "core_id").read_text()))
+        except (OSError, ValueError):
+            key = (0, cpu)
+        cores.setdefault(key, []).append(cpu)
+    return [sorted(c for c in group if c in allowed)
+            for _, group in sorted(cores.items(), key=lambda kv: min(kv[1]))]
+
+
+def expand_candidates(params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Cartesian product of list-valued knobs (e.g. seed-picker output)."""
+    keys = list(params)
+    values = [v if isinstance(v, (list, tuple)) else [v] for v in params.values()]
+    seen, out = set(), []
+    for combo in itertools.product(*values):
+        key = tuple(map(str, combo))
+        if key not in seen:
+            seen.add(key)
+            out.append(dict(zip(keys, combo)))
+    return out
+
+
+class CoreScheduler:
+    """Run many candidates through one :class:`KernelEvaluator` concurrently."""
+
+    def __init__(self, evaluator: KernelEvaluator, cpus: Sequence[int] | None = None,
+                 exclusive_threads: int | None = None):
+        self.evaluator = evaluator
+        if cpus is None and evaluator.max_cores is not None:
+            cpus = sorted(os.sched_getaffinity(0))[:evaluator.max_cores]
+        self.cores = physical_cores(cpus)
+        self.exclusive_threads = exclusive_threads or len(self.cores)
+        self.log: List[Dict[str, Any]] = []
+
+    def _threads(self, params: Dict[str, Any]) -> int:
+        n = int(params.get("OMP_NUM_THREADS", len(self.cores)))
+        return max(1, min(n, len(self.cores)))
+
+    def evaluate_many(self, candidates: List[Dict[str, Any]],
+                      correct_result: Any) -> List[EvalResult]:
+        """Evaluate *candidates*; results come back in input order."""
+        self.evaluator.compile()  # once, before any concurrent run
+
+        pending = sorted(range(len(candidates)),
+                         key=lambda i: -self._threads(candidates[i]))
+        free = list(range(len(self.cores)))
+        running: Dict[Future, tuple] = {}    # future -> (candidate idx, cores)
+        results: List[EvalResult | None] = [None] * len(candidates)
+
+        with ThreadPoolExecutor(max_workers=len(self.cores)) as pool:
+            while pending or running:
+                launched = True
+                while launched and pending:
+                    launched = False
+                    for pos, idx in enumerate(pending):
+                        need = self._threads(candidates[idx])
+                        exclusive = need >= self.exclusive_threads
+                        if exclusive and running:
+                            continue
+                        if need > len(free):
+                            continue
+                        take = free if exclusive else free[:need]
+                        free = [] if exclusive else free[need:]
+                        cpus = sorted(c for core in take for c in self.cores[core])
+                        fut = pool.submit(self.evaluator.evaluate,
+                                          candidates[idx], correct_result, cpus)
+                        running[fut] = (idx, take)
+                        self.log.append({"candidate": idx, "cores": len(take),
+                                         "exclusive": exclusive, "cpus": cpus})
+                        del pending[pos]
+                        launched = True
+                        break
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for fut in done:
+                    idx, take = running.pop(fut)
+                    free = sorted(free + take)
+                    results[idx] = fut.result()
+
+        return results
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Evaluate a grid of OpenMP configurations on disjoint core sets.")
+    parser.add_argument("-src", type=Path, required=True, help="Kernel source (.c/.cpp) or prebuilt executable.")
+    parser.add_argument("-args", nargs="*", default=[], help="Arguments passed to the kernel.")
+    parser.add_argument("-correct", type=str, required=True, help="Reference checksum (last stdout line).")
+    parser.add_argument("-threads", type=int, nargs="+", required=True, help="OMP_NUM_THREADS values.")
+    parser.add_argument("-bind", nargs="+", default=["true"], help="OMP_PROC_BIND values.")
+    parser.add_argument("-schedule", nargs="+", default=["static"], help="OMP_SCHEDULE values.")
+    parser.add_argument("-places", nargs="+", default=["cores"], help="OMP_PLACES values.")
+    parser.add_argument("-repeats", type=int, default=5, help="Timed runs per candidate (default: %(default)s).")
+    parser.add_argument("-max-cores", type=int, default=None, help="Cap on cores used by the whole sweep.")
+    return parser
+
+
+def main():
+    parser = build_arg_parser()
+    args = parser.parse_args()
+
+    evaluator = KernelEvaluator(args.src, args=args.args, repeats=args.repeats,
+                                max_cores=args.max_cores)
+    scheduler = CoreScheduler(evaluator)
+    candidates = expand_candidates({"OMP_NUM_THREADS": args.threads,
+                                    "OMP_PROC_BIND": args.bind,
+                                    "OMP_SCHEDULE": args.schedule,
+                                    "OMP_PLACES": args.places})
+    results = scheduler.evaluate_many(candidates, args.correct)
+    for res in sorted(results, key=lambda r: r.median):
+        print(json.dumps(res.summary()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,59 @@
-import json
-from typing import Dict, Any
+import sys
+from pathlib import Path
+from typing import Dict, Any, List
+
+from llm_client import call_openrouter, OpenRouterClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "utils"))
+from constrained import extract_json, repair_config  # noqa: E402
+from search_space import SearchSpace  # noqa: E402
+from tracing import span  # noqa: E402
 
 class SeedPickerAgent:
     """Takes the prompt produced by PromptGenerationAgent, calls a (possibly
     smaller/faster) LLM, and returns a concrete config dict. The agent is fully
     modular: it understands only the prompt contract – *not* Programl or the
     orchestrator logic.
+
+    With a *space* the reply is repaired into it (see utils/constrained.py):
+    unknown keys dropped, values snapped to valid ones, each change logged in
+    ``last_repairs``, so an answer that is close enough costs no second call.
     """
 
-    def __init__(self, model_name: str = "google/gemma-7b-it"):
+    def __init__(self, model_name: str = "google/gemma-7b-it",
+                 space: Dict[str, List[Any]] | SearchSpace | None = None):
         self.model_name = model_name
+        self.space = space
+        self.last_repairs: List[str] = []
 
-    def pick_parameters(self, prompt_text: str) -> Dict[str, Any]:
-        messages = [
+    def _messages(self, prompt_text: str) -> List[Dict[str, str]]:
+        return [
             {"role": "system", "content": "You are a helpful agent following the user's optimisation task."},
             {"role": "user", "content": prompt_text},
         ]
-        raw_output = call_openrouter(self.model_name, messages, temperature=0.2)
-        # We assume the Seed‑Picker returns either JSON or clearly marked code‑block JSON
-        try:
-            first_brace = raw_output.index("{")
-            last_brace = raw_output.rindex("}") + 1
-            param_json = raw_output[first_brace:last_brace]
-            params = json.loads(param_json)
-        except Exception as exc:
-            raise ValueError(f"Failed to parse parameters from model output:\n{raw_output}") from exc
+
+    def pick_parameters(self, prompt_text: str) -> Dict[str, Any]:
+        # sampled, so not cached by default; with cache_sampled only replies that parse are
+        raw_output = call_openrouter(self.model_name, self._messages(prompt_text), temperature=0.2,
+                                     validate=self._parse)
+        return self._parse(raw_output)
+
+    async def apick_parameters(self, prompt_text: str, client: OpenRouterClient) -> Dict[str, Any]:
+        """Async variant; many kernels can share one pooled *client*."""
+        raw_output = await client.chat(self.model_name, self._messages(prompt_text), temperature=0.2,
+                                       validate=self._parse)
+        return self._parse(raw_output)
+
+    def _parse(self, raw_output: str) -> Dict[str, Any]:
+        # JSON anywhere in the reply (fenced, with prose, truncated) is accepted
+        with span("seed_picker.parse", chars=len(raw_output)):
+            try:
+                if self.space is None:
+                    self.last_repairs = []
+                    return extract_json(raw_output)
+                params, self.last_repairs = repair_config(raw_output, self.space)
+            except ValueError as exc:
+                raise ValueError(f"Failed to parse parameters from model output:\n{raw_output}") from exc
+        if not params:
+            raise ValueError(f"No usable parameters in model output:\n{raw_output}")
         return params
\ No newline at end of file
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+tuner.py
+
+Sample-efficient search over a discrete OpenMP configuration space
+(``SEARCH_SPACE`` / ``omp_space``), warm-started from seed-picker output.
+
+1. The seeds – ``{knob: [best, 2nd, 3rd]}`` as produced by ``pick_seeds`` /
+   ``SeedPickerAgent`` – are evaluated first: the rank-aligned configurations
+   (all firsts, all seconds, ...) and then the best-ranked combinations of
+   their product, ``max_seed_configs`` in total.
+2. After that a Tree-structured Parzen Estimator proposes each next
+   configuration: observations are split at the ``gamma`` quantile into
+   "good" and "bad", each knob gets a smoothed categorical density under
+   both (numeric knobs spread mass to neighbouring values), and of
+   ``n_candidates`` draws from the good density the one maximising
+   ``l(x) / g(x)`` that has not been evaluated yet is run.
+3. The search stops when the budget is spent, when the best value has not
+   improved by ``min_improvement`` for ``patience`` evaluations, or when the
+   space is exhausted.
+
+Failed / incorrect runs are scored ``inf`` and land in the "bad" group.
+*space* may also be a ``search_space.SearchSpace``: the tuner then searches
+its flat choices (``None`` = leave unset) but only ever proposes valid
+configurations (conditions and machine constraints respected).
+The :class:`TPETuner` ask / tell interface lets callers own the evaluation
+(see :meth:`OptimisationOrchestrator.optimise` and the replay benchmark);
+:meth:`TPETuner.run` drives a plain ``objective(params) -> seconds``.
+
+Example
+-------
+python tuner.py -src ../kernels/axpy.c -correct 3.666784e+06 -budget 12 \
+    -seeds '{"OMP_NUM_THREADS": [4, 2, 1], "OMP_SCHEDULE": ["static", "guided", "dynamic"]}'
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import math
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "utils"))
+from search_space import snap  # noqa: E402
+
+
+def _key(params: Dict[str, Any]) -> Tuple[str, ...]:
+    return tuple(str(params[k]) for k in sorted(params))
+
+
+def seed_configs(seeds: Dict[str, Any] | None, space: Dict[str, List[Any]],
+                 limit: int | None = None) -> List[Dict[str, Any]]:
+    """Configurations to try first: rank-aligned picks, then their product
+    (better-ranked combinations first), at most *limit* in total.
+
+    Knobs missing from *seeds* take the first value of *space*; seed values
+    outside *space* are snapped to the nearest valid one or ignored.
+    """
+    if not seeds:
+        return []
+    ranked: Dict[str, List[Any]] = {}
+    for knob, choices in space.items():
+        raw = seeds.get(knob, [])
+        raw = raw if isinstance(raw, (list, tuple)) else [raw]
+        vals = [v for v in (snap(r, choices) for r in raw) if v is not None]
+        ranked[knob] = list(dict.fromkeys(vals)) or [choices[0]]
+
+    knobs = list(space)
+    depth = max(len(v) for v in ranked.values())
+    aligned = [{k: ranked[k][min(i, len(ranked[k]) - 1)] for k in knobs} for i in range(depth)]
+    product = [dict(zip(knobs, combo)) for combo in itertools.product(*(ranked[k] for k in knobs))]
+    # product in "rank sum" order: combinations of better-ranked values first
+    product.sort(key=lambda p: sum(ranked[k].index(p[k]) for k in knobs))
+    out, seen = [], set()
+    for cfg in aligned + product:
+        if _key(cfg) not in seen:
+            seen.add(_key(cfg))
+            out.append(cfg)
+    return out[:limit]
+
+
+class TPETuner:
+    """Ask / tell TPE over a dict of discrete knob -> choices."""
+
+    def __init__(
+        self,
+        space: Dict[str, List[Any]],
+        seeds: Dict[str, Any] | None = None,
+        budget: int = 30,
+        gamma: float = 0.25,
+        n_candidates: int = 24,
+        n_startup: int = 5,
+        max_seed_configs: int = 6,
+        patience: int = 10,
+        min_improvement: float = 0.01,
+        prior_weight: float = 1.0,
+        random_state: int | None = 0,
+    ):
+        self.structured = space if hasattr(space, "is_valid") else None
+        if self.structured is not None:
+            space = self.structured.choices(include_unset=True)
+        self.space = {k: list(v) for k, v in space.items()}
+        self.budget = budget
+        self.gamma = gamma
+        self.n_candidates = n_candidates
+        self.n_startup = n_startup
+        self.patience = patience
+        self.min_improvement = min_improvement
+        self.prior_weight = prior_weight
+        self.rng = np.random.default_rng(random_state)
+        self.size = self.structured.size() if self.structured is not None else \
+            math.prod(len(v) for v in self.space.values())
+
+        self.history: List[Tuple[Dict[str, Any], float]] = []
+        self.trace: List[float] = []           # best-so-far after each evaluation
+        self.stop_reason: str | None = None
+        self._seen: set = set()
+        self._pending: List[Dict[str, Any]] = [
+            c for c in seed_configs(seeds, self.space) if self._valid(c)][:max_seed_configs]
+        self._since_improvement = 0
+
+    # -- state -------------------------------------------------------------- #
+    @property
+    def best(self) -> Tuple[Dict[str, Any] | None, float]:
+        if not self.history:
+            return None, math.inf
+        return min(self.history, key=lambda h: h[1])
+
+    def done(self) -> bool:
+        if len(self.history) >= self.budget:
+            self.stop_reason = "budget"
+        elif len(self._seen) >= self.size:
+            self.stop_reason = "exhausted"
+        elif self.patience and self._since_improvement >= self.patience and not self._pending:
+            self.stop_reason = "converged"
+        return self.stop_reason is not None
+
+    def tell(self, params: Dict[str, Any], value: float):
+        value = float(value) if value is not None and np.isfinite(value) else math.inf
+        prev = self.best[1]
+        self._seen.add(_key(params))
+        self.history.append((dict(params), value))
+        if value < prev * (1 - self.min_improvement):
+            self._since_improvement = 0
+        else:
+            self._since_improvement += 1
+        self.trace.append(self.best[1])
+
+    # -- proposals ---------------------------------------------------------- #
+    def _valid(self, cfg: Dict[str, Any]) -> bool:
+        return self.structured is None or self.structured.is_valid(cfg)
+
+    def ask(self) -> Dict[str, Any] | None:
+        """Next configuration to evaluate, or ``None`` when the search is over."""
+        if self.done():
+            return None
+        while self._pending:
+            cfg = self._pending.pop(0)
+            if _key(cfg) not in self._seen:
+                self._seen.add(_key(cfg))
+                return cfg
+        if len(self.history) < self.n_startup:
+            cfg = self._random_unseen()
+        else:
+            cfg = self._tpe_proposal() or self._random_unseen()
+        if cfg is not None:
+            self._seen.add(_key(cfg))
+        return cfg
+
+    def _random_unseen(self) -> Dict[str, Any] | None:
+        for _ in range(64):
+            cfg = {k: v[self.rng.integers(len(v))] for k, v in self.space.items()}
+            if _key(cfg) not in self._seen and self._valid(cfg):
+                return cfg
+        product = (dict(zip(self.space, combo)) for combo in itertools.product(*self.space.values()))
+        unseen = [cfg for cfg in product if _key(cfg) not in self._seen and self._valid(cfg)]
+        return unseen[self.rng.integers(len(unseen))] if unseen else None
+
+    def _density(self, knob: str, configs: List[Dict[str, Any]]) -> np.ndarray:
+        choices = self.space[knob]
+        n = len(choices)
+        weights = np.full(n, self.prior_weight / n)
+        idx = np.array([choices.index(c[knob]) for c in configs], dtype=int)
+        numeric = all(isinstance(c, (int, float)) for c in choices)
+        if numeric and n > 1:
+            # ordinal kernel: mass spreads to neighbouring values
+            pos = np.arange(n)
+            for i in idx:
+                k = np.exp(-0.5 * ((pos - i) / max(1.0, n / 8)) ** 2)
+                weights += k / k.sum()
+        else:
+            np.add.at(weights, idx, 1.0)
+        return weights / weights.sum()
+
+    def _tpe_proposal(self) -> Dict[str, Any] | None:
+        ordered = sorted(self.history, key=lambda h: h[1])
+        n_good = max(1, int(math.ceil(self.gamma * len(ordered))))
+        good = [p for p, _ in ordered[:n_good]]
+        bad = [p for p, _ in ordered[n_good:]] or good
+
+        l = {k: self._density(k, good) for k in self.space}
+        g = {k: self._density(k, bad) for k in self.space}
+        best_cfg, best_score = None, -math.inf
+        for _ in range(self.n_candidates):
+            cfg, score = {}, 0.0
+            for k, choices in self.space.items():
+                i = int(self.rng.choice(len(choices), p=l[k]))
+                cfg[k] = choices[i]
+                score += math.log(l[k][i]) - math.log(g[k][i])
+            if _key(cfg) not in self._seen and score > best_score and self._valid(cfg):
+                best_cfg, best_score = cfg, score
+        return best_cfg
+
+    # -- driver ------------------------------------------------------------- #
+    def run(self, objective: Callable[[Dict[str, Any]], float]) -> Tuple[Dict[str, Any] | None, float]:
+        while True:
+            cfg = self.ask()
+            if cfg is None:
+                break
+            self.tell(cfg, objective(cfg))
+        return self.best
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Seed-warm-started TPE tuning of an OpenMP kernel.")
+    parser.add_argument("-src", type=Path, required=True, help="Kernel source (.c/.cpp) or prebuilt executable.")
+    parser.add_argument("-args", nargs="*", default=[], help="Arguments passed to the kernel.")
+    parser.add_argument("-correct", type=str, required=True, help="Reference checksum (last stdout line).")
+    parser.add_argument("-seeds", type=str, default=None, help="Seed JSON (string or file) from a seed picker.")
+    parser.add_argument("-space", type=str, default=None, help="Search-space JSON (string or file); default below.")
+    parser.add_argument("-budget", type=int, default=20, help="Maximum kernel evaluations (default: %(default)s).")
+    parser.add_argument("-patience", type=int, default=10, help="Stop after this many non-improving evaluations.")
+    parser.add_argument("-repeats", type=int, default=3, help="Timed runs per evaluation (default: %(default)s).")
+    parser.add_argument("-max-cores", type=int, default=None, help="Cap on cores / threads used by a run.")
+    return parser
+
+
+def _json_arg(value: str | None) -> Any:
+    if value is None:
+        return None
+    path = Path(value)
+    return json.loads(path.read_text() if path.exists() else value)
+
+
+def main():
+    from evaluator import KernelEvaluator
+
+    parser = build_arg_parser()
+    args = parser.parse_args()
+    space = _json_arg(args.space) or {
+        "OMP_NUM_THREADS": [1, 2, 4, 8, 16, 32, 64],
+        "OMP_PROC_BIND": ["true", "false", "close", "spread"],
+        "OMP_SCHEDULE": ["static", "dynamic", "guided"],
+    }
+    evaluator = KernelEvaluator(args.src, args=args.args, repeats=args.repeats,
+                                max_cores=args.max_cores)
+
+    def objective(params):
+        res = evaluator.evaluate(params, args.correct)
+        print(json.dumps(res.summary()))
+        return res.median if res.correct else math.inf
+
+    tuner = TPETuner(space, _json_arg(args.seeds), budget=args.budget, patience=args.patience)
+    best, value = tuner.run(objective)
+    print(f"Best after {len(tuner.history)} evaluation(s) ({tuner.stop_reason}): "
+          f"{json.dumps(best)} -> {value:.4f}s")
+
+
+if __name__ == "__main__":
+    main()
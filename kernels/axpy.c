@@ -0,0 +1,44 @@
+/*
+ * axpy.c -- tiny OpenMP kernel for exercising agents/evaluator.py locally.
+ *
+ * Uses schedule(runtime) so OMP_SCHEDULE takes effect.  Prints the kernel time
+ * ("TIME: <seconds>") and a checksum on the last line.
+ *
+ *   cc -O3 -fopenmp axpy.c -o axpy && OMP_NUM_THREADS=4 ./axpy [n] [iters]
+ */
+#include <omp.h>
+#include <stdio.h>
+#include <stdlib.h>
+
+int main(int argc, char **argv)
+{
+    long n = argc > 1 ? atol(argv[1]) : 1L << 20;
+    int iters = argc > 2 ? atoi(argv[2]) : 10;
+    double *x = malloc(n * sizeof(double));
+    double *y = malloc(n * sizeof(double));
+    double sum = 0.0;
+
+    #pragma omp parallel for schedule(runtime)
+    for (long i = 0; i < n; i++) {
+        x[i] = (double)(i % 1000) * 1e-3;
+        y[i] = 1.0;
+    }
+
+    double t0 = omp_get_wtime();
+    for (int it = 0; it < iters; it++) {
+        #pragma omp parallel for schedule(runtime)
+        for (long i = 0; i < n; i++)
+            y[i] = 0.5 * x[i] + y[i];
+    }
+    double t1 = omp_get_wtime();
+
+    #pragma omp parallel for schedule(static) reduction(+:sum)
+    for (long i = 0; i < n; i++)
+        sum += y[i];
+
+    printf("TIME: %.9f\n", t1 - t0);
+    printf("%.6e\n", sum);
+    free(x);
+    free(y);
+    return 0;
+}
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+batch_seeds.py
+
+Seed picking for a whole kernel suite in one process instead of a shell loop
+of cold starts.
+
+1. Collect ``.ll`` files from a directory (recursively) or a manifest
+   (one path per line, or a JSON list).
+2. Look the kernels up in the feature index (``utils/feature_index.py``) and
+   analyse only the new / changed ones, across worker processes.
+3. Send the prompts to the backend
+     local   – model loaded once, prompts batched into ``generate`` calls
+     gguf    – int8 / int4 GGUF model on the CPU through llama.cpp
+               (``--model file.gguf --threads N``, ``sd_pkr_agent_gguf.py``);
+               parity with ``local`` only measured on a stand-in model so far
+     server  – a running ``seed_server.py`` (it batches on its side)
+     openai  – two‑turn picker, requests issued concurrently
+     hf      – HF Inference API, requests issued concurrently
+     surrogate – no LLM: ranks the space with a trained ``utils/surrogate.py``
+               model (``--model surrogate_amd.pkl``)
+     transfer  – no LLM: rescales another machine's sweep of the same kernel
+               to ``--machine`` (``utils/transfer.py``; ``--model`` is the
+               source CSV, ``--source-machine`` its descriptor)
+4. Write one JSONL line per kernel with its seeds and per‑kernel timings.
+
+``--trace run.jsonl`` (or ``AATUNE_TRACE``) records spans for each phase and
+kernel plus token / cache counters (``utils/tracing.py``).
+
+Usage
+-----
+python batch_seeds.py --irs ../llvm-ir --backend local --out seeds.jsonl
+python batch_seeds.py --irs ../llvm-ir --backend gguf --model mistral-q4_k_m.gguf --threads 32 --out seeds_q4.jsonl
+python batch_seeds.py --irs kernels.txt --backend openai --model gpt-4o-mini --jobs 16
+python batch_seeds.py --irs ../llvm-ir --backend transfer --model ../performance_data/all_results_amd.csv \
+    --source-machine amd --machine intel
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "utils"))
+from feature_index import FeatureIndex, default_index  # noqa: E402
+from ir_features import compact_features  # noqa: E402
+from machines import resolve_machine  # noqa: E402
+import tracing  # noqa: E402
+from tracing import span  # noqa: E402
+
+BACKENDS = ("gguf", "hf", "local", "openai", "server", "surrogate", "transfer")
+
+
+def collect_irs(source: Path) -> List[Path]:
+    """``.ll`` files under a directory, or the paths listed in a manifest."""
+    if source.is_dir():
+        return sorted(source.rglob("*.ll"))
+    text = source.read_text()
+    if text.lstrip().startswith("["):
+        paths = json.loads(text)
+    else:
+        paths = [ln.strip() for ln in text.splitlines()
+                 if ln.strip() and not ln.lstrip().startswith("#")]
+    return [(source.parent / p) if not Path(p).is_absolute() else Path(p) for p in paths]
+
+
+def extract_all(irs: List[Path], workers: int, index: FeatureIndex) -> List[tuple]:
+    """(ir, features, seconds, error) per kernel; index hits cost 0 s."""
+    built = index.build("ir", irs, workers)
+    return [(ir, compact_features(data) if err is None else None, secs, err)
+            for ir, (data, secs, err) in built.items()]
+
+
+# --------------------------------------------------------------------------- #
+# Backends: feats list -> list of (seeds | None, llm_seconds, error | None)    #
+# --------------------------------------------------------------------------- #
+def run_local(feats: List[dict], ns) -> List[tuple]:
+    from sd_pkr_agent import build_prompt, call_llm_batch, load_model, parse_seeds
+
+    tok, model = load_model(ns.model, ns.device, ns.dtype)
+    out = []
+    for start in range(0, len(feats), ns.batch_size):
+        chunk = feats[start:start + ns.batch_size]
+        t0 = time.perf_counter()
+        with span("seed.batch", kernels=len(chunk)):
+            texts = call_llm_batch([build_prompt(f, tok) for f in chunk], tok, model)
+        secs = (time.perf_counter() - t0) / len(chunk)
+        for text in texts:
+            try:
+                out.append((parse_seeds(text), secs, None))
+            except RuntimeError as exc:
+                out.append((None, secs, str(exc)))
+    return out
+
+
+def run_gguf(feats: List[dict], ns) -> List[tuple]:
+    from sd_pkr_agent_gguf import load_gguf, pick_seeds_from_features
+
+    llm = load_gguf(ns.model, ns.threads)
+    out = []
+    for f in feats:
+        t0 = time.perf_counter()
+        try:
+            with span("seed.kernel"):
+                out.append((pick_seeds_from_features(f, llm), time.perf_counter() - t0, None))
+        except RuntimeError as exc:
+            out.append((None, time.perf_counter() - t0, str(exc)))
+    return out
+
+
+def _concurrent(call: Callable[[dict], dict], feats: List[dict], jobs: int) -> List[tuple]:
+    def one(f):
+        t0 = time.perf_counter()
+        try:
+            with span("seed.kernel"):
+                return call(f), time.perf_counter() - t0, None
+        except Exception as exc:
+            return None, time.perf_counter() - t0, str(exc)
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(one, feats))
+
+
+def run_openai(feats: List[dict], ns) -> List[tuple]:
+    import openai
+    from sd_pkr_agent_openai import pick_seeds_from_features
+
+    openai.api_key = ns.key or os.getenv("OPENAI_API_KEY")
+    machine = resolve_machine(ns.machine) if ns.machine else None
+    return _concurrent(lambda f: pick_seeds_from_features(f, ns.model, verbose=False, machine=machine),
+                       feats, ns.jobs)
+
+
+def run_hf(feats: List[dict], ns) -> List[tuple]:
+    from sd_pkr_agent_hf_api import build_prompt, call_hf_api
+
+    token = ns.key or os.getenv("HF_TOKEN")
+    return _concurrent(lambda f: call_hf_api(build_prompt(f), ns.model, token),
+                       feats, ns.jobs)
+
+
+def run_surrogate(feats: List[dict], ns) -> List[tuple]:
+    from surrogate import SurrogateModel
+
+    model = SurrogateModel.load(ns.model)
+    out = []
+    for f in feats:
+        t0 = time.perf_counter()
+        out.append((model.seeds(f), time.perf_counter() - t0, None))
+    return out
+
+
+def run_transfer(irs: List[str], ns) -> List[tuple]:
+    from perf_store import load_results
+    from transfer import profile_from_runs, transfer_rank, transfer_seeds
+
+    df = load_results(ns.model)
+    source, target = resolve_machine(ns.source_machine), resolve_machine(ns.machine)
+    out = []
+    for ir in irs:
+        t0 = time.perf_counter()
+        try:
+            ranked = transfer_rank([(profile_from_runs(df, Path(ir).stem, source), source)], target)
+            out.append((transfer_seeds(ranked), time.perf_counter() - t0, None))
+        except ValueError as exc:
+            out.append((None, time.perf_counter() - t0, str(exc)))
+    return out
+
+
+def run_server(irs: List[str], ns) -> List[tuple]:
+    import socket
+
+    def call(ir):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.connect(str(ns.socket))
+            s.sendall((json.dumps({"ir": os.path.abspath(ir)}) + "\n").encode())
+            reply = json.loads(s.makefile().readline())
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        return reply["seeds"]
+
+    return _concurrent(call, irs, ns.jobs)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Batch seed picking over a directory / manifest of LLVM‑IR files.")
+    ap.add_argument("--irs", type=Path, required=True, help="Directory of .ll files or manifest file")
+    ap.add_argument("--backend", choices=BACKENDS, default="local",
+                    help="gguf: seed parity with local not yet measured on Mistral")
+    ap.add_argument("--out", type=Path, default=Path("seeds.jsonl"))
+    ap.add_argument("--model", default=None, help="Model path / id for the backend")
+    ap.add_argument("--key", default=None, help="API key / HF token (else env)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count(), help="Feature‑extraction processes")
+    ap.add_argument("--jobs", type=int, default=8, help="Concurrent remote requests")
+    ap.add_argument("--batch-size", type=int, default=8, help="Prompts per generate() call (local)")
+    ap.add_argument("--device", default="auto")
+    ap.add_argument("--dtype", default="float16")
+    ap.add_argument("--threads", type=int, default=None, help="CPU threads for the gguf backend")
+    ap.add_argument("--socket", type=Path, default=Path("/tmp/aatune_seeds.sock"))
+    ap.add_argument("--no-feature-index", action="store_true", help="Re-analyse every IR, ignore the feature index")
+    ap.add_argument("--machine", default=None, help="Target machine preset (amd/intel) or JSON descriptor")
+    ap.add_argument("--source-machine", default="amd", help="Machine the --model CSV was recorded on (transfer)")
+    ap.add_argument("--trace", type=Path, default=None, help="Write spans / counters here (.jsonl, or .json for Chrome)")
+    ns = ap.parse_args()
+    if ns.trace is not None:
+        tracing.enable(ns.trace)
+
+    if ns.model is None and ns.backend == "gguf":
+        ap.error("--backend gguf needs --model <quantised .gguf file>")
+    if ns.model is None and ns.backend == "surrogate":
+        ap.error("--backend surrogate needs --model <trained surrogate .pkl>")
+    if ns.backend == "transfer" and (ns.model is None or ns.machine is None):
+        ap.error("--backend transfer needs --model <source sweep CSV> and --machine <target>")
+    if ns.model is None:
+        ns.model = {"local": "/lus/grand/projects/EE-ECP/araf/llms/mistral",
+                    "openai": "gpt-4o-mini",
+                    "hf": "mistralai/Mistral-7B-Instruct-v0.2"}.get(ns.backend)
+
+    irs = collect_irs(ns.irs)
+    if not irs:
+        ap.error(f"no .ll files found in {ns.irs}")
+    print(f"{len(irs)} kernel(s); extracting features with {ns.workers} process(es)…", file=sys.stderr)
+
+    t0 = time.perf_counter()
+    index = default_index()
+    index.enabled = index.enabled and not ns.no_feature_index
+    with span("seed.features", kernels=len(irs)):
+        extracted = extract_all(irs, ns.workers, index)
+    ok = [row for row in extracted if row[3] is None]
+
+    with span("seed.backend", backend=ns.backend, kernels=len(ok)):
+        if ns.backend == "server":
+            answers = run_server([row[0] for row in ok], ns)
+        elif ns.backend == "transfer":
+            answers = run_transfer([row[0] for row in ok], ns)
+        else:
+            runner = {"local": run_local, "gguf": run_gguf, "openai": run_openai, "hf": run_hf,
+                      "surrogate": run_surrogate}[ns.backend]
+            answers = runner([row[1] for row in ok], ns)
+    answer_of: Dict[str, tuple] = {row[0]: ans for row, ans in zip(ok, answers)}
+
+    ns.out.parent.mkdir(parents=True, exist_ok=True)
+    n_ok = 0
+    with open(ns.out, "w") as fp:
+        for ir, feats, feat_secs, feat_err in extracted:
+            record = {"kernel": Path(ir).stem, "ir": ir, "backend": ns.backend,
+                      "features": feats, "feature_seconds": round(feat_secs, 4)}
+            if feat_err is not None:
+                record["error"] = feat_err
+            else:
+                seeds, llm_secs, err = answer_of[ir]
+                record["llm_seconds"] = round(llm_secs, 4)
+                if err is None:
+                    record["seeds"] = seeds
+                    n_ok += 1
+                else:
+                    record["error"] = err
+            fp.write(json.dumps(record) + "\n")
+
+    print(f"Seeds for {n_ok}/{len(irs)} kernel(s) written to '{ns.out}' "
+          f"in {time.perf_counter() - t0:.1f}s.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
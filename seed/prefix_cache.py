@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+prefix_cache.py
+
+KV-cache reuse for the local seed picker: the static part of the prompt
+(chat template, system message, example block, search space, task) is
+prefilled once per model and every kernel only prefills its own features.
+
+* :class:`PrefixKVCache` keeps a few KV states keyed by the token ids they
+  cover (LRU).  A new prompt starts from the entry with the longest common
+  token prefix (cropped to it); if that is shorter than the static prefix,
+  the static prefix is extended from it and stored as a new entry.
+* :meth:`PrefixKVCache.generate` runs a batch on top of the shared state:
+  rows are ``prefix + padding + own suffix``, so the prefix stays aligned
+  and the attention mask / position ids (derived from the mask by
+  ``generate``) skip the padding.
+* With ``keep_turn`` a single-row ``generate`` keeps the whole turn (prompt
+  + reply) as an entry, so a follow-up turn of the same conversation (the
+  critic turn) prefills only the reply's last token and the new instruction.
+
+Counters ``llm.prefix_hits`` / ``llm.prefix_tokens_reused`` go to the trace
+(``utils/tracing.py``).
+"""
+
+from __future__ import annotations
+
+import copy
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple
+
+import torch
+
+from tracing import count, span
+
+MAX_ENTRIES = 4          # each entry is a full KV state of its prefix
+
+
+def common_prefix_len(a: Sequence[int], b: Sequence[int]) -> int:
+    """Number of leading tokens *a* and *b* share."""
+    n = min(len(a), len(b))
+    for i in range(n):
+        if a[i] != b[i]:
+            return i
+    return n
+
+
+def _crop(cache, length: int):
+    extra = cache.get_seq_length() - length
+    if extra > 0:
+        cache.crop(-extra)          # negative: remove that many tokens
+    return cache
+
+
+class PrefixKVCache:
+    """Reusable KV states of token prefixes for one model."""
+
+    def __init__(self, model, max_entries: int = MAX_ENTRIES):
+        self.model = model
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Tuple[int, ...], object]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.reused_tokens = 0
+
+    # -- entries ------------------------------------------------------------ #
+    def _best(self, ids: Sequence[int]) -> Tuple[Tuple[int, ...] | None, int]:
+        best, n = None, 0
+        for key in self.entries:
+            m = common_prefix_len(key, ids)
+            if m > n:
+                best, n = key, m
+        return best, n
+
+    def _store(self, ids: Sequence[int], cache):
+        key = tuple(ids)
+        self.entries[key] = cache
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def state(self, ids: Sequence[int], static_len: int, limit: int) -> Tuple[object | None, int]:
+        """A private copy of the KV state for ``ids[:n]`` and ``n``.
+
+        ``n`` is the longest cached match (at most *limit*); when that is
+        shorter than *static_len* the static prefix is prefilled (from the
+        match) and cached first.
+        """
+        key, n = self._best(ids)
+        n = min(n, limit)
+        if n < min(static_len, limit):
+            base = _crop(copy.deepcopy(self.entries[key]), n) if key is not None and n else None
+            target = min(static_len, limit)
+            with span("llm.prefill_prefix", tokens=target - n), torch.inference_mode():
+                out = self.model(torch.tensor([list(ids[n:target])], device=self.model.device),
+                                 past_key_values=base, use_cache=True)
+            self._store(ids[:target], out.past_key_values)
+            self.misses += 1
+            key, n = tuple(ids[:target]), target
+        elif key is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            count("llm.prefix_hits")
+        if key is None or n == 0:
+            return None, 0
+        self.reused_tokens += n
+        count("llm.prefix_tokens_reused", n)
+        return _crop(copy.deepcopy(self.entries[key]), n), n
+
+    # -- generation --------------------------------------------------------- #
+    def generate(self, rows: List[List[int]], static_len: int, pad_id: int,
+                 keep_turn: bool = False, **gen_kwargs):
+        """``generate`` for token-id *rows* reusing cached prefixes.
+
+        Returns ``(sequences, prompt_len)``; generated tokens start at
+        ``prompt_len`` in every row.
+        """
+        shared = min(common_prefix_len(rows[0], r) for r in rows)
+        # at least one prompt token must be left for generate() to prefill
+        limit = min(shared, min(len(r) for r in rows) - 1)
+        cache, n = self.state(rows[0], static_len, limit)
+
+        width = max(len(r) - n for r in rows)
+        input_ids, mask = [], []
+        for r in rows:
+            pad = width - (len(r) - n)
+            input_ids.append(list(r[:n]) + [pad_id] * pad + list(r[n:]))
+            mask.append([1] * n + [0] * pad + [1] * (len(r) - n))
+        device = self.model.device
+        input_ids = torch.tensor(input_ids, device=device)
+        mask = torch.tensor(mask, device=device)
+        if cache is not None and len(rows) > 1:
+            cache.batch_repeat_interleave(len(rows))
+
+        with torch.inference_mode():
+            out = self.model.generate(input_ids=input_ids, attention_mask=mask,
+                                      past_key_values=cache, return_dict_in_generate=True,
+                                      **gen_kwargs)
+        if keep_turn and len(rows) == 1 and out.past_key_values is not None:
+            seen = out.past_key_values.get_seq_length()
+            self._store(out.sequences[0, :seen].tolist(), out.past_key_values)
+        return out.sequences, input_ids.size(-1)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses,
+                "reused_tokens": self.reused_tokens}
+
+
+def prefix_cache(model) -> PrefixKVCache:
+    """The prefix cache of *model*, kept on the model (it goes away with it)."""
+    kv = getattr(model, "_aatune_prefix_cache", None)
+    if kv is None:
+        kv = model._aatune_prefix_cache = PrefixKVCache(model)
+    return kv
@@ -5,129 +5,142 @@ sd_picker_agent.py
 Given an LLVM‑IR file, ask a local Mistral‑style LLM to emit **3 warm‑start
 configurations** (one per parameter) that are likely to minimise execution time.
 
+Generation is constrained to ``SEARCH_SPACE`` (``utils/constrained.py``): only
+tokens that keep the reply a prefix of a valid answer can be sampled, so every
+reply parses and every value is in the space.
+
+The kernel's features come last in the prompt, so everything before them
+(system message, example block, search space, task) is one static prefix
+whose KV state is prefilled once per model and reused for every kernel
+(``prefix_cache.py``); with ``critic`` a second turn re-checks the draft on
+top of the first turn's KV state.
+
 Author: Md Arafat Hossain
 """
 
 from pathlib import Path
 import json
-import re
+import sys
 import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM, TextStreamer
+from transformers import AutoTokenizer, AutoModelForCausalLM
+
+# single-pass llvmlite extractor shared by all seed pickers, cached by IR hash
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "utils"))
+from feature_index import indexed_features
+from constrained import token_constraint
+from tracing import count, span, traced
+from prefix_cache import common_prefix_len, prefix_cache
+# prompt / grammar / parsing, shared with the torch-free GGUF backend
+from seed_prompt import (CRITIC_MSG, GRAMMAR, MAX_NEW_TOKENS, SEARCH_SPACE,  # noqa: F401
+                         SPACE, chat_messages, parse_seeds)
 
 MODEL_PATH="/lus/grand/projects/EE-ECP/araf/llms/mistral"
 
-SEARCH_SPACE = {
-    "OMP_NUM_THREADS": [4, 8, 16, 24, 32, 40, 48],
-    "OMP_PROC_BIND":  ["true", "false", "close", "spread"],
-    "OMP_SCHEDULE":   ["static", "dynamic", "guided"]
-}
-MAX_NEW_TOKENS = 256
-
-
-def extract_features(ir_src: str) -> dict:
-    n_load   = len(re.findall(r"\bload\b",  ir_src))
-    n_store  = len(re.findall(r"\bstore\b", ir_src))
-    n_arith  = len(re.findall(r"\b(add|fadd|sub|mul|fmul|div|fdiv)\b", ir_src))
-    mem_int  = (n_load + n_store) / max(1, n_arith)
-
-    indent   = [len(m.group(1)) for m in re.finditer(r"(\s*)br label", ir_src)]
-    loop_depth = max(indent) // 2 if indent else 0
-
-    bound = ("memory" if mem_int > 2
-             else "compute" if mem_int < 0.5
-             else "mixed")
-    return {"bound": bound,
-            "mem_intensity": round(mem_int, 2),
-            "loop_depth": loop_depth}
-
-
-SYSTEM_MSG = "You are an HPC kernel seed‑picker."
-
-EXAMPLE_BLOCK = """
-EXAMPLE INPUT
-STATIC_FEATURES:
-{"bound":"memory","loop_depth":2}
-SEARCH_SPACE:
-{"OMP_NUM_THREADS":[4,8],"OMP_PROC_BIND":["true","close"],
- "OMP_SCHEDULE":["static","dynamic"]}
-
-EXAMPLE OUTPUT
-{
-  "OMP_NUM_THREADS": [8,4,4],
-  "OMP_PROC_BIND": ["close","true","true"],
-  "OMP_SCHEDULE": ["dynamic","static","static"]
-}
-""".strip()
-
-USER_TEMPLATE = """
-STATIC_FEATURES:
-{features_json}
+_FEATURES_MARK = "\x00FEATURES\x00"
 
-SEARCH_SPACE:
-{search_json}
 
-TASK:
-Choose exactly THREE candidate values **per knob** that you believe will
-minimise runtime.
-
-FORMAT (return ONLY this, no markdown, no prose):
-{{
-  "OMP_NUM_THREADS": [<int1>, <int2>, <int3>],
-  "OMP_PROC_BIND" : ["<str1>", "<str2>", "<str3>"],
-  "OMP_SCHEDULE"  : ["<str1>", "<str2>", "<str3>"]
-}}
-
-• Rank values best→worst inside each list.
-• Think step‑by‑step **internally**, then output only the JSON.
-""".strip()
+def build_prompt(feats: dict, tok) -> str:
+    return tok.apply_chat_template(chat_messages(feats), tokenize=False)
 
 
-def build_prompt(feats: dict, tok) -> str:
-    user = EXAMPLE_BLOCK + "\n\n" + USER_TEMPLATE.format(
-        features_json=json.dumps(feats, separators=(",", ":")),
-        search_json=json.dumps(SEARCH_SPACE, separators=(",", ":"))
-    )
+def critic_prompt(feats: dict, draft: str, tok) -> str:
+    """Second turn: the first conversation, the draft, and the critic request."""
     return tok.apply_chat_template(
-        [{"role": "system", "content": SYSTEM_MSG},
-         {"role": "user",   "content": user}],
+        chat_messages(feats) + [{"role": "assistant", "content": draft},
+                            {"role": "user",      "content": CRITIC_MSG}],
         tokenize=False
     )
 
-def call_llm(prompt: str, tok, model):
-    inputs = tok.encode(prompt, return_tensors="pt").to(model.device)
-    brace_id = tok.convert_tokens_to_ids("}")
 
-    gen_out = model.generate(
-        inputs,
-        max_new_tokens=MAX_NEW_TOKENS,
-        temperature=0.0,        # deterministic
-        do_sample=False,
-        eos_token_id=brace_id   # stop at first closing brace
+def static_prefix_ids(tok) -> list:
+    """Token ids of the prompt up to the kernel features (same for every kernel)."""
+    ids = getattr(tok, "_aatune_static_ids", None)
+    if ids is None:
+        text = build_prompt(_FEATURES_MARK, tok).split(_FEATURES_MARK)[0]
+        ids = tok(text, add_special_tokens=False)["input_ids"]
+        tok._aatune_static_ids = ids
+    return ids
+
+@traced("llm.load_model")
+def load_model(model_path: str = MODEL_PATH, device: str = "auto",
+               dtype: str = "float16"):
+    """Load tokenizer + model once; ``device="cpu", dtype="float32"`` for tests."""
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    tokenizer.padding_side = "left"          # batched generation
+    model = AutoModelForCausalLM.from_pretrained(
+        model_path,
+        dtype=getattr(torch, dtype),
+        device_map=device if device == "auto" else None,
     )
-    text = tok.decode(gen_out[0][inputs.size(-1):], skip_special_tokens=True)
-
-    # Ensure we captured the closing brace
-    json_block = text if text.endswith("}") else text.split("}")[0] + "}"
-    try:
-        return json.loads(json_block)
-    except json.JSONDecodeError as e:
-        raise RuntimeError(f"Bad JSON from LLM:\n{text}") from e
+    if device != "auto":
+        model = model.to(device)
+    model.eval()
+    return tokenizer, model
 
-def pick_seeds(ir_path: Path):
-    ir_src  = ir_path.read_text()
-    feats   = extract_features(ir_src)
 
-    print("Loading Mistral model locally...")
-    tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
-    model = AutoModelForCausalLM.from_pretrained(
-        MODEL_PATH, 
-        torch_dtype=torch.float16, 
-        device_map="auto"
-    )
-    print("Model loaded successfully!\n")
+def _constraint_kwargs(tok, prompt_len: int, constrained: bool) -> dict:
+    brace_id = tok.convert_tokens_to_ids("}")
+    if not constrained:
+        return {"eos_token_id": brace_id}   # stop at first closing brace
+    fn = token_constraint(tok, GRAMMAR).prefix_fn(prompt_len)
+    return {"eos_token_id": [i for i in (brace_id, tok.eos_token_id) if i is not None],
+            "prefix_allowed_tokens_fn": fn}
+
+
+def call_llm_batch(prompts: list, tok, model, constrained: bool = True,
+                   reuse_prefix: bool = True, keep_turn: bool = False) -> list:
+    """One ``generate`` call for many prompts; returns raw completions.
+
+    With *reuse_prefix* the static prompt prefix (and, for one prompt, the
+    longest cached earlier turn) is not prefilled again; *keep_turn* caches
+    this turn for a follow-up (critic) turn.
+    """
+    gen_kwargs = dict(max_new_tokens=MAX_NEW_TOKENS,
+                      do_sample=False,        # deterministic
+                      pad_token_id=tok.pad_token_id)
+    if reuse_prefix:
+        rows = tok(prompts, add_special_tokens=False)["input_ids"]
+        static = static_prefix_ids(tok)
+        static_len = min(common_prefix_len(static, r) for r in rows)
+        width = max(len(r) for r in rows)
+        kv = prefix_cache(model)
+        reused = kv.reused_tokens
+        with span("llm.generate", batch=len(prompts)):
+            gen_out, start = kv.generate(rows, static_len, tok.pad_token_id, keep_turn,
+                                         **gen_kwargs, **_constraint_kwargs(tok, width, constrained))
+        count("llm.tokens_in", sum(len(r) for r in rows) - (kv.reused_tokens - reused))
+    else:
+        batch = tok(prompts, return_tensors="pt", padding=True,
+                    add_special_tokens=False).to(model.device)
+        start = batch["input_ids"].size(-1)
+        with span("llm.generate", batch=len(prompts)), torch.inference_mode():
+            gen_out = model.generate(**batch, **gen_kwargs,
+                                     **_constraint_kwargs(tok, start, constrained))
+        count("llm.tokens_in", int(batch["attention_mask"].sum()))
+    count("llm.tokens_out", int((gen_out[:, start:] != tok.pad_token_id).sum()))
+    return [tok.decode(row[start:], skip_special_tokens=True) for row in gen_out]
+
+
+def call_llm(prompt: str, tok, model, constrained: bool = True, keep_turn: bool = False):
+    text = call_llm_batch([prompt], tok, model, constrained, keep_turn=keep_turn)[0]
+    return text, parse_seeds(text)
+
+def pick_seeds(ir_path: Path, model_path: str = MODEL_PATH, tokenizer=None, model=None,
+               constrained: bool = True, critic: bool = False):
+    feats   = indexed_features(ir_path)
+
+    if model is None:
+        print("Loading Mistral model locally...")
+        tokenizer, model = load_model(model_path)
+        print("Model loaded successfully!\n")
 
     prompt  = build_prompt(feats, tokenizer)
-    seeds   = call_llm(prompt, tokenizer, model)
+    draft, seeds = call_llm(prompt, tokenizer, model, constrained, keep_turn=critic)
+    if critic:
+        # the draft turn's KV state is cached: only the critic request is prefilled
+        _, seeds = call_llm(critic_prompt(feats, draft, tokenizer), tokenizer, model, constrained)
 
     print(json.dumps(seeds, indent=2))
     return seeds
@@ -139,6 +152,8 @@ if __name__ == "__main__":
                                                "for an OpenMP kernel.")
     argp.add_argument("-ir", help="Path to LLVM‑IR file")
     argp.add_argument("-model", default=("/lus/grand/projects/EE-ECP/araf/llms/mistral"), help="HF or GGUF folder for the Mistral model", required=False)
+    argp.add_argument("-unconstrained", action="store_true", help="Free generation (replies repaired afterwards)")
+    argp.add_argument("-critic", action="store_true", help="Second turn that checks the draft against the space")
     ns = argp.parse_args()
 
-    pick_seeds(Path(ns.ir))
+    pick_seeds(Path(ns.ir), ns.model, constrained=not ns.unconstrained, critic=ns.critic)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+sd_pkr_agent_gguf.py
+
+CPU seed picker: the prompt, search space and parsing of ``sd_pkr_agent.py``
+(from ``seed_prompt.py``, so neither torch nor transformers is needed), run on
+an int8 / int4 quantised GGUF model through llama.cpp
+(``pip install llama-cpp-python``) instead of the fp16 ``transformers`` model,
+so login and CPU-only compute nodes get seeds in seconds.
+
+* The GGUF file is memory-mapped (``use_mmap``): loading is bounded by the
+  page cache and concurrent pickers on a node share one copy of the weights.
+* Prefill and decode run on ``--threads`` CPU threads (default: llama.cpp's
+  choice, about the physical cores); no layer is offloaded to a GPU.
+* Replies are constrained by the GBNF form of ``SeedGrammar``
+  (``utils/constrained.py``), so they always parse into the space.
+* llama.cpp keeps the last prompt's KV state and only evaluates from the
+  first differing token; the kernel features come last in the prompt, so
+  consecutive kernels prefill only their own features.
+
+Quantise once with llama.cpp (Q8_0 = int8, Q4_K_M = int4):
+    python convert_hf_to_gguf.py <mistral> --outtype f16 --outfile mistral-f16.gguf
+    llama-quantize mistral-f16.gguf mistral-q4_k_m.gguf Q4_K_M
+On CPUs that advertise AMX without kernel support, build llama-cpp-python with
+``CMAKE_ARGS="-DGGML_NATIVE=OFF"`` (quantised kernels die with SIGILL otherwise).
+
+Seed-quality parity with the fp16 path: ``agents/bench_strategies.py -parity``
+over the two ``batch_seeds.py`` outputs (``--backend local`` / ``gguf``).
+Measured so far only on a small stand-in Llama model (random weights, one
+recorded kernel, 3mm_kernel_p1): the f16 GGUF reproduces the ``local`` fp16
+seeds exactly, Q8_0 keeps 67% of the top-ranked values and Q4_K_M none.
+Quantisation does move the greedy seeds; repeat the comparison with the real
+Q8_0 / Q4_K_M Mistral files before switching the tuning runs to them.
+
+Usage
+-----
+python sd_pkr_agent_gguf.py --ir kernel.ll --model mistral-q4_k_m.gguf --threads 32
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+try:
+    from llama_cpp import Llama, LlamaGrammar
+except ImportError:
+    Llama = LlamaGrammar = None
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "utils"))
+from feature_index import indexed_features
+from tracing import count, span
+
+from seed_prompt import GRAMMAR, MAX_NEW_TOKENS, chat_messages, parse_seeds
+
+N_CTX = 2048             # prompt (a few hundred tokens) + reply
+
+
+def load_gguf(model_path: str, threads: int | None = None, n_ctx: int = N_CTX):
+    """Memory-mapped, CPU-only llama.cpp model."""
+    if Llama is None:
+        raise ImportError("the GGUF backend needs llama-cpp-python (pip install llama-cpp-python)")
+    with span("llm.load_model", model=Path(model_path).name):
+        return Llama(model_path=str(model_path), n_ctx=n_ctx, n_threads=threads,
+                     n_threads_batch=threads, n_gpu_layers=0, use_mmap=True,
+                     verbose=False)
+
+
+def call_gguf(feats: dict, llm, constrained: bool = True) -> str:
+    """Raw reply of *llm* for a kernel's features (greedy)."""
+    kwargs = {"stop": ["}"]}                 # unconstrained: the repair layer closes the JSON
+    if constrained:
+        if getattr(llm, "_aatune_grammar", None) is None:
+            llm._aatune_grammar = LlamaGrammar.from_string(GRAMMAR.gbnf(), verbose=False)
+        kwargs = {"grammar": llm._aatune_grammar}
+    with span("llm.generate", batch=1):
+        resp = llm.create_chat_completion(messages=chat_messages(feats), temperature=0.0,
+                                          max_tokens=MAX_NEW_TOKENS, **kwargs)
+    usage = resp.get("usage") or {}
+    count("llm.tokens_in", usage.get("prompt_tokens", 0))
+    count("llm.tokens_out", usage.get("completion_tokens", 0))
+    return resp["choices"][0]["message"]["content"] or ""
+
+
+def pick_seeds_from_features(feats: dict, llm, constrained: bool = True) -> dict:
+    return parse_seeds(call_gguf(feats, llm, constrained))
+
+
+def pick_seeds(ir_path: Path, model_path: str, threads: int | None = None,
+               constrained: bool = True, llm=None):
+    feats = indexed_features(ir_path)
+    if llm is None:
+        llm = load_gguf(model_path, threads)
+    seeds = pick_seeds_from_features(feats, llm, constrained)
+    print(json.dumps(seeds, indent=2))
+    return seeds
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Seed picker on a quantised GGUF model (CPU, llama.cpp)")
+    ap.add_argument("--ir", required=True, help="Path to LLVM‑IR file")
+    ap.add_argument("--model", required=True, help="GGUF file (e.g. Q4_K_M / Q8_0 Mistral)")
+    ap.add_argument("--threads", type=int, default=None, help="CPU threads (default: llama.cpp's choice)")
+    ap.add_argument("--unconstrained", action="store_true", help="Free generation (replies repaired afterwards)")
+    args = ap.parse_args()
+
+    pick_seeds(Path(args.ir), args.model, args.threads, constrained=not args.unconstrained)
@@ -10,9 +10,16 @@ Author: Md Arafat Hossain
 """
 
 from pathlib import Path
-import json, re, argparse, os
+import json, argparse, os, sys
 from huggingface_hub import InferenceClient   # pip install huggingface_hub
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "utils"))
+from llm_cache import default_cache, disable_default_cache
+from feature_index import indexed_features   # llvmlite analysis, cached by IR hash
+from constrained import repair_seeds
+from search_space import seed_space
+from tracing import span
+
 # --------------------------------------------------------------------------- #
 # 0)  USER‑EDITABLE CONSTANTS                                                 #
 # --------------------------------------------------------------------------- #
@@ -20,30 +27,8 @@ from huggingface_hub import InferenceClient   # pip install huggingface_hub
 # HF_TOKEN  = os.getenv("HF_TOKEN")        # set env var or pass --hf_token
 MAX_TOKENS = 256
 
-SEARCH_SPACE = {
-    "OMP_NUM_THREADS": [4, 8, 16, 24, 32, 40, 44, 48],
-    "OMP_PROC_BIND":  ["true", "false", "close", "spread"],
-    "OMP_SCHEDULE":   ["static", "dynamic", "guided"]
-}
-
-# --------------------------------------------------------------------------- #
-# 1)  LIGHT STATIC FEATURE EXTRACTOR                                          #
-# --------------------------------------------------------------------------- #
-def extract_features(ir_src: str) -> dict:
-    n_load   = len(re.findall(r"\bload\b",  ir_src))
-    n_store  = len(re.findall(r"\bstore\b", ir_src))
-    n_arith  = len(re.findall(r"\b(add|fadd|sub|mul|fmul|div|fdiv)\b", ir_src))
-    mem_int  = (n_load + n_store) / max(1, n_arith)
-
-    indent   = [len(m.group(1)) for m in re.finditer(r"(\s*)br label", ir_src)]
-    loop_depth = max(indent) // 2 if indent else 0
-
-    bound = ("memory" if mem_int > 2
-             else "compute" if mem_int < 0.5
-             else "mixed")
-    return {"bound": bound,
-            "mem_intensity": round(mem_int, 2),
-            "loop_depth": loop_depth}
+SPACE = seed_space(threads=[4, 8, 16, 24, 32, 40, 44, 48])
+SEARCH_SPACE = SPACE.choices()
 
 # --------------------------------------------------------------------------- #
 # 2)  PROMPT TEMPLATES (unchanged)                                            #
@@ -100,28 +85,36 @@ def build_prompt(feats: dict) -> str:
 # 3)  CALL HUGGING FACE INFERENCE API                                         #
 # --------------------------------------------------------------------------- #
 def call_hf_api(prompt: str, model_id: str, hf_token: str) -> dict:
-    client = InferenceClient(model=model_id, token=hf_token)
-
-    # stop sequence '}' keeps the model from babbling after JSON
-    response = client.text_generation(
-        prompt,
-        max_new_tokens=MAX_TOKENS,
-        temperature=0.0,
-        stop_sequences=["}"]
-    )
-    text = response.text
-    json_block = text if text.endswith("}") else text.split("}")[0] + "}"
+    def generate() -> str:
+        client = InferenceClient(model=model_id, token=hf_token)
+
+        # stop sequence '}' keeps the model from babbling after JSON
+        with span("llm.hf_inference", model=model_id):
+            response = client.text_generation(
+                prompt,
+                max_new_tokens=MAX_TOKENS,
+                temperature=0.0,
+                stop_sequences=["}"]
+            )
+        return response if isinstance(response, str) else response.generated_text
+
+    # temperature 0 → deterministic; answer reruns from the on-disk cache,
+    # but only once the reply repairs into SPACE
+    text = default_cache().cached(generate, model=model_id, backend="hf_inference",
+                                  validate=lambda t: repair_seeds(t, SPACE),
+                                  prompt=prompt, temperature=0.0,
+                                  max_tokens=MAX_TOKENS, stop=["}"])
+    # the "}" stop sequence may be cut off; values are repaired into SPACE
     try:
-        return json.loads(json_block)
-    except json.JSONDecodeError as e:
+        return repair_seeds(text, SPACE)[0]
+    except ValueError as e:
         raise RuntimeError(f"Bad JSON from model:\n{text}") from e
 
 # --------------------------------------------------------------------------- #
 # 4)  MAIN DRIVER                                                             #
 # --------------------------------------------------------------------------- #
 def pick_seeds(ir_path: Path, model_id: str, token: str):
-    ir_src  = ir_path.read_text()
-    feats   = extract_features(ir_src)
+    feats   = indexed_features(ir_path)
     prompt  = build_prompt(feats)
 
     print(f"Querying Hugging Face model {model_id} …")
@@ -137,7 +130,9 @@ if __name__ == "__main__":
     ap.add_argument("--ir", required=True, help="Path to LLVM‑IR file")
     ap.add_argument("--model_id", help="HF model repo ID (e.g. mistralai/Mistral‑7B‑Instruct‑v0.2)")
     ap.add_argument("--hf_token", help="Hugging Face access token; else set env HF_TOKEN")
+    ap.add_argument("--no-llm-cache", action="store_true", help="Always query the API")
     args = ap.parse_args()
+    if args.no_llm_cache: disable_default_cache()
 
     if not args.hf_token:
         ap.error("HF token missing.  Set --hf_token or environment variable HF_TOKEN")
@@ -1,83 +1,66 @@
 #!/usr/bin/env python3
 """
-sd_picker_agent_openai.py   —   pure‑llvmlite static extractor + two‑turn LLM
+sd_picker_agent_openai.py   —   shared llvmlite static extractor + two‑turn LLM
 """
 
 from pathlib import Path
-import os, re, json, argparse, openai
-from llvmlite import binding as llvm
-from collections import Counter
+import os, sys, json, argparse, openai
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "utils"))
+from llm_cache import default_cache, disable_default_cache
+from feature_index import indexed_features   # llvmlite analysis, cached by IR hash
+from machines import INTEL_SKYLAKE_SP, physical_cores, resolve_machine
+from constrained import repair_seeds
+from search_space import seed_space
+from tracing import count, span, traced
 
 # ─── Config ──────────────────────────────────────────────────────────────────
 DEFAULT_MODEL    = "gpt-4o-mini"
 MAX_TOKENS_REPLY = 256
-SEARCH_SPACE = {
-    "OMP_NUM_THREADS": [4, 8, 12, 16, 20, 24, 28, 32, 36, 40, 44, 48],
-    "OMP_PROC_BIND":  ["true", "false", "close", "spread"],
-    "OMP_SCHEDULE":   ["static", "dynamic", "guided"]
-}
-llvm.initialize(); llvm.initialize_native_target(); llvm.initialize_native_asmprinter()
-
-# ─── 1. pure‑llvmlite feature extractor ─────────────────────────────────────
-def extract_features(ir_src: str) -> dict:
-    module = llvm.parse_assembly(ir_src); module.verify()
-    func   = next(f for f in module.functions if not f.is_declaration)
-
-    cnt = Counter(); vec_instr = 0; packed = 0; math_call = False
-
-    for blk in func.blocks:
-        for inst in blk.instructions:
-            op = inst.opcode
-            if op in ("load", "store"):
-                cnt["mem"] += 1
-            elif op in ("fadd","fmul","fsub","fdiv","add","mul","sub","udiv","sdiv"):
-                cnt["flop"] += 1
-
-            operands_list = list(inst.operands)
-
-            if inst.type.is_vector or any(o.type.is_vector for o in operands_list):
-                vec_instr += 1
-            if inst.type.is_vector or (inst.type.is_array and inst.type.element.is_vector):
-                packed += 1
-
-            if op == "call" and operands_list:
-                callee = operands_list[0]
-                if hasattr(callee, "name") and callee.name in {
-                        "sin","cos","exp","log","pow","sqrt","tanh"}:
-                    math_call = True
-
-    mem_int   = cnt["mem"] / max(1, cnt["flop"])
-    bound     = "memory" if mem_int > 2 else "compute" if mem_int < .5 else "mixed"
-    vec_ratio = vec_instr / max(1, cnt["mem"]+cnt["flop"])
-
-    depths = [len(m.group(1)) for m in re.finditer(r"(\s*)br label", ir_src)]
-    loop_depth = max(depths)//2 if depths else 0
-
-    return {
-        "bound": bound,
-        "mem_intensity": round(mem_int,3),
-        "loop_depth": loop_depth,
-        "vector_ratio": round(vec_ratio,3),
-        "packed_ratio": round(packed/max(1,vec_instr+cnt["mem"]+cnt["flop"]),3),
-        "uses_math_lib": math_call
-    }
-
-# ─── 2. prompt pieces & heuristics (same as before) ─────────────────────────
-SYSTEM_MSG = """
-You are an HPC kernel *seed‑picker* for an Intel Skylake‑SP node
-(2 × 24 physical cores, SMT on = 96 logical cores).  Use the heuristics below,
+MACHINE = INTEL_SKYLAKE_SP
+SPACE = seed_space(MACHINE, threads=list(range(4, 49, 4)))
+SEARCH_SPACE = SPACE.choices()
+
+# ─── 2. prompt pieces & heuristics (per machine descriptor) ────────────────
+SYSTEM_TEMPLATE = """
+You are an HPC kernel *seed‑picker* for {node} node
+({sockets} × {per_socket} physical cores{smt}).  Use the heuristics below,
 think step‑by‑step, then output three ranked candidates per knob.
 """
-HEURISTICS = """
+HEURISTICS_TEMPLATE = """
 HEURISTICS
 1. OMP_NUM_THREADS
-   · Always include 48 (physical cores). Put it first if compute‑bound.
-   · For memory‑bound (mem_intensity > 2) prefer 32/24/16.
-   · 44 is a good second when compute‑bound.
+   · Always include {full} (physical cores). Put it first if compute‑bound.
+   · For memory‑bound (mem_intensity > 2) prefer {mem}.
+   · {second} is a good second when compute‑bound.
 2. OMP_PROC_BIND = ["close","spread","true"].
 3. OMP_SCHEDULE
    · "static" first if loop_depth ≥ 2 and vector_ratio < 0.1, else "guided".
 """
+PRIOR_TEMPLATE = """
+PRIOR (best configurations of this kernel measured on other machines,
+thread counts rescaled to this node's cores):
+{prior}
+"""
+
+def machine_prompt(machine: dict, space: dict):
+    """(system message, heuristics) for *machine*; thread counts are picked
+    from *space* as fractions of the physical cores (Skylake: 48, 44, 32/24/16)."""
+    cores = physical_cores(machine)
+    threads = space["OMP_NUM_THREADS"]
+    near = lambda frac, pool=threads: min(pool, key=lambda t: abs(t - frac * cores))
+    tpc = int(machine.get("threads_per_core", 1))
+    cpu = machine["cpu"]
+    system = SYSTEM_TEMPLATE.format(
+        node=("an " if cpu[:1].upper() in "AEIOU" else "a ") + cpu,
+        sockets=machine["num_sockets"], per_socket=machine["cores_per_socket"],
+        smt=f", SMT on = {cores * tpc} logical cores" if tpc > 1 else "")
+    heuristics = HEURISTICS_TEMPLATE.format(
+        full=near(1.0), second=near(11 / 12, [t for t in threads if t != near(1.0)] or threads),
+        mem="/".join(str(near(f)) for f in (2 / 3, 1 / 2, 1 / 3)))
+    return system, heuristics
+
+SYSTEM_MSG, HEURISTICS = machine_prompt(MACHINE, SEARCH_SPACE)
 USER_TEMPLATE = """
 STATIC_FEATURES:
 {feat}
@@ -97,44 +80,78 @@ DRAFT:
 CRITIC_INSTR = "Reflect on your REASON and output ONLY the final JSON."
 
 # ─── 3. OpenAI chat helpers ─────────────────────────────────────────────────
+def _complete(msgs, model):
+    with span("llm.openai", model=model):
+        resp = openai.chat.completions.create(
+            model=model, messages=msgs,
+            temperature=0.0, max_tokens=MAX_TOKENS_REPLY,
+            stop=["}"])
+    if resp.usage:
+        count("llm.tokens_in", resp.usage.prompt_tokens)
+        count("llm.tokens_out", resp.usage.completion_tokens)
+    return resp.choices[0].message.content
+
 def chat(msgs, model):
-    return openai.chat.completions.create(
-        model=model, messages=msgs,
-        temperature=0.0, max_tokens=MAX_TOKENS_REPLY,
-        stop=["}"]).choices[0].message.content
-def to_json(reply: str) -> dict:
+    # temperature 0 → deterministic; answer reruns from the on-disk cache
+    return default_cache().cached(
+        lambda: _complete(msgs, model),
+        model=model, backend="openai", messages=msgs,
+        temperature=0.0, max_tokens=MAX_TOKENS_REPLY, stop=["}"])
+@traced("seed.parse")
+def to_json(reply: str, space: dict | None = None) -> dict:
     """
-    Grab the FIRST {...} substring in the reply, tolerate leading fences,
-    backticks, etc.  Raise if none found.
+    Seeds from the FIRST {...} in the reply (fences, prose and the tail cut
+    off by the "}" stop sequence tolerated), repaired into *space*: values
+    snapped to valid ones, lists padded to three, missing knobs filled.
+    Raise only if there is no JSON object at all.
     """
-    m = re.search(r"\{[^{}]*?(?:\{[^{}]*?\}[^{}]*?)*\}", reply, re.S)
-    if not m:
-        raise ValueError("Model reply contained no JSON block:\n" + reply)
-    return json.loads(m.group(0))
+    seeds, repairs = repair_seeds(reply, space or SEARCH_SPACE)
+    for note in repairs:
+        print(f"[repair] {note}", file=sys.stderr)
+    return seeds
 
 # ─── 4. two‑turn picker ─────────────────────────────────────────────────────
-def pick_seeds(ir: Path, model: str):
-    feats = extract_features(ir.read_text())
+def pick_seeds(ir: Path, model: str, machine: dict | None = None, prior: dict | None = None):
+    return pick_seeds_from_features(indexed_features(ir), model, machine=machine, prior=prior)
+
+def pick_seeds_from_features(feats: dict, model: str, verbose: bool = True,
+                             machine: dict | None = None, prior: dict | None = None):
+    """*machine* (descriptor) retargets the prompt and space; *prior* is a
+    ``utils/transfer.py`` warm-start subset for this kernel from other machines."""
+    space, system_msg, heuristics = SEARCH_SPACE, SYSTEM_MSG, HEURISTICS
+    if machine is not None and machine != MACHINE:
+        space = seed_space(machine).choices()
+        system_msg, heuristics = machine_prompt(machine, space)
     user1 = USER_TEMPLATE.format(
         feat=json.dumps(feats, separators=(",",":")),
-        space=json.dumps(SEARCH_SPACE, separators=(",",":")))
+        space=json.dumps(space, separators=(",",":")))
+    if prior:
+        ranked = prior.get("ranked", [])[:8] or {k: prior[k] for k in SEARCH_SPACE if k in prior}
+        user1 = PRIOR_TEMPLATE.format(prior=json.dumps(ranked, separators=(",",":"))).strip() + "\n" + user1
     draft = chat(
-        [{"role":"system","content":SYSTEM_MSG+HEURISTICS},
+        [{"role":"system","content":system_msg+heuristics},
          {"role":"user"  ,"content":user1}], model)
-    print("── DRAFT ──\n", draft, "\n")
+    if verbose: print("── DRAFT ──\n", draft, "\n")
     final = chat(
-        [{"role":"system","content":SYSTEM_MSG},
+        [{"role":"system","content":system_msg},
          {"role":"assistant","content":draft},
          {"role":"user","content":CRITIC_INSTR}], model)
-    seeds = to_json(final)
-    print("── FINAL ──\n", json.dumps(seeds,indent=2)); return seeds
+    seeds = to_json(final, space)
+    if verbose: print("── FINAL ──\n", json.dumps(seeds,indent=2))
+    return seeds
 
 # ─── 5. CLI ─────────────────────────────────────────────────────────────────
 if __name__ == "__main__":
     p = argparse.ArgumentParser()
     p.add_argument("--ir", required=True); p.add_argument("--model", default=DEFAULT_MODEL)
     p.add_argument("--key", default=os.getenv("OPENAI_API_KEY"))
+    p.add_argument("--no-llm-cache", action="store_true", help="Always query the API")
+    p.add_argument("--machine", default=None, help="Target machine preset (amd/intel) or JSON descriptor")
+    p.add_argument("--prior", default=None, help="Warm-start JSON for this kernel from utils/transfer.py")
     ns = p.parse_args()
+    if ns.no_llm_cache: disable_default_cache()
     if not ns.key: p.error("Set OPENAI_API_KEY or --key")
     openai.api_key = ns.key
-    pick_seeds(Path(ns.ir), ns.model)
+    prior = json.loads(Path(ns.prior).read_text()) if ns.prior else None
+    pick_seeds(Path(ns.ir), ns.model,
+               machine=resolve_machine(ns.machine) if ns.machine else None, prior=prior)
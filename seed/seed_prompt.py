@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+seed_prompt.py
+
+Prompt, search space, grammar and reply parsing shared by the local seed
+pickers (``sd_pkr_agent.py`` on ``transformers``, ``sd_pkr_agent_gguf.py``
+on llama.cpp).  Nothing here needs torch, so the GGUF path runs on nodes
+without it.
+
+The kernel's features come last in the prompt: everything before them is a
+static prefix shared by all kernels, whose KV state both backends reuse.
+"""
+
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "utils"))
+from constrained import SeedGrammar, repair_seeds
+from search_space import seed_space
+from tracing import traced
+
+SPACE = seed_space(threads=[4, 8, 16, 24, 32, 40, 48])
+SEARCH_SPACE = SPACE.choices()
+GRAMMAR = SeedGrammar(SPACE)
+MAX_NEW_TOKENS = 256
+
+
+SYSTEM_MSG = "You are an HPC kernel seed‑picker."
+
+EXAMPLE_BLOCK = """
+EXAMPLE INPUT
+STATIC_FEATURES:
+{"bound":"memory","loop_depth":2}
+SEARCH_SPACE:
+{"OMP_NUM_THREADS":[4,8],"OMP_PROC_BIND":["true","close"],
+ "OMP_SCHEDULE":["static","dynamic"]}
+
+EXAMPLE OUTPUT
+{
+  "OMP_NUM_THREADS": [8,4,4],
+  "OMP_PROC_BIND": ["close","true","true"],
+  "OMP_SCHEDULE": ["dynamic","static","static"]
+}
+""".strip()
+
+# static part first, kernel features last: the prefix is shared by all kernels
+USER_TEMPLATE = """
+SEARCH_SPACE:
+{search_json}
+
+TASK:
+Choose exactly THREE candidate values **per knob** that you believe will
+minimise runtime.
+
+FORMAT (return ONLY this, no markdown, no prose):
+{{
+  "OMP_NUM_THREADS": [<int1>, <int2>, <int3>],
+  "OMP_PROC_BIND" : ["<str1>", "<str2>", "<str3>"],
+  "OMP_SCHEDULE"  : ["<str1>", "<str2>", "<str3>"]
+}}
+
+• Rank values best→worst inside each list.
+• Think step‑by‑step **internally**, then output only the JSON.
+
+STATIC_FEATURES:
+{features_json}
+""".strip()
+
+CRITIC_MSG = ("Check every value against SEARCH_SPACE and the STATIC_FEATURES, "
+              "fix anything that does not fit, and output ONLY the final JSON.")
+
+
+def chat_messages(feats) -> list:
+    features_json = feats if isinstance(feats, str) else json.dumps(feats, separators=(",", ":"))
+    user = EXAMPLE_BLOCK + "\n\n" + USER_TEMPLATE.format(
+        features_json=features_json,
+        search_json=json.dumps(SEARCH_SPACE, separators=(",", ":"))
+    )
+    return [{"role": "system", "content": SYSTEM_MSG},
+            {"role": "user",   "content": user}]
+
+
+@traced("seed.parse")
+def parse_seeds(text: str) -> dict:
+    # constrained replies are already valid; anything else is repaired into SPACE
+    try:
+        return repair_seeds(text, SPACE)[0]
+    except ValueError as e:
+        raise RuntimeError(f"Bad JSON from LLM:\n{text}") from e
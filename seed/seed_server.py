@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+seed_server.py
+
+Long‑lived seed‑picking service for the local Mistral path in
+``sd_pkr_agent.py``: the tokenizer and model are loaded ONCE, then any number
+of LLVM‑IR files are answered over a local Unix socket (or from stdin).
+Requests that arrive within ``--batch-window`` seconds of each other are
+packed into a single ``generate`` call (up to ``--max-batch``).
+
+Protocol: one JSON object per line.
+  request   {"ir": "/path/to/kernel.ll"}
+  response  {"ir": ..., "seeds": {...}, "features": {...}, "seconds": 1.23}
+            or {"ir": ..., "error": "..."}
+
+Usage
+-----
+# server (one per allocation)
+python seed_server.py --socket /tmp/seeds.sock --model /lus/.../mistral
+# client
+python seed_server.py --socket /tmp/seeds.sock --client a.ll b.ll c.ll
+# no socket: IR paths on stdin, JSON lines on stdout
+ls ../llvm-ir/*.ll | python seed_server.py --stdin --model ...
+# CPU smoke test with a tiny model
+python seed_server.py --stdin --model sshleifer/tiny-gpt2 --device cpu --dtype float32
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import List, Tuple
+
+from sd_pkr_agent import (MODEL_PATH, build_prompt, call_llm_batch,
+                          indexed_features, load_model, parse_seeds)
+
+
+class SeedService:
+    """Resident model + micro‑batching worker thread."""
+
+    def __init__(self, model_path: str = MODEL_PATH, device: str = "auto",
+                 dtype: str = "float16", max_batch: int = 8, batch_window: float = 0.05):
+        t0 = time.perf_counter()
+        self.tokenizer, self.model = load_model(model_path, device, dtype)
+        self.load_seconds = time.perf_counter() - t0
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self._queue: "queue.Queue[Tuple[dict, Future]]" = queue.Queue()
+        self._worker = threading.Thread(target=self._loop, daemon=True)
+        self._worker.start()
+
+    def submit(self, request: dict) -> Future:
+        fut: Future = Future()
+        self._queue.put((request, fut))
+        return fut
+
+    def _next_batch(self) -> List[Tuple[dict, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._run(batch)
+            except Exception as exc:        # a bad batch must not kill the worker
+                for request, fut in batch:
+                    if not fut.done():
+                        fut.set_result({"ir": _ir(request), "error": str(exc)})
+
+    def _run(self, batch: List[Tuple[dict, Future]]):
+        t0 = time.perf_counter()
+        jobs, prompts = [], []
+        for request, fut in batch:
+            try:
+                feats = indexed_features(Path(request["ir"]))
+                prompts.append(build_prompt(feats, self.tokenizer))
+                jobs.append((request, fut, feats))
+            except Exception as exc:
+                fut.set_result({"ir": _ir(request), "error": str(exc)})
+        if not jobs:
+            return
+        try:
+            texts = call_llm_batch(prompts, self.tokenizer, self.model)
+        except Exception as exc:
+            for request, fut, _ in jobs:
+                fut.set_result({"ir": request["ir"], "error": str(exc)})
+            return
+        seconds = time.perf_counter() - t0
+        for (request, fut, feats), text in zip(jobs, texts):
+            reply = {"ir": request["ir"], "features": feats,
+                     "seconds": seconds, "batch": len(jobs)}
+            try:
+                reply["seeds"] = parse_seeds(text)
+            except RuntimeError as exc:
+                reply["error"] = str(exc)
+            fut.set_result(reply)
+
+
+def _ir(request) -> str | None:
+    return request.get("ir") if isinstance(request, dict) else None
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as exc:
+                reply = {"error": f"bad request: {exc}"}
+            else:
+                if isinstance(request, dict) and isinstance(request.get("ir"), str):
+                    reply = self.server.service.submit(request).result()
+                else:
+                    reply = {"ir": _ir(request), "error": 'bad request: expected {"ir": "<path>"}'}
+            self.wfile.write((json.dumps(reply) + "\n").encode())
+            self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(service: SeedService, sock_path: Path):
+    if sock_path.exists():
+        sock_path.unlink()
+    with _Server(str(sock_path), _Handler) as server:
+        server.service = service
+        print(f"Seed server on {sock_path} (model loaded in {service.load_seconds:.1f}s)",
+              file=sys.stderr)
+        server.serve_forever()
+
+
+def serve_stdin(service: SeedService):
+    """IR paths on stdin → JSON lines on stdout, in input order."""
+    futures = [service.submit({"ir": line.strip()}) for line in sys.stdin if line.strip()]
+    for fut in futures:
+        print(json.dumps(fut.result()), flush=True)
+
+
+def client(sock_path: Path, irs: List[str]):
+    """Send all requests on parallel connections so the server can batch them."""
+    def one(ir: str, out: list, idx: int):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.connect(str(sock_path))
+            s.sendall((json.dumps({"ir": os.path.abspath(ir)}) + "\n").encode())
+            out[idx] = s.makefile().readline().strip()
+
+    replies = [None] * len(irs)
+    threads = [threading.Thread(target=one, args=(ir, replies, i)) for i, ir in enumerate(irs)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for reply in replies:
+        print(reply)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Resident seed‑picking service.")
+    ap.add_argument("--socket", type=Path, default=Path("/tmp/aatune_seeds.sock"))
+    ap.add_argument("--stdin", action="store_true", help="Read IR paths from stdin instead of serving a socket")
+    ap.add_argument("--client", nargs="+", metavar="IR", help="Send IR files to a running server")
+    ap.add_argument("--model", default=MODEL_PATH, help="HF folder / repo id of the model")
+    ap.add_argument("--device", default="auto", help="auto | cpu | cuda")
+    ap.add_argument("--dtype", default="float16", help="torch dtype (float32 on CPU)")
+    ap.add_argument("--max-batch", type=int, default=8)
+    ap.add_argument("--batch-window", type=float, default=0.05, help="Seconds to wait for more requests")
+    ns = ap.parse_args()
+
+    if ns.client:
+        client(ns.socket, ns.client)
+    else:
+        svc = SeedService(ns.model, ns.device, ns.dtype, ns.max_batch, ns.batch_window)
+        if ns.stdin:
+            serve_stdin(svc)
+        else:
+            serve(svc, ns.socket)
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+constrained.py
+
+Make every seed-picker answer usable on the first try instead of paying an
+extra LLM round trip for a malformed or out-of-space reply.
+
+* :class:`SeedGrammar` – character automaton for the answer format
+  ``{"KNOB": [v1, v2, v3], ...}`` over a ``{knob: [values]}`` space (or a
+  ``SearchSpace``): the knobs in order, each a list of exactly ``n`` allowed
+  values (repeats allowed), optional whitespace between JSON tokens.
+  :meth:`SeedGrammar.gbnf` writes the same language as a GBNF grammar for
+  llama.cpp (GGUF backend).
+* :class:`TokenConstraint` – the grammar as a ``prefix_allowed_tokens_fn``
+  for ``transformers`` ``generate`` (local backend).  The vocabulary is put
+  in a character trie once per tokenizer; for each automaton state the trie
+  is walked along the grammar, so only tokens that keep the output a prefix
+  of a valid answer are allowed, and EOS only once it is complete.  Allowed
+  sets are memoised per state (they repeat across kernels and batch rows).
+* :func:`repair_seeds` / :func:`repair_config` – validating repair layer
+  for remote backends: the first JSON object is extracted (fences, prose,
+  trailing commas, a reply cut at a ``}`` stop sequence), values are coerced
+  or snapped into the space, lists padded / trimmed to ``n`` and missing
+  knobs filled.  Every change is reported; only a reply without any JSON
+  object is an error.
+
+Example
+-------
+python constrained.py -reply '```json {"OMP_NUM_THREADS": [50, "8"], "OMP_SCHEDULE": ["Dynamic",'
+python constrained.py -threads 4 8 16 -grammar       # show the constrained answer format
+python constrained.py -threads 4 8 16 -gbnf > seeds.gbnf
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+from typing import Any, Dict, FrozenSet, List, Tuple
+
+from search_space import SearchSpace, seed_space, snap
+from tracing import count
+
+N_SEEDS = 3
+MAX_WS = 4                      # whitespace characters allowed between two JSON tokens
+WHITESPACE = " \n\t"
+
+State = Tuple[int, str, int]    # (piece, matched prefix of the piece, whitespace run)
+
+
+def _choices(space: Dict[str, List[Any]] | SearchSpace) -> Dict[str, List[Any]]:
+    return space.choices() if isinstance(space, SearchSpace) else dict(space)
+
+
+# --------------------------------------------------------------------------- #
+# grammar                                                                     #
+# --------------------------------------------------------------------------- #
+class SeedGrammar:
+    """Automaton accepting exactly the valid seed answers for *space*."""
+
+    def __init__(self, space: Dict[str, List[Any]] | SearchSpace, n: int = N_SEEDS):
+        self.choices = _choices(space)
+        self.n = n
+        # one piece per JSON token, so whitespace may go between any two
+        pieces: List[Tuple[str, ...]] = [("{",)]
+        for i, (knob, values) in enumerate(self.choices.items()):
+            pieces += [(",",)] * bool(i) + [(json.dumps(knob),), (":",), ("[",)]
+            for j in range(n):
+                pieces += [(",",)] * bool(j) + [tuple(json.dumps(v) for v in values)]
+            pieces.append(("]",))
+        pieces.append(("}",))
+        self.pieces = pieces
+        self._prefixes = [{o[:k] for o in opts for k in range(1, len(o) + 1)} for opts in pieces]
+        self._options = [set(opts) for opts in pieces]
+        self.start: FrozenSet[State] = frozenset({(0, "", 0)})
+
+    def done(self, states: FrozenSet[State]) -> bool:
+        return any(i == len(self.pieces) for i, _, _ in states)
+
+    def step(self, states: FrozenSet[State], ch: str) -> FrozenSet[State]:
+        """States after reading *ch* (empty: *ch* leaves the grammar)."""
+        out = set()
+        for i, prefix, ws in states:
+            if i == len(self.pieces):
+                continue
+            if not prefix and ch in WHITESPACE:
+                if ws < MAX_WS:
+                    out.add((i, "", ws + 1))
+                continue
+            new = prefix + ch
+            if new not in self._prefixes[i]:
+                continue
+            if new in self._options[i]:
+                out.add((i + 1, "", 0))
+                if any(len(o) > len(new) for o in self.pieces[i] if o.startswith(new)):
+                    out.add((i, new, 0))     # "4" may still become "48"
+            else:
+                out.add((i, new, 0))
+        return frozenset(out)
+
+    def feed(self, states: FrozenSet[State], text: str) -> FrozenSet[State]:
+        for ch in text:
+            states = self.step(states, ch)
+            if not states:
+                break
+        return states
+
+    def accepts(self, text: str) -> bool:
+        return self.done(self.feed(self.start, text.strip()))
+
+    def example(self) -> str:
+        return json.dumps({k: v[:1] * self.n for k, v in self.choices.items()}, separators=(",", ":"))
+
+    def gbnf(self) -> str:
+        """The same language as a GBNF grammar (llama.cpp ``grammar=``)."""
+        lit = json.dumps                        # GBNF string literals use JSON escapes
+        ws = "[ \\t\\n]"
+        for _ in range(MAX_WS - 1):
+            ws = f"[ \\t\\n] ({ws})?"
+        rules = [f"ws ::= ({ws})?"]
+        knobs = []
+        for i, (knob, values) in enumerate(self.choices.items()):
+            rules.append(f"v{i} ::= " + " | ".join(lit(json.dumps(v)) for v in values))
+            items = ' ws "," ws '.join([f"v{i}"] * self.n)
+            knobs.append(f'{lit(json.dumps(knob))} ws ":" ws "[" ws {items} ws "]"')
+        rules.insert(0, 'root ::= ws "{" ws ' + ' ws "," ws '.join(knobs) + ' ws "}"')
+        return "\n".join(rules) + "\n"
+
+
+# --------------------------------------------------------------------------- #
+# token-level constraint for transformers                                     #
+# --------------------------------------------------------------------------- #
+def _surface(tokenizer, token_id: int) -> str:
+    """Text a token contributes when it follows other tokens."""
+    token = tokenizer.convert_ids_to_tokens(token_id)
+    if token is None:
+        return ""
+    text = tokenizer.convert_tokens_to_string([token])
+    # sentencepiece drops the word-boundary space of a lone token
+    if (token.startswith("▁") or token == "<0x20>") and not text.startswith(" "):
+        text = " " + text
+    return text
+
+
+class TokenConstraint:
+    """Allowed next tokens under a :class:`SeedGrammar` for one tokenizer."""
+
+    def __init__(self, tokenizer, grammar: SeedGrammar):
+        self.grammar = grammar
+        self.eos_id = tokenizer.eos_token_id
+        special = set(tokenizer.all_special_ids)
+        self.surface: Dict[int, str] = {}
+        self.trie: Dict[Any, Any] = {}
+        for tid in range(len(tokenizer)):
+            if tid in special:
+                continue
+            text = _surface(tokenizer, tid)
+            if not text:
+                continue
+            self.surface[tid] = text
+            node = self.trie
+            for ch in text:
+                node = node.setdefault(ch, {})
+            node.setdefault(None, []).append(tid)
+        self._allowed: Dict[FrozenSet[State], List[int]] = {}
+
+    def allowed(self, states: FrozenSet[State]) -> List[int]:
+        """Token ids that keep the output inside the grammar from *states*."""
+        hit = self._allowed.get(states)
+        if hit is not None:
+            return hit
+        ids: List[int] = [self.eos_id] if self.grammar.done(states) else []
+        stack = [(self.trie, states)]
+        while stack:
+            node, st = stack.pop()
+            for ch, child in node.items():
+                if ch is None:
+                    continue
+                nxt = self.grammar.step(st, ch)
+                if nxt:
+                    ids.extend(child.get(None, ()))
+                    stack.append((child, nxt))
+        self._allowed[states] = ids = ids or [self.eos_id]
+        return ids
+
+    def prefix_fn(self, prompt_len: int):
+        """``prefix_allowed_tokens_fn`` for one ``generate`` call whose
+        (left-padded) prompts are *prompt_len* tokens long."""
+        rows: Dict[int, Tuple[int, FrozenSet[State]]] = {}
+
+        def fn(batch_id: int, input_ids) -> List[int]:
+            generated = input_ids[prompt_len:].tolist()
+            seen, states = rows.get(batch_id, (0, self.grammar.start))
+            if seen > len(generated):
+                seen, states = 0, self.grammar.start
+            for tid in generated[seen:]:
+                states = self.grammar.feed(states, self.surface.get(tid, ""))
+            rows[batch_id] = (len(generated), states)
+            return self.allowed(states)
+
+        return fn
+
+
+_CONSTRAINTS: Dict[Tuple[int, int], TokenConstraint] = {}
+
+
+def token_constraint(tokenizer, grammar: SeedGrammar) -> TokenConstraint:
+    """Memoised :class:`TokenConstraint` (the vocabulary trie is built once)."""
+    key = (id(tokenizer), id(grammar))
+    if key not in _CONSTRAINTS:
+        _CONSTRAINTS[key] = TokenConstraint(tokenizer, grammar)
+    return _CONSTRAINTS[key]
+
+
+# --------------------------------------------------------------------------- #
+# repair for unconstrained (remote) replies                                   #
+# --------------------------------------------------------------------------- #
+def _close_brackets(text: str) -> str:
+    """Balance a truncated / mismatched reply: close open strings, lists and
+    objects, and insert closers a mismatched bracket skipped."""
+    out, stack, in_str, escaped = [], [], False, False
+    for ch in text:
+        if in_str:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch in "[{":
+            stack.append("]" if ch == "[" else "}")
+        elif ch in "]}":
+            if ch not in stack:
+                continue                      # stray closer
+            while stack[-1] != ch:
+                out.append(stack.pop())
+            stack.pop()
+        out.append(ch)
+    text = "".join(out)
+    text = text + '"' if in_str else text.rstrip(" \t\n`,:")
+    return text + "".join(reversed(stack))
+
+
+def extract_json(reply: str) -> Dict[str, Any]:
+    """First JSON object in *reply*, tolerating fences, prose, single quotes,
+    trailing commas and a missing tail; ``ValueError`` if there is none."""
+    start = reply.find("{")
+    if start < 0:
+        raise ValueError("Model reply contained no JSON object:\n" + reply)
+    body = reply[start:]
+    cleaned = re.sub(r",\s*([\]}])", r"\1", body.replace("'", '"'))
+    for candidate in (body, cleaned, _close_brackets(cleaned)):
+        try:
+            obj, _ = json.JSONDecoder().raw_decode(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(obj, dict):
+            return obj
+    raise ValueError("Could not repair the JSON in the model reply:\n" + reply)
+
+
+def _lookup(obj: Dict[str, Any], knob: str) -> Any:
+    for key, value in obj.items():
+        if key.strip().upper() == knob:
+            return value
+    return None
+
+
+def repair_seeds(reply: str, space: Dict[str, List[Any]] | SearchSpace,
+                 n: int = N_SEEDS) -> Tuple[Dict[str, List[Any]], List[str]]:
+    """``({knob: [n ranked values]}, repairs)`` from a free-form reply.
+
+    Values outside the space are snapped to a valid one (nearest for numbers)
+    or dropped, short lists repeat their last value, long ones are cut, a
+    missing knob takes the space's first values.
+    """
+    obj = extract_json(reply)
+    seeds: Dict[str, List[Any]] = {}
+    repairs: List[str] = []
+    for knob, values in _choices(space).items():
+        raw = _lookup(obj, knob)
+        if raw is None:
+            seeds[knob] = (list(values[:n]) + [values[0]] * n)[:n]
+            repairs.append(f"{knob}: missing, using {seeds[knob]}")
+            continue
+        picked = []
+        for value in raw if isinstance(raw, list) else [raw]:
+            fixed = snap(value, values)
+            if fixed is None:
+                repairs.append(f"{knob}: dropped {value!r}")
+                continue
+            if str(fixed) != str(value):
+                repairs.append(f"{knob}: {value!r} -> {fixed!r}")
+            picked.append(fixed)
+        if len(picked) > n:
+            repairs.append(f"{knob}: kept the first {n} of {len(picked)}")
+        if not picked:
+            picked = [values[0]]
+            repairs.append(f"{knob}: nothing usable, using {values[0]!r}")
+        seeds[knob] = (picked + picked[-1:] * n)[:n]
+    count("seed.repairs", len(repairs))
+    return seeds, repairs
+
+
+def repair_config(reply: str, space: Dict[str, List[Any]] | SearchSpace) -> Tuple[Dict[str, Any], List[str]]:
+    """One configuration (scalar or list per knob) from a free-form reply;
+    knobs the space does not know are dropped, values snapped into it."""
+    obj = extract_json(reply)
+    choices = _choices(space)
+    config: Dict[str, Any] = {}
+    repairs: List[str] = []
+    for key, raw in obj.items():
+        knob = key.strip().upper()
+        if knob not in choices:
+            repairs.append(f"dropped unknown key {key!r}")
+            continue
+        kept = []
+        for value in raw if isinstance(raw, list) else [raw]:
+            fixed = snap(value, choices[knob])
+            if fixed is None:
+                repairs.append(f"{knob}: dropped {value!r}")
+                continue
+            if str(fixed) != str(value):
+                repairs.append(f"{knob}: {value!r} -> {fixed!r}")
+            kept.append(fixed)
+        if kept:
+            config[knob] = kept if isinstance(raw, list) else kept[0]
+    count("seed.repairs", len(repairs))
+    return config, repairs
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Repair a seed-picker reply / show the constrained format.")
+    parser.add_argument("-reply", type=str, default=None, help="Raw model reply to repair.")
+    parser.add_argument("-threads", type=int, nargs="+", default=None, help="OMP_NUM_THREADS values.")
+    parser.add_argument("-n", type=int, default=N_SEEDS, help="Values per knob (default: %(default)s).")
+    parser.add_argument("-grammar", action="store_true", help="Print the grammar pieces.")
+    parser.add_argument("-gbnf", action="store_true", help="Print the grammar as GBNF (llama.cpp).")
+    return parser
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    space = seed_space(threads=args.threads)
+    if args.grammar:
+        grammar = SeedGrammar(space, args.n)
+        print(" ".join("(" + " | ".join(p) + ")" if len(p) > 1 else p[0] for p in grammar.pieces))
+        print("e.g.", grammar.example())
+    if args.gbnf:
+        print(SeedGrammar(space, args.n).gbnf(), end="")
+    if args.reply is not None:
+        seeds, repairs = repair_seeds(args.reply, space, args.n)
+        print(json.dumps(seeds))
+        for note in repairs:
+            print("  repaired:", note)
+
+
+if __name__ == "__main__":
+    main()
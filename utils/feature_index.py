@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+feature_index.py
+
+Persistent index of per-kernel static analysis, so repeated tuning loops and
+seed-picker runs skip parsing entirely.
+
+Two kinds of entries live in one SQLite file, both keyed by the SHA-256 of
+the source they were computed from plus an analyser version:
+
+* ``ir``       – :func:`ir_features.analyze_module` of an ``.ll`` file
+                 (the compact seed-picker dict is derived from it on read),
+* ``programl`` – the full :func:`programl_graph.distill` summary of a
+                 ProGraML JSON graph (callers trim it to their token budget
+                 with :func:`programl_graph.fit_budget`).
+
+A file's hash is remembered against its (mtime, size), so an unchanged file
+is not even re-read; an edited file hashes differently and is re-analysed
+on next use.  Bumping ``IR_VERSION`` / ``GRAPH_VERSION`` invalidates entries
+written by older analysers.
+
+Opt out with ``AATUNE_FEATURE_INDEX=0``; ``AATUNE_FEATURE_INDEX_PATH`` moves
+the file.
+
+Example
+-------
+python feature_index.py -irs ../llvm-ir -programl ../programl      # bulk build
+python feature_index.py -show ../llvm-ir/3mm_kernel_p1.ll
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+
+from ir_features import analyze_module, compact_features
+from programl_graph import distill
+from tracing import count, span
+
+DEFAULT_PATH = Path(os.getenv("AATUNE_FEATURE_INDEX_PATH",
+                              Path(__file__).resolve().parents[1] / "performance_data" / "features.sqlite"))
+IR_VERSION = 1
+GRAPH_VERSION = 2
+KINDS = {"ir": IR_VERSION, "programl": GRAPH_VERSION}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path     TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size     INTEGER NOT NULL,
+    sha      TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS features (
+    sha     TEXT NOT NULL,
+    kind    TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    data    TEXT NOT NULL,
+    seconds REAL,
+    created REAL,
+    PRIMARY KEY (sha, kind, version)
+);
+"""
+
+
+def _analyse(kind: str, path: str) -> Tuple[Dict[str, Any] | None, float, str | None]:
+    """Worker body: (data, seconds, error) for one file."""
+    t0 = time.perf_counter()
+    try:
+        text = Path(path).read_text()
+        data = analyze_module(text) if kind == "ir" else distill(json.loads(text))
+        return data, time.perf_counter() - t0, None
+    except Exception as exc:
+        return None, time.perf_counter() - t0, str(exc)
+
+
+class FeatureIndex:
+    """Content-addressed SQLite store of IR analyses and graph summaries."""
+
+    def __init__(self, path: Path = DEFAULT_PATH, enabled: bool = True):
+        self.path = Path(path)
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    # -- hashing ------------------------------------------------------------ #
+    def file_sha(self, path: Path) -> str:
+        """SHA-256 of *path*, re-read only when its mtime or size changed."""
+        path = Path(path).resolve()
+        st = path.stat()
+        with self._lock:
+            row = self._db().execute("SELECT mtime_ns, size, sha FROM files WHERE path=?",
+                                     (str(path),)).fetchone()
+        if row is not None and row[0] == st.st_mtime_ns and row[1] == st.st_size:
+            return row[2]
+        sha = hashlib.sha256(path.read_bytes()).hexdigest()
+        with self._lock, self._db() as db:
+            db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                       (str(path), st.st_mtime_ns, st.st_size, sha))
+        return sha
+
+    # -- raw entries -------------------------------------------------------- #
+    def get(self, sha: str, kind: str) -> Dict[str, Any] | None:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT data FROM features WHERE sha=? AND kind=? AND version=?",
+                (sha, kind, KINDS[kind])).fetchone()
+            if row is None:
+                self.misses += 1
+                count("feature_index.misses")
+                return None
+            self.hits += 1
+            count("feature_index.hits")
+            return json.loads(row[0])
+
+    def put(self, sha: str, kind: str, data: Dict[str, Any], seconds: float | None = None):
+        with self._lock, self._db() as db:
+            db.execute("INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?, ?, ?)",
+                       (sha, kind, KINDS[kind], json.dumps(data), seconds, time.time()))
+
+    def _cached(self, kind: str, path: Path) -> Dict[str, Any]:
+        if not self.enabled:
+            data, _, err = _analyse(kind, str(path))
+            if err is not None:
+                raise RuntimeError(f"{path}: {err}")
+            return data
+        sha = self.file_sha(path)
+        data = self.get(sha, kind)
+        if data is None:
+            with span("features.analyse", kind=kind, path=path.name):
+                data, secs, err = _analyse(kind, str(path))
+            if err is not None:
+                raise RuntimeError(f"{path}: {err}")
+            self.put(sha, kind, data, secs)
+        return data
+
+    # -- public lookups ----------------------------------------------------- #
+    def ir_analysis(self, ir_path: Path) -> Dict[str, Any]:
+        """Full per-function / per-loop analysis of an ``.ll`` file."""
+        return self._cached("ir", Path(ir_path))
+
+    def ir_features(self, ir_path: Path) -> Dict[str, Any]:
+        """Compact seed-picker features of an ``.ll`` file."""
+        return compact_features(self.ir_analysis(ir_path))
+
+    def graph_summary(self, graph: Path | Dict[str, Any]) -> Dict[str, Any]:
+        """Distilled summary of a ProGraML JSON file or already-loaded graph."""
+        if not isinstance(graph, dict):
+            return self._cached("programl", Path(graph))
+        if not self.enabled:
+            return distill(graph)
+        blob = json.dumps(graph, sort_keys=True, separators=(",", ":"))
+        sha = hashlib.sha256(blob.encode()).hexdigest()
+        data = self.get(sha, "programl")
+        if data is None:
+            t0 = time.perf_counter()
+            data = distill(graph)
+            self.put(sha, "programl", data, time.perf_counter() - t0)
+        return data
+
+    # -- bulk --------------------------------------------------------------- #
+    def build(self, kind: str, paths: Iterable[Path],
+              workers: int | None = None) -> Dict[str, Tuple[Dict[str, Any] | None, float, str | None]]:
+        """Analyse every *path* not yet indexed across worker processes.
+
+        Returns ``{path: (data, seconds, error)}`` for all paths; ``seconds``
+        is 0 for index hits.  Only the parent process writes to SQLite.
+        """
+        paths = [str(p) for p in paths]
+        out: Dict[str, Tuple[Dict[str, Any] | None, float, str | None]] = {}
+        todo: List[Tuple[str, str | None]] = []
+        for p in paths:
+            try:
+                sha = self.file_sha(Path(p)) if self.enabled else None
+            except OSError as exc:          # missing / unreadable: a per-kernel error
+                out[p] = (None, 0.0, str(exc))
+                continue
+            data = self.get(sha, kind) if sha is not None else None
+            if data is not None:
+                out[p] = (data, 0.0, None)
+            else:
+                todo.append((p, sha))
+
+        if todo:
+            workers = max(1, min(workers or os.cpu_count() or 1, len(todo)))
+            with span("features.build", kind=kind, files=len(todo), workers=workers):
+                if workers == 1:
+                    results = [_analyse(kind, p) for p, _ in todo]
+                else:
+                    with ProcessPoolExecutor(max_workers=workers) as pool:
+                        results = list(pool.map(_analyse, [kind] * len(todo), [p for p, _ in todo],
+                                                chunksize=max(1, len(todo) // (4 * workers))))
+            for (p, sha), (data, secs, err) in zip(todo, results):
+                if err is None and sha is not None:
+                    self.put(sha, kind, data, secs)
+                out[p] = (data, secs, err)
+        return {p: out[p] for p in paths}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT kind, COUNT(*) FROM features GROUP BY kind").fetchall()
+        return dict(rows)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+_DEFAULT: FeatureIndex | None = None
+
+
+def default_index() -> FeatureIndex:
+    """Process-wide index honouring ``AATUNE_FEATURE_INDEX`` / ``..._PATH``."""
+    global _DEFAULT
+    if _DEFAULT is None:
+        enabled = os.getenv("AATUNE_FEATURE_INDEX", "1").lower() not in {"0", "false", "off", "no"}
+        _DEFAULT = FeatureIndex(DEFAULT_PATH, enabled=enabled)
+    return _DEFAULT
+
+
+def indexed_features(ir_path: Path) -> Dict[str, Any]:
+    """Compact IR features through the default index."""
+    return default_index().ir_features(ir_path)
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Build or query the static feature index.")
+    parser.add_argument("-db", type=Path, default=DEFAULT_PATH, help="SQLite file (default: %(default)s).")
+    parser.add_argument("-irs", type=Path, nargs="*", default=[], help="IR files or directories of .ll files.")
+    parser.add_argument("-programl", type=Path, nargs="*", default=[], help="ProGraML JSON files or directories.")
+    parser.add_argument("-workers", type=int, default=None, help="Analysis processes (default: all cores).")
+    parser.add_argument("-show", type=Path, default=None, help="Print the indexed features of one .ll / .json file.")
+    return parser
+
+
+def _expand(sources: List[Path], suffix: str) -> List[Path]:
+    files: List[Path] = []
+    for src in sources:
+        files.extend(sorted(src.rglob(f"*{suffix}")) if src.is_dir() else [src])
+    return files
+
+
+def main():
+    parser = build_arg_parser()
+    args = parser.parse_args()
+
+    index = FeatureIndex(args.db)
+    if args.show is not None:
+        data = (index.graph_summary(args.show) if args.show.suffix == ".json"
+                else index.ir_features(args.show))
+        print(json.dumps(data, indent=2))
+        return
+
+    for kind, sources, suffix in (("ir", args.irs, ".ll"), ("programl", args.programl, ".json")):
+        files = _expand(sources, suffix)
+        if not files:
+            continue
+        t0 = time.perf_counter()
+        results = index.build(kind, files, args.workers)
+        errors = {p: r[2] for p, r in results.items() if r[2] is not None}
+        fresh = sum(1 for r in results.values() if r[1] > 0 and r[2] is None)
+        print(f"{kind}: {len(files)} file(s), {fresh} analysed, "
+              f"{len(files) - fresh - len(errors)} already indexed, {len(errors)} failed "
+              f"({time.perf_counter() - t0:.2f}s).")
+        for p, err in errors.items():
+            print(f"  {p}: {err}")
+    print(f"'{args.db}' holds {index.stats()}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,69 +6,427 @@ Filter a CSV of OpenMP experiment results to the fastest 10 % runs for a
 given executable, then save *all* unique configuration values
 (OMP_NUM_THREADS, OMP_PROC_BIND, OMP_SCHEDULE) to a JSON file.
 
+Repeated measurements of the same (threads, bind, schedule) tuple are first
+aggregated per configuration (median, IQR, bootstrap CI of the median).  The
+top 10 % of *configurations* by median are kept, minus any whose CI lies
+entirely above the best configuration's CI (significantly slower than the
+best).  ``-raw`` restores the old behaviour of ranking individual rows.
+
+The CSV is read through the columnar cache in ``perf_store.py``.  Batch mode
+parses it once and computes the subset for every requested executable in a
+single groupby.  Executables may be given as exact names or glob patterns;
+``-all`` selects every executable in the file.
+
+``-stream`` reads the CSV itself in chunks of ``-chunk-rows`` rows with
+explicit dtypes instead of building the cache, and writes the same JSON.
+Memory then grows with the *selected* rows, not with the file:
+
+* per-config statistics (default) keep the requested executables' rows, as
+  categorical codes + float64 times (O(selected rows): exact medians and the
+  bootstrap CI need every repeat, so ``-all -stream`` holds every run and
+  needs about as much memory as the cached path);
+* ``-raw`` counts the rows per executable in a first pass, then keeps a
+  bounded top-k per executable in a second one (k = 10 % of its rows, ties
+  broken by file order as in the stable sort).
+
 Example
 -------
-python extract_top_configs.py results.csv my_kernel -o top_configs.json
+python extract_top_configs.py -csv results.csv -executable my_kernel -o top_configs.json
+python extract_top_configs.py -csv results.csv -executable 'DRB*' 3mm_kernel_p1 -output-dir subsets/
+python extract_top_configs.py -csv results.csv -all -o all_top_configs.json
+python extract_top_configs.py -csv big_sweep.csv -executable 'DRB*' -stream -chunk-rows 2000000 -o top.json
 """
 
 from __future__ import annotations
 
 import argparse
+import collections
+import fnmatch
 import json
 import math
 import sys
 from pathlib import Path
+from typing import Dict, Iterable, Iterator, List
 
+import numpy as np
 import pandas as pd
 
+from perf_store import CACHE_DTYPES, COLUMNS, CSV_DTYPES, load_results
+from search_space import split_schedule
+
+REQUIRED_COLS = {"Executable",
+                 "OMP_NUM_THREADS",
+                 "OMP_PROC_BIND",
+                 "OMP_SCHEDULE",
+                 "Execution Time (s)"}
+CONFIG_COLS = ["OMP_NUM_THREADS", "OMP_PROC_BIND", "OMP_SCHEDULE"]
+TIME_COL = "Execution Time (s)"
+TOP_FRACTION = 0.10
+N_BOOTSTRAP = 1000
+CONFIDENCE = 0.95
+BOOT_CHUNK_ELEMS = 4_000_000     # bound on the (groups x n_boot x repeats) tensor
+STREAM_CHUNK_ROWS = 1_000_000
+# strings as per-chunk categoricals: a few bytes per row instead of a Python str
+STREAM_DTYPES = {col: ("category" if CACHE_DTYPES[col] == "category" else dtype)
+                 for col, dtype in CSV_DTYPES.items()}
+
 
-def extract_top_configs(csv_path: Path, executable_name: str, output_json: Path):
-    df = pd.read_csv(csv_path)
-    required_cols = {"Executable",
-                     "OMP_NUM_THREADS",
-                     "OMP_PROC_BIND",
-                     "OMP_SCHEDULE",
-                     "Execution Time (s)"}
-    missing = required_cols.difference(df.columns)
+def _check_columns(df: pd.DataFrame, csv_path: Path):
+    missing = REQUIRED_COLS.difference(df.columns)
     if missing:
         raise ValueError(
-            f"{csv_path} is missing column(s): {', '.join(missing)}"
+            f"{csv_path} is missing column(s): {', '.join(sorted(missing))}"
         )
 
-    # Find the column to filter all the entries
-    subset = df[df["Executable"] == executable_name].copy()
-    if subset.empty:
-        raise ValueError(f"No rows found for executable '{executable_name}'")
 
-    # Select top 10%
-    subset = subset.sort_values("Execution Time (s)", ascending=True)
-    n_top = max(1, math.ceil(0.10 * len(subset)))
-    top_subset = subset.head(n_top)
-
-    # Select unique values to form subset
-    result = {
+def _unique_values(top_subset: pd.DataFrame) -> Dict[str, List]:
+    # "dynamic,64" sweeps are reported as search_space knobs: kind + chunk
+    schedules = [split_schedule(s) for s in top_subset["OMP_SCHEDULE"].unique()]
+    values = {
         "OMP_NUM_THREADS": sorted(map(int,
                                     top_subset["OMP_NUM_THREADS"].unique())),
         "OMP_PROC_BIND":  sorted(map(str,
                                     top_subset["OMP_PROC_BIND"].unique())),
-        "OMP_SCHEDULE":   sorted(map(str,
-                                    top_subset["OMP_SCHEDULE"].unique())),
+        "OMP_SCHEDULE":   sorted({kind for kind, _ in schedules}),
     }
+    chunks = {chunk for _, chunk in schedules if chunk is not None}
+    if chunks:
+        values["OMP_SCHEDULE_CHUNK"] = sorted(chunks)
+    return values
 
 
-    # Save json file
+def _write_json(result, output_json: Path):
     output_json.parent.mkdir(parents=True, exist_ok=True)
     with open(output_json, "w") as fp:
         json.dump(result, fp, indent=4)
 
+
+def config_stats(df: pd.DataFrame,
+                 n_boot: int = N_BOOTSTRAP,
+                 confidence: float = CONFIDENCE,
+                 seed: int = 0) -> pd.DataFrame:
+    """Per-(executable, config) repeat statistics.
+
+    Returns one row per configuration with ``n``, ``median``, ``q1``, ``q3``,
+    ``iqr`` and a percentile-bootstrap CI of the median (``ci_low``,
+    ``ci_high``).  The bootstrap is vectorised over groups: all groups with
+    the same repeat count are resampled together as one
+    ``(groups, n_boot, repeats)`` tensor (chunked to bound memory).
+    """
+    keys = ["Executable"] + CONFIG_COLS
+    df = df.sort_values(keys, kind="stable")
+    grouped = df.groupby(keys, sort=False, observed=True)[TIME_COL]
+
+    q = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    stats = pd.DataFrame({"n": grouped.size(),
+                          "median": q[0.5],
+                          "q1": q[0.25],
+                          "q3": q[0.75]})
+    stats["iqr"] = stats["q3"] - stats["q1"]
+
+    times = df[TIME_COL].to_numpy(dtype=np.float64)
+    counts = stats["n"].to_numpy()
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    rng = np.random.default_rng(seed)
+    alpha = (1.0 - confidence) / 2.0
+    ci_low = np.empty(len(counts))
+    ci_high = np.empty(len(counts))
+
+    # groups with the same repeat count share one (groups, n_boot, n) draw
+    for n in np.unique(counts):
+        idx = np.flatnonzero(counts == n)
+        step = max(1, BOOT_CHUNK_ELEMS // (n_boot * n))
+        for start in range(0, len(idx), step):
+            sel = idx[start:start + step]
+            draw = rng.integers(0, n, size=(len(sel), n_boot, n))
+            boot_medians = np.median(times[offsets[sel][:, None, None] + draw], axis=2)
+            ci_low[sel], ci_high[sel] = np.quantile(
+                boot_medians, [alpha, 1.0 - alpha], axis=1)
+
+    stats["ci_low"] = ci_low
+    stats["ci_high"] = ci_high
+    return stats.reset_index()
+
+
+def robust_top_configs(stats: pd.DataFrame,
+                       top_fraction: float = TOP_FRACTION) -> pd.DataFrame:
+    """Select configurations per executable from :func:`config_stats` output.
+
+    Configs are ranked by median; the best ``ceil(frac * n_configs)`` are kept,
+    except those whose CI lower bound exceeds the CI upper bound of the best
+    config (clearly slower than the incumbent, not just unlucky).
+    """
+    stats = stats.sort_values(["Executable", "median"], kind="stable")
+    grouped = stats.groupby("Executable", sort=False, observed=True)
+    rank = grouped.cumcount()
+    n_top = grouped["median"].transform("size").mul(top_fraction)
+    n_top = n_top.apply(math.ceil).clip(lower=1)
+    best_ci_high = grouped["ci_high"].transform("first")
+
+    keep = (rank < n_top) & ((stats["ci_low"] <= best_ci_high) | (rank == 0))
+    return stats[keep]
+
+
+def _stats_records(top: pd.DataFrame) -> List[Dict]:
+    records = []
+    for row in top.itertuples(index=False):
+        records.append({
+            "OMP_NUM_THREADS": int(row.OMP_NUM_THREADS),
+            "OMP_PROC_BIND": str(row.OMP_PROC_BIND),
+            "OMP_SCHEDULE": str(row.OMP_SCHEDULE),
+            "n": int(row.n),
+            "median": float(row.median),
+            "q1": float(row.q1),
+            "q3": float(row.q3),
+            "iqr": float(row.iqr),
+            "ci_low": float(row.ci_low),
+            "ci_high": float(row.ci_high),
+        })
+    return records
+
+
+def resolve_executables(available: Iterable[str], patterns: Iterable[str] | None) -> List[str]:
+    """Expand exact names / glob patterns against the executables in the CSV.
+
+    ``patterns=None`` selects everything.  Order follows the first match of
+    each pattern so the output is stable across runs.
+    """
+    available = sorted(set(map(str, available)))
+    if patterns is None:
+        return available
+
+    selected: List[str] = []
+    for pat in patterns:
+        matches = fnmatch.filter(available, pat) if any(c in pat for c in "*?[") \
+            else [pat] if pat in available else []
+        if not matches:
+            raise ValueError(f"No rows found for executable '{pat}'")
+        selected.extend(m for m in matches if m not in selected)
+    return selected
+
+
+def top_subsets(df: pd.DataFrame, executables: List[str],
+                top_fraction: float = TOP_FRACTION,
+                robust: bool = True,
+                n_boot: int = N_BOOTSTRAP,
+                confidence: float = CONFIDENCE) -> Dict[str, Dict[str, List]]:
+    """Top-``top_fraction`` unique config values for every executable at once.
+
+    With ``robust`` the selection works on per-config statistics (see
+    :func:`robust_top_configs`) and each result carries a ``stats`` list.
+    Otherwise one sort + one groupby over the raw rows: rows are ranked inside
+    their executable by execution time and kept while ``rank < ceil(frac * n)``.
+    """
+    df = df[df["Executable"].isin(executables)]
+    if robust:
+        top = robust_top_configs(config_stats(df, n_boot, confidence), top_fraction)
+        results = {}
+        for exe, grp in top.groupby("Executable", sort=False, observed=True):
+            results[exe] = _unique_values(grp)
+            results[exe]["stats"] = _stats_records(grp)
+        return results
+
+    df = df.sort_values(["Executable", "Execution Time (s)"], kind="stable")
+
+    grouped = df.groupby("Executable", sort=False, observed=True)
+    rank = grouped.cumcount()
+    n_top = grouped["Execution Time (s)"].transform("size").mul(top_fraction)
+    n_top = n_top.apply(math.ceil).clip(lower=1)
+    top = df[rank < n_top]
+
+    return {exe: _unique_values(grp)
+            for exe, grp in top.groupby("Executable", sort=False, observed=True)}
+
+
+# --------------------------------------------------------------------------- #
+# Streaming mode                                                              #
+# --------------------------------------------------------------------------- #
+def _matches(name: str, patterns: List[str] | None) -> bool:
+    if patterns is None:
+        return True
+    return any(fnmatch.fnmatchcase(name, p) if any(c in p for c in "*?[") else name == p
+               for p in patterns)
+
+
+def _csv_chunks(csv_path: Path, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    header = pd.read_csv(csv_path, nrows=0)
+    _check_columns(header, csv_path)
+    yield from pd.read_csv(csv_path, usecols=COLUMNS, dtype=STREAM_DTYPES,
+                           chunksize=chunk_rows)
+
+
+def _selected(chunk: pd.DataFrame, patterns: List[str] | None, seen: set) -> pd.DataFrame:
+    """Rows of *chunk* whose executable matches; records every name in *seen*."""
+    names = [str(c) for c in chunk["Executable"].cat.categories]
+    seen.update(names)
+    wanted = [n for n in names if _matches(n, patterns)]
+    return chunk[chunk["Executable"].isin(wanted)]
+
+
+def _concat_typed(parts: List[pd.DataFrame]) -> pd.DataFrame:
+    """``perf_store`` typed frame from chunks with per-chunk categories."""
+    if not parts:
+        return pd.DataFrame(columns=COLUMNS).astype(CACHE_DTYPES)
+    columns = {}
+    for col in parts[0].columns:
+        if CACHE_DTYPES.get(col) == "category":
+            columns[col] = pd.api.types.union_categoricals(
+                [p[col] for p in parts], sort_categories=True)
+        else:
+            columns[col] = np.concatenate([p[col].to_numpy(CACHE_DTYPES.get(col)) for p in parts])
+    return pd.DataFrame(columns)
+
+
+def _stream_raw(csv_path: Path, counts: Dict[str, int], top_fraction: float,
+                chunk_rows: int) -> Dict[str, Dict[str, List]]:
+    """Raw-row top subset: per executable the ``ceil(frac * n)`` fastest of its
+    *counts* rows, kept as a bounded top-k while streaming."""
+    names = list(counts)
+    k = pd.Series({name: max(1, math.ceil(top_fraction * n)) for name, n in counts.items()})
+
+    def top_k(frame: pd.DataFrame) -> pd.DataFrame:
+        # (time, file order) reproduces the stable sort of the in-memory path
+        frame = frame.sort_values(["Executable", TIME_COL, "order"])
+        rank = frame.groupby("Executable", sort=False, observed=True).cumcount().to_numpy()
+        return frame[rank < frame["Executable"].map(k).to_numpy(dtype=float)]
+
+    keep = None
+    offset = 0
+    for chunk in _csv_chunks(csv_path, chunk_rows):
+        chunk["order"] = np.arange(offset, offset + len(chunk))
+        offset += len(chunk)
+        # rows past a kernel's k inside one chunk cannot make its top-k
+        chunk = top_k(chunk[chunk["Executable"].isin(names)])
+        keep = chunk if keep is None else top_k(_concat_typed([keep, chunk]))
+
+    return {str(exe): _unique_values(grp)
+            for exe, grp in keep.groupby("Executable", sort=False, observed=True)}
+
+
+def stream_top_subsets(csv_path: Path,
+                       executables: Iterable[str] | None = None,
+                       top_fraction: float = TOP_FRACTION,
+                       robust: bool = True,
+                       n_boot: int = N_BOOTSTRAP,
+                       chunk_rows: int = STREAM_CHUNK_ROWS,
+                       confidence: float = CONFIDENCE) -> Dict[str, Dict[str, List]]:
+    """:func:`top_subsets` computed from the CSV in chunks.
+
+    Only the selected executables' rows are kept (robust mode, O(selected
+    rows)) or a top-k of them (raw mode).  Returns ``{executable: subset}`` in :func:`resolve_executables` order.
+    """
+    patterns = None if executables is None else list(executables)
+    seen: set = set()
+    parts = []
+    counts: Dict[str, int] = collections.Counter()
+    for chunk in _csv_chunks(csv_path, chunk_rows):
+        part = _selected(chunk, patterns, seen)
+        if robust and len(part):
+            parts.append(part)
+        elif not robust:
+            vc = part["Executable"].value_counts()
+            counts.update({str(name): int(n) for name, n in vc[vc > 0].items()})
+    names = resolve_executables(seen, patterns)
+
+    if robust:
+        results = top_subsets(_concat_typed(parts), names, top_fraction, robust=True,
+                              n_boot=n_boot, confidence=confidence)
+    else:
+        results = _stream_raw(csv_path, {name: counts[name] for name in names},
+                              top_fraction, chunk_rows)
+    return {name: results[name] for name in names}
+
+
+def extract_top_configs_batch(csv_path: Path,
+                              executables: Iterable[str] | None = None,
+                              output_dir: Path | None = None,
+                              output_json: Path | None = None,
+                              top_fraction: float = TOP_FRACTION,
+                              robust: bool = True,
+                              n_boot: int = N_BOOTSTRAP,
+                              stream: bool = False,
+                              chunk_rows: int = STREAM_CHUNK_ROWS,
+                              confidence: float = CONFIDENCE) -> Dict[str, Dict[str, List]]:
+    """Batch variant of :func:`extract_top_configs`.
+
+    Parses *csv_path* once, then writes either one ``<executable>.json`` per
+    kernel into *output_dir*, a single combined ``{executable: subset}`` JSON
+    at *output_json*, or both.  *stream* reads the CSV in chunks instead of
+    loading it (see :func:`stream_top_subsets`).
+    """
+    if stream:
+        results = stream_top_subsets(csv_path, executables, top_fraction, robust, n_boot, chunk_rows,
+                                     confidence)
+    else:
+        df = load_results(csv_path)
+        _check_columns(df, csv_path)
+
+        names = resolve_executables(df["Executable"].unique(), executables)
+        results = top_subsets(df, names, top_fraction, robust=robust, n_boot=n_boot,
+                              confidence=confidence)
+        results = {name: results[name] for name in names}
+
+    if output_dir is not None:
+        for name, result in results.items():
+            _write_json(result, output_dir / f"{name}.json")
+    if output_json is not None:
+        _write_json(results, output_json)
+
+    return results
+
+
+def extract_top_configs(csv_path: Path, executable_name: str, output_json: Path,
+                        robust: bool = True, n_boot: int = N_BOOTSTRAP,
+                        stream: bool = False, chunk_rows: int = STREAM_CHUNK_ROWS,
+                        confidence: float = CONFIDENCE):
+    if stream:
+        result = stream_top_subsets(csv_path, [executable_name], TOP_FRACTION, robust,
+                                    n_boot, chunk_rows, confidence)[executable_name]
+        _write_json(result, output_json)
+        return result
+
+    df = load_results(csv_path)
+    _check_columns(df, csv_path)
+
+    # Find the column to filter all the entries
+    subset = df[df["Executable"] == executable_name].copy()
+    if subset.empty:
+        raise ValueError(f"No rows found for executable '{executable_name}'")
+
+    if robust:
+        result = top_subsets(subset, [executable_name], n_boot=n_boot,
+                             confidence=confidence)[executable_name]
+        _write_json(result, output_json)
+        return result
+
+    # Select top 10% of raw rows
+    subset = subset.sort_values("Execution Time (s)", ascending=True, kind="stable")
+    n_top = max(1, math.ceil(0.10 * len(subset)))
+    top_subset = subset.head(n_top)
+
+    # Select unique values to form subset
+    result = _unique_values(top_subset)
+
+    # Save json file
+    _write_json(result, output_json)
+
     return result
 
 
 def build_arg_parser():
     parser = argparse.ArgumentParser(description="Extract unique OpenMP settings from the top‑10 % ""fastest runs of a specified executable.")
     parser.add_argument("-csv", type=Path, help="CSV file containing the experiment results.")
-    parser.add_argument("-executable", type=str, help="Exact name of the executable to filter on.")
-    parser.add_argument("-o", "--output-json", type=Path, default=Path("top_configs.json"), help="Path for the generated JSON file ""(default: %(default)s).")
+    parser.add_argument("-executable", type=str, nargs="+", help="Exact name(s) or glob pattern(s) of the executable(s) to filter on.")
+    parser.add_argument("-raw", action="store_true", help="Rank individual runs instead of per-config medians (old behaviour).")
+    parser.add_argument("-n-boot", type=int, default=N_BOOTSTRAP, help="Bootstrap resamples for the median CI (default: %(default)s).")
+    parser.add_argument("-confidence", type=float, default=CONFIDENCE, help="Confidence level of the median CI (default: %(default)s).")
+    parser.add_argument("-stream", action="store_true", help="Read the CSV in chunks, keeping only the selected kernels' rows "
+                        "(memory O(selected rows); with -all about that of the cached path).")
+    parser.add_argument("-chunk-rows", type=int, default=STREAM_CHUNK_ROWS, help="Rows per chunk with -stream (default: %(default)s).")
+    parser.add_argument("-all", action="store_true", help="Process every executable in the CSV (batch mode).")
+    parser.add_argument("-output-dir", type=Path, default=None, help="Batch mode: write one <executable>.json per kernel into this directory.")
+    parser.add_argument("-o", "--output-json", type=Path, default=None, help="Path for the generated JSON file ""(default: top_configs.json). In batch mode a combined {executable: subset} file.")
     return parser
 
 
@@ -76,16 +434,50 @@ def main():
     parser = build_arg_parser()
     args = parser.parse_args()
 
+    if args.csv is None:
+        parser.error("-csv is required")
+    if not args.all and not args.executable:
+        parser.error("give -executable NAME [NAME ...] or -all")
+
+    single = (not args.all and len(args.executable) == 1
+              and not any(c in args.executable[0] for c in "*?[")
+              and args.output_dir is None)
+
     try:
-        configs = extract_top_configs(
-            csv_path=args.csv,
-            executable_name=args.executable,
-            output_json=args.output_json
-        )
+        if single:
+            output_json = args.output_json or Path("top_configs.json")
+            configs = extract_top_configs(
+                csv_path=args.csv,
+                executable_name=args.executable[0],
+                output_json=output_json,
+                robust=not args.raw,
+                n_boot=args.n_boot,
+                confidence=args.confidence,
+                stream=args.stream,
+                chunk_rows=args.chunk_rows,
+            )
+        else:
+            output_json = args.output_json
+            if output_json is None and args.output_dir is None:
+                output_json = Path("top_configs.json")
+            configs = extract_top_configs_batch(
+                csv_path=args.csv,
+                executables=None if args.all else args.executable,
+                output_dir=args.output_dir,
+                output_json=output_json,
+                robust=not args.raw,
+                n_boot=args.n_boot,
+                confidence=args.confidence,
+                stream=args.stream,
+                chunk_rows=args.chunk_rows,
+            )
     except Exception as exc:
         parser.error(str(exc))
 
-    print(f"Unique configuration values saved to '{args.output_json}':")
+    if single or output_json is not None:
+        print(f"Unique configuration values saved to '{output_json}':")
+    else:
+        print(f"Unique configuration values for {len(configs)} executable(s) saved to '{args.output_dir}':")
     print(json.dumps(configs, indent=4))
 
 
@@ -1,29 +1,22 @@
-from llvmlite import binding as llvm
-llvm.initialize(); llvm.initialize_native_target()
+import argparse
 
-mod = llvm.parse_assembly(open("kernel.ll").read())
+from ir_features import analyze_module
 
-def is_load_or_store(inst):
-    return inst.opcode in ('load', 'store')
+# Memory / synchronisation stats of the OpenMP outlined regions of a module
+# (now a thin CLI over the shared single-pass extractor in ir_features.py).
+ap = argparse.ArgumentParser(description="Load/store/atomic/barrier stats of .omp_outlined functions.")
+ap.add_argument("ir", nargs="?", default="kernel.ll", help="Path to LLVM-IR file (default: %(default)s)")
+ns = ap.parse_args()
 
-def bytes_of_access(inst, dl):
-    ty = inst.type.pointee if inst.opcode=='load' else inst.operands[0].type.pointee
-    return dl.getTypeAllocSize(ty)
-
-dl = llvm.create_target_machine().target_data
+analysis = analyze_module(open(ns.ir).read())
 stats = {'loads':0, 'stores':0, 'bytes':0, 'atomic':0, 'barrier':0}
 
-for fn in mod.functions:
-    if fn.name.startswith('.omp_outlined'):
-        for bb in fn.basic_blocks:
-            for inst in bb.instructions:
-                if is_load_or_store(inst):
-                    stats[inst.opcode+'s'] += 1
-                    stats['bytes']        += bytes_of_access(inst, dl)
-                elif inst.opcode in ('atomicrmw','cmpxchg'):
-                    stats['atomic'] += 1
-                elif getattr(inst, 'called_function', None) and \
-                     inst.called_function.name.startswith('__kmpc_barrier'):
-                    stats['barrier'] += 1
+for fn in analysis["functions"]:
+    if fn["omp_outlined"]:
+        stats['loads']   += fn["loads"]
+        stats['stores']  += fn["stores"]
+        stats['bytes']   += fn["bytes"]
+        stats['atomic']  += fn["atomics"]
+        stats['barrier'] += fn["barriers"]
 
 print(stats)
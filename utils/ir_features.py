@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+ir_features.py
+
+Single-pass static feature extractor for LLVM-IR, shared by every seed picker.
+
+The module is parsed once with llvmlite and every defined function is walked
+once (``.omp_outlined`` bodies included).  During that walk we record
+per-block instruction counts and the CFG; loops are then recovered from the
+CFG itself – back edges ``u -> h`` where ``h`` dominates ``u`` – instead of
+guessing from ``br label`` indentation.  Per loop (inclusive of nested loops)
+we report loads, stores, FLOPs, integer ops, bytes accessed, atomics and
+``__kmpc_barrier`` calls.
+
+``extract_features`` returns the compact dict the seed-picker prompts use;
+``analyze_module`` returns the full per-function / per-loop breakdown.
+
+Example
+-------
+python ir_features.py ../llvm-ir/3mm_kernel_p1.ll            # compact features
+python ir_features.py ../llvm-ir/3mm_kernel_p1.ll --full     # per-function / per-loop
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+from collections import Counter
+from typing import Any, Dict, List, Set
+
+from llvmlite import binding as llvm
+
+FP_OPS = {"fadd", "fsub", "fmul", "fdiv", "frem", "fneg"}
+INT_OPS = {"add", "sub", "mul", "udiv", "sdiv", "urem", "srem",
+           "shl", "lshr", "ashr", "and", "or", "xor"}
+ATOMIC_OPS = {"atomicrmw", "cmpxchg"}
+MATH_FUNCS = {"sin", "cos", "tan", "exp", "exp2", "log", "log2", "log10",
+              "pow", "sqrt", "tanh", "fabs", "floor", "ceil"}
+FMA_INTRINSICS = ("llvm.fmuladd", "llvm.fma")
+COUNT_KEYS = ("loads", "stores", "flops", "int_ops", "bytes", "atomics",
+              "barriers", "calls", "vector_ops", "instructions")
+
+_SCALAR_BYTES = re.compile(r"^(?:i(\d+)|(half|bfloat|float|double|x86_fp80|fp128|ptr))$")
+_FP_BYTES = {"half": 2, "bfloat": 2, "float": 4, "double": 8, "x86_fp80": 16, "fp128": 16, "ptr": 8}
+
+
+def _type_bytes(ty, target_data) -> int:
+    if target_data is not None:
+        try:
+            return int(target_data.get_abi_size(ty))
+        except Exception:
+            pass
+    m = _SCALAR_BYTES.match(str(ty))
+    if not m:
+        return 0
+    return (int(m.group(1)) + 7) // 8 if m.group(1) else _FP_BYTES[m.group(2)]
+
+
+def _lanes(ty) -> int:
+    return ty.element_count if ty.is_vector else 1
+
+
+def _callee_name(inst) -> str:
+    ops = list(inst.operands)
+    return ops[-1].name if ops else ""
+
+
+# --------------------------------------------------------------------------- #
+# CFG analysis                                                                #
+# --------------------------------------------------------------------------- #
+def _dominators(succ: List[List[int]]) -> List[Set[int]]:
+    """Iterative dataflow dominators over block indices (entry = 0)."""
+    n = len(succ)
+    pred: List[List[int]] = [[] for _ in range(n)]
+    for u, vs in enumerate(succ):
+        for v in vs:
+            pred[v].append(u)
+
+    # reverse post-order from the entry; unreachable blocks are ignored
+    order, seen, stack = [], {0}, [(0, iter(succ[0]))]
+    while stack:
+        node, it = stack[-1]
+        nxt = next((v for v in it if v not in seen), None)
+        if nxt is None:
+            order.append(node)
+            stack.pop()
+        else:
+            seen.add(nxt)
+            stack.append((nxt, iter(succ[nxt])))
+    rpo = order[::-1]
+
+    everything = set(rpo)
+    dom = [set(everything) for _ in range(n)]
+    dom[0] = {0}
+    changed = True
+    while changed:
+        changed = False
+        for b in rpo[1:]:
+            preds = [p for p in pred[b] if p in everything]
+            new = set.intersection(*(dom[p] for p in preds)) if preds else set()
+            new = new | {b}
+            if new != dom[b]:
+                dom[b] = new
+                changed = True
+    for b in range(n):
+        if b not in everything:
+            dom[b] = set()
+    return dom
+
+
+def find_loops(succ: List[List[int]]) -> List[Dict[str, Any]]:
+    """Natural loops (merged per header) with nesting depth and parent."""
+    if not succ:
+        return []
+    dom = _dominators(succ)
+    pred: List[List[int]] = [[] for _ in range(len(succ))]
+    for u, vs in enumerate(succ):
+        for v in vs:
+            pred[v].append(u)
+
+    bodies: Dict[int, Set[int]] = {}
+    for u, vs in enumerate(succ):
+        for h in vs:
+            if h in dom[u]:                      # back edge u -> h
+                body = bodies.setdefault(h, {h})
+                work = [u]
+                while work:
+                    x = work.pop()
+                    if x not in body:
+                        body.add(x)
+                        work.extend(pred[x])
+
+    loops = [{"header": h, "blocks": body} for h, body in bodies.items()]
+    loops.sort(key=lambda lp: len(lp["blocks"]), reverse=True)
+    for i, lp in enumerate(loops):
+        parents = [j for j in range(i) if lp["header"] in loops[j]["blocks"]]
+        lp["parent"] = parents[-1] if parents else None
+        lp["depth"] = (loops[lp["parent"]]["depth"] + 1) if parents else 1
+    return loops
+
+
+# --------------------------------------------------------------------------- #
+# Module walk                                                                 #
+# --------------------------------------------------------------------------- #
+def _analyze_function(fn, target_data) -> Dict[str, Any]:
+    blocks = list(fn.blocks)
+    index = {blk: i for i, blk in enumerate(blocks)}
+    succ: List[List[int]] = []
+    per_block: List[Counter] = []
+    math_call = False
+
+    for blk in blocks:
+        cnt = Counter()
+        last = None
+        for inst in blk.instructions:
+            last = inst
+            op = inst.opcode
+            cnt["instructions"] += 1
+            ty = inst.type
+            if op == "load":
+                cnt["loads"] += 1
+                cnt["bytes"] += _type_bytes(ty, target_data)
+            elif op == "store":
+                cnt["stores"] += 1
+                cnt["bytes"] += _type_bytes(next(iter(inst.operands)).type, target_data)
+            elif op in FP_OPS:
+                cnt["flops"] += _lanes(ty)
+            elif op in INT_OPS:
+                cnt["int_ops"] += _lanes(ty)
+            elif op in ATOMIC_OPS:
+                cnt["atomics"] += 1
+            elif op == "call" or op == "invoke":
+                name = _callee_name(inst)
+                if name.startswith("llvm.dbg."):
+                    continue
+                cnt["calls"] += 1
+                if name.startswith("__kmpc_barrier"):
+                    cnt["barriers"] += 1
+                elif name.startswith(FMA_INTRINSICS):
+                    cnt["flops"] += 2 * _lanes(ty)
+                elif name.split(".")[1 if name.startswith("llvm.") else 0] in MATH_FUNCS:
+                    math_call = True
+                    cnt["flops"] += _lanes(ty)
+            if ty.is_vector:
+                cnt["vector_ops"] += 1
+        per_block.append(cnt)
+        targets = [] if last is None else \
+            [index[o] for o in last.operands if o.value_kind == llvm.ValueKind.basic_block and o in index]
+        succ.append(list(dict.fromkeys(targets)))
+
+    loops = []
+    for lp in find_loops(succ):
+        tot = Counter()
+        for b in lp["blocks"]:
+            tot.update(per_block[b])
+        loops.append({"header": lp["header"],
+                      "depth": lp["depth"],
+                      "parent": lp["parent"],
+                      "n_blocks": len(lp["blocks"]),
+                      **{k: tot[k] for k in COUNT_KEYS}})
+
+    totals = Counter()
+    for cnt in per_block:
+        totals.update(cnt)
+    return {"name": fn.name,
+            "omp_outlined": "omp_outlined" in fn.name,
+            "n_blocks": len(blocks),
+            "loop_depth": max((lp["depth"] for lp in loops), default=0),
+            "uses_math_lib": math_call,
+            "loops": loops,
+            **{k: totals[k] for k in COUNT_KEYS}}
+
+
+def analyze_module(ir_src: str) -> Dict[str, Any]:
+    """Full per-function / per-loop analysis of one IR module."""
+    module = llvm.parse_assembly(ir_src)
+    try:
+        target_data = llvm.create_target_data(module.data_layout)
+    except Exception:
+        target_data = None
+
+    functions = [_analyze_function(fn, target_data)
+                 for fn in module.functions if not fn.is_declaration]
+    totals = {k: sum(f[k] for f in functions) for k in COUNT_KEYS}
+    return {"functions": functions,
+            "totals": totals,
+            "n_loops": sum(len(f["loops"]) for f in functions),
+            "loop_depth": max((f["loop_depth"] for f in functions), default=0),
+            "omp_outlined": sum(f["omp_outlined"] for f in functions),
+            "uses_math_lib": any(f["uses_math_lib"] for f in functions)}
+
+
+def compact_features(analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """The prompt-sized feature dict used by the seed pickers."""
+    t = analysis["totals"]
+    mem = t["loads"] + t["stores"]
+    arith = t["flops"] + t["int_ops"]
+    mem_int = mem / max(1, arith)
+    return {"bound": "memory" if mem_int > 2 else "compute" if mem_int < .5 else "mixed",
+            "mem_intensity": round(mem_int, 3),
+            "loop_depth": analysis["loop_depth"],
+            "n_loops": analysis["n_loops"],
+            "flops": t["flops"],
+            "bytes_accessed": t["bytes"],
+            "vector_ratio": round(t["vector_ops"] / max(1, mem + arith), 3),
+            "atomics": t["atomics"],
+            "barriers": t["barriers"],
+            "omp_outlined_funcs": analysis["omp_outlined"],
+            "uses_math_lib": analysis["uses_math_lib"]}
+
+
+def extract_features(ir_src: str) -> Dict[str, Any]:
+    return compact_features(analyze_module(ir_src))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Static features of an LLVM-IR file.")
+    ap.add_argument("ir", help="Path to LLVM-IR file")
+    ap.add_argument("--full", action="store_true", help="Per-function / per-loop breakdown")
+    ns = ap.parse_args()
+
+    with open(ns.ir) as fp:
+        src = fp.read()
+    print(json.dumps(analyze_module(src) if ns.full else extract_features(src), indent=2))
@@ -0,0 +1,161 @@
+"""
+llm_cache.py
+
+Content-addressed on-disk cache of LLM responses, shared by every backend
+(OpenRouter in ``agents/llm_client.py``, the OpenAI and HF Inference seed
+pickers).
+
+The key is a SHA-256 of the canonical JSON of everything that determines the
+reply: backend, model, messages / prompt, temperature, stop sequences and
+token limit.  Entries live in one SQLite file; when its payload exceeds
+``max_bytes`` the least recently used entries are evicted.
+
+Only deterministic (temperature 0) calls are cached by default; a sampled
+call must opt in (see :func:`cacheable`), else its first reply would be
+replayed forever.  A reply can be checked before it is stored (``validate=``).
+
+Opt out per call site with ``enabled=False`` / ``--no-llm-cache``, or globally
+with ``AATUNE_LLM_CACHE=0``.  ``AATUNE_LLM_CACHE_PATH`` moves the file.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+from tracing import count
+
+DEFAULT_PATH = Path(os.getenv("AATUNE_LLM_CACHE_PATH",
+                              Path.home() / ".cache" / "aatune" / "llm_responses.sqlite"))
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key       TEXT PRIMARY KEY,
+    model     TEXT,
+    response  TEXT NOT NULL,
+    size      INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_used);
+"""
+
+
+def cacheable(temperature: float, sampled: bool = False) -> bool:
+    """Cache a call's reply?  Always at temperature 0, else only if *sampled* opts in."""
+    return sampled or temperature == 0
+
+
+def cache_key(**parts: Any) -> str:
+    """SHA-256 of the canonical JSON of *parts* (key order independent)."""
+    blob = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+class ResponseCache:
+    """Size-bounded LRU response cache on SQLite."""
+
+    def __init__(self, path: Path = DEFAULT_PATH, max_bytes: int = DEFAULT_MAX_BYTES,
+                 enabled: bool = True):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def get(self, key: str) -> str | None:
+        if not self.enabled:
+            return None
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT response FROM responses WHERE key=?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                count("llm_cache.misses")
+                return None
+            with db:
+                db.execute("UPDATE responses SET last_used=? WHERE key=?", (time.time(), key))
+            self.hits += 1
+            count("llm_cache.hits")
+            return row[0]
+
+    def put(self, key: str, response: str, model: str | None = None):
+        if not self.enabled:
+            return
+        size = len(response.encode())
+        with self._lock:
+            db = self._db()
+            with db:
+                db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                           (key, model, response, size, time.time()))
+                self._evict(db)
+
+    def _evict(self, db: sqlite3.Connection):
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        victims = []
+        for key, size in db.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        db.executemany("DELETE FROM responses WHERE key=?", victims)
+
+    def cached(self, call: Callable[[], str], model: str | None = None,
+               validate: Callable[[str], Any] | None = None, **key_parts: Any) -> str:
+        """Return the cached reply for *key_parts*, else ``call()`` and store it.
+
+        With *validate* the reply is only stored if ``validate(reply)`` does
+        not raise (the exception propagates).
+        """
+        if not self.enabled:
+            return call()
+        key = cache_key(model=model, **key_parts)
+        hit = self.get(key)
+        if hit is not None:
+            return hit
+        response = call()
+        if validate is not None:
+            validate(response)
+        self.put(key, response, model)
+        return response
+
+    def clear(self):
+        with self._lock:
+            db = self._db()
+            with db:
+                db.execute("DELETE FROM responses")
+
+
+_DEFAULT: ResponseCache | None = None
+
+
+def default_cache() -> ResponseCache:
+    """Process-wide cache honouring ``AATUNE_LLM_CACHE`` / ``..._PATH``."""
+    global _DEFAULT
+    if _DEFAULT is None:
+        enabled = os.getenv("AATUNE_LLM_CACHE", "1").lower() not in {"0", "false", "off", "no"}
+        _DEFAULT = ResponseCache(DEFAULT_PATH, enabled=enabled)
+    return _DEFAULT
+
+
+def disable_default_cache():
+    default_cache().enabled = False
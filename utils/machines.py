@@ -0,0 +1,63 @@
+"""
+machines.py
+
+Machine descriptors shared by the agents, seed pickers and cache layers.  The
+dict layout is the one the prompt generator already sends to the LLM
+(``cpu``, ``num_sockets``, ``cores_per_socket`` ...); ``threads_per_core`` is
+optional and defaults to 1.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Any, Dict
+
+AMD_EPYC_9654 = {
+    "cpu": "AMD EPYC 9654",
+    "num_sockets": 2,
+    "cores_per_socket": 96,
+    "l3_cache_per_socket": "256 MB",
+    "memory": "512 GB DDR5",
+    "os": "Ubuntu 22.04",
+}
+
+INTEL_SKYLAKE_SP = {
+    "cpu": "Intel Xeon Skylake-SP",
+    "num_sockets": 2,
+    "cores_per_socket": 24,
+    "threads_per_core": 2,
+}
+
+MACHINES: Dict[str, Dict[str, Any]] = {
+    "amd": AMD_EPYC_9654,
+    "intel": INTEL_SKYLAKE_SP,
+}
+
+
+def physical_cores(machine: Dict[str, Any]) -> int:
+    return int(machine["num_sockets"]) * int(machine["cores_per_socket"])
+
+
+def machine_key(machine: Dict[str, Any]) -> str:
+    """Stable short id for a descriptor (key order / whitespace independent)."""
+    blob = json.dumps(machine, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode()).hexdigest()[:16]
+
+
+def resolve_machine(name_or_path: str) -> Dict[str, Any]:
+    """Preset name from :data:`MACHINES` or path to a JSON descriptor."""
+    if name_or_path in MACHINES:
+        return MACHINES[name_or_path]
+    with open(name_or_path) as fp:
+        return json.load(fp)
+
+
+def local_machine() -> Dict[str, Any]:
+    """Descriptor of the host we are running on (for cache keys)."""
+    import os
+    import platform
+
+    return {"cpu": platform.processor() or platform.machine(),
+            "host": platform.node(),
+            "logical_cpus": os.cpu_count()}
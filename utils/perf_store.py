@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+perf_store.py
+
+Typed, columnar cache in front of the ``performance_data/*.csv`` sweep files.
+
+The CSV stays the source of truth (sweep scripts keep appending to it); next to
+it we keep ``<csv>.cache/`` holding Parquet parts (pickle if pyarrow is not
+installed) with
+
+* ``OMP_PROC_BIND`` / ``OMP_SCHEDULE`` stored as categoricals,
+* ``Executable`` dictionary-encoded (categorical),
+* ``OMP_NUM_THREADS`` as int16 and the timing as float64.
+
+The cache is validated against the CSV size + mtime.  When the CSV only grew
+(an appended sweep) and its fingerprint still matches, just the new tail is
+parsed and stored as an extra part; any other change triggers a full rebuild.
+
+Example
+-------
+python perf_store.py -csv ../performance_data/all_results_amd.csv          # build / refresh
+python perf_store.py -csv ../performance_data/all_results_amd.csv -append new_sweep.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import io
+import json
+import os
+from pathlib import Path
+from typing import Dict
+
+import pandas as pd
+
+from tracing import span
+
+try:
+    import pyarrow  # noqa: F401  (only needed by pandas' parquet engine)
+except ImportError:
+    pyarrow = None
+
+COLUMNS = ["Executable",
+           "OMP_NUM_THREADS",
+           "OMP_PROC_BIND",
+           "OMP_SCHEDULE",
+           "Execution Time (s)"]
+
+# Read everything but the numbers as plain strings: a tail chunk that only
+# contains "true"/"false" binds must not be coerced to bool.
+CSV_DTYPES = {"Executable": str,
+              "OMP_NUM_THREADS": "int64",
+              "OMP_PROC_BIND": str,
+              "OMP_SCHEDULE": str,
+              "Execution Time (s)": "float64"}
+
+CACHE_DTYPES = {"Executable": "category",
+                "OMP_NUM_THREADS": "int16",
+                "OMP_PROC_BIND": "category",
+                "OMP_SCHEDULE": "category",
+                "Execution Time (s)": "float64"}
+
+FINGERPRINT_BYTES = 4096
+MAX_PARTS = 16           # compact into a single part beyond this
+META_NAME = "meta.json"
+
+
+def _fingerprint(path: Path, size: int) -> str:
+    """Hash of the first and last few KB below *size* (cheap prefix check)."""
+    h = hashlib.sha1()
+    with open(path, "rb") as fp:
+        h.update(fp.read(min(size, FINGERPRINT_BYTES)))
+        fp.seek(max(0, size - FINGERPRINT_BYTES))
+        h.update(fp.read(min(size, FINGERPRINT_BYTES)))
+    return h.hexdigest()
+
+
+def _typed(df: pd.DataFrame) -> pd.DataFrame:
+    return df[COLUMNS].astype(CACHE_DTYPES)
+
+
+class PerfStore:
+    """Columnar cache for one results CSV."""
+
+    def __init__(self, csv_path: Path, cache_dir: Path | None = None):
+        self.csv_path = Path(csv_path)
+        self.cache_dir = Path(cache_dir) if cache_dir else \
+            self.csv_path.with_name(self.csv_path.name + ".cache")
+        self.fmt = "parquet" if pyarrow is not None else "pkl"
+        self._frame: pd.DataFrame | None = None
+        self._frame_key: tuple | None = None
+
+    # -- metadata ---------------------------------------------------------- #
+    def _read_meta(self) -> Dict | None:
+        meta_path = self.cache_dir / META_NAME
+        if not meta_path.exists():
+            return None
+        with open(meta_path) as fp:
+            meta = json.load(fp)
+        if meta.get("fmt") != self.fmt:
+            return None
+        return meta
+
+    def _write_meta(self, meta: Dict):
+        tmp = self.cache_dir / (META_NAME + ".tmp")
+        with open(tmp, "w") as fp:
+            json.dump(meta, fp, indent=2)
+        os.replace(tmp, self.cache_dir / META_NAME)
+
+    # -- parts ------------------------------------------------------------- #
+    def _part_path(self, idx: int) -> Path:
+        return self.cache_dir / f"part-{idx:05d}.{self.fmt}"
+
+    def _write_part(self, df: pd.DataFrame, idx: int):
+        path = self._part_path(idx)
+        if self.fmt == "parquet":
+            df.to_parquet(path, index=False)
+        else:
+            df.to_pickle(path)
+
+    def _read_part(self, idx: int) -> pd.DataFrame:
+        path = self._part_path(idx)
+        if self.fmt == "parquet":
+            return pd.read_parquet(path)
+        return pd.read_pickle(path)
+
+    # -- CSV parsing --------------------------------------------------------- #
+    def _parse_csv_from(self, offset: int, size: int) -> tuple[pd.DataFrame, int]:
+        """Parse the rows in ``[offset, size)``; return frame + end offset."""
+        with open(self.csv_path, "rb") as fp:
+            header = fp.readline()
+            start = max(offset, len(header))
+            fp.seek(start)
+            body = fp.read(size - start)
+        end = start + len(body)
+        if not body.strip():
+            return pd.DataFrame(columns=COLUMNS).astype(CACHE_DTYPES), end
+        df = pd.read_csv(io.BytesIO(header + body), dtype=CSV_DTYPES)
+        missing = set(COLUMNS).difference(df.columns)
+        if missing:
+            raise ValueError(
+                f"{self.csv_path} is missing column(s): {', '.join(sorted(missing))}"
+            )
+        return _typed(df), end
+
+    # -- public API ---------------------------------------------------------- #
+    def refresh(self) -> Dict:
+        """Bring the cache in sync with the CSV and return its metadata."""
+        stat = self.csv_path.stat()
+        meta = self._read_meta()
+
+        if meta and meta["csv_size"] == stat.st_size \
+                and meta["csv_mtime_ns"] == stat.st_mtime_ns:
+            return meta
+
+        grown = (meta is not None
+                 and stat.st_size > meta["csv_size"]
+                 and _fingerprint(self.csv_path, meta["csv_size"]) == meta["fingerprint"])
+
+        if grown:
+            tail, end = self._parse_csv_from(meta["offset"], stat.st_size)
+            if len(tail):
+                self._write_part(tail, meta["n_parts"])
+                meta["n_parts"] += 1
+                meta["n_rows"] += len(tail)
+        else:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            for old in self.cache_dir.glob("part-*"):
+                old.unlink()
+            df, end = self._parse_csv_from(0, stat.st_size)
+            self._write_part(df, 0)
+            meta = {"fmt": self.fmt, "n_parts": 1, "n_rows": len(df)}
+
+        meta.update(csv_size=stat.st_size,
+                    csv_mtime_ns=stat.st_mtime_ns,
+                    offset=end,
+                    fingerprint=_fingerprint(self.csv_path, stat.st_size))
+        self._write_meta(meta)
+
+        if meta["n_parts"] > MAX_PARTS:
+            meta = self.compact(meta)
+        return meta
+
+    def compact(self, meta: Dict | None = None) -> Dict:
+        """Merge all parts into one."""
+        meta = meta or self.refresh()
+        df = self._concat(meta)
+        for idx in range(meta["n_parts"]):
+            self._part_path(idx).unlink()
+        self._write_part(df, 0)
+        meta["n_parts"] = 1
+        self._write_meta(meta)
+        return meta
+
+    def _concat(self, meta: Dict) -> pd.DataFrame:
+        parts = [self._read_part(i) for i in range(meta["n_parts"])]
+        if len(parts) == 1:
+            return parts[0]
+        # categoricals with different dictionaries concat to object -> re-encode
+        return _typed(pd.concat(parts, ignore_index=True))
+
+    def load(self) -> pd.DataFrame:
+        """Typed frame of every row in the CSV (memoised per process)."""
+        meta = self.refresh()
+        key = (meta["csv_size"], meta["csv_mtime_ns"], meta["n_parts"])
+        if self._frame is None or self._frame_key != key:
+            self._frame = self._concat(meta)
+            self._frame_key = key
+        return self._frame
+
+    def append(self, rows: pd.DataFrame):
+        """Append new sweep rows to the CSV and the cache without a rewrite."""
+        missing = set(COLUMNS).difference(rows.columns)
+        if missing:
+            raise ValueError(f"rows are missing column(s): {', '.join(sorted(missing))}")
+        self.refresh()
+        write_header = not self.csv_path.exists() or self.csv_path.stat().st_size == 0
+        if not write_header:
+            with open(self.csv_path, "rb") as fp:
+                fp.seek(-1, os.SEEK_END)
+                needs_newline = fp.read(1) != b"\n"
+        with open(self.csv_path, "a", newline="") as fp:
+            if not write_header and needs_newline:
+                fp.write("\n")
+            rows[COLUMNS].to_csv(fp, header=write_header, index=False)
+        return self.refresh()
+
+
+_STORES: Dict[Path, PerfStore] = {}
+
+
+def load_results(csv_path: Path) -> pd.DataFrame:
+    """Load a results CSV through its columnar cache."""
+    csv_path = Path(csv_path).resolve()
+    if csv_path not in _STORES:
+        _STORES[csv_path] = PerfStore(csv_path)
+    with span("perf_store.load", csv=csv_path.name):
+        return _STORES[csv_path].load()
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Build / refresh the columnar cache of a results CSV.")
+    parser.add_argument("-csv", type=Path, required=True, help="CSV file containing the experiment results.")
+    parser.add_argument("-append", type=Path, default=None, help="CSV of new sweep rows to append to -csv.")
+    parser.add_argument("-compact", action="store_true", help="Merge all cache parts into one.")
+    return parser
+
+
+def main():
+    parser = build_arg_parser()
+    args = parser.parse_args()
+
+    store = PerfStore(args.csv)
+    if args.append is not None:
+        meta = store.append(pd.read_csv(args.append, dtype=CSV_DTYPES))
+    else:
+        meta = store.refresh()
+    if args.compact:
+        meta = store.compact(meta)
+
+    print(f"Cache '{store.cache_dir}': {meta['n_rows']} rows in {meta['n_parts']} part(s).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+programl_graph.py
+
+Array-backed ProGraML graphs and the summary that goes into prompts instead
+of the raw JSON.
+
+:class:`ProgramGraph` turns the networkx node-link JSON into flat NumPy
+arrays – node type / function / opcode id per node, and edges sorted by
+source into CSR form (``indptr`` + aligned ``dst`` / ``flow`` / ``position``)
+– so no Python object per node or edge survives loading.  Every pass below is
+a handful of vectorised operations over those arrays, which keeps 100k+ node
+graphs in the tens of milliseconds.
+
+* loops    – ProGraML numbers instructions in block layout order, so a control
+             edge to an earlier instruction is a back edge; each back edge
+             spans ``[dst, src]`` and the loop depth of every instruction is
+             the number of spans covering it (one ``cumsum``),
+* memory   – loads / stores / GEPs per loop depth, element types and bytes
+             touched by the innermost loop body,
+* calls    – caller -> callee counts from call-flow edges, OpenMP runtime and
+             math-library calls.
+
+:func:`distill` assembles these into a dict and drops / shortens the least
+important sections until it fits a token budget.
+
+Example
+-------
+python programl_graph.py ../programl/3mm_kernel_p1.json
+python programl_graph.py ../programl/3mm_kernel_p1.json -max-tokens 300
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+import numpy as np
+
+INSTRUCTION, VARIABLE, CONSTANT = 0, 1, 2
+CONTROL, DATA, CALL = 0, 1, 2
+EXTERNAL = "[external]"
+
+ARITH_OPS = {"add", "sub", "mul", "udiv", "sdiv", "urem", "srem", "shl", "lshr",
+             "ashr", "and", "or", "xor", "fadd", "fsub", "fmul", "fdiv", "frem", "fneg"}
+FP_OPS = {"fadd", "fsub", "fmul", "fdiv", "frem", "fneg"}
+MATH_FUNCS = {"sin", "cos", "tan", "exp", "exp2", "log", "log2", "log10",
+              "pow", "sqrt", "tanh", "fabs", "floor", "ceil", "fmuladd", "fma"}
+SCALAR_BYTES = {"i1": 1, "i8": 1, "i16": 2, "i32": 4, "i64": 8, "half": 2,
+                "float": 4, "double": 8, "x86_fp80": 16, "fp128": 16}
+SECTION_PRIORITY = ("overview", "loops", "memory", "calls", "functions", "hot_instructions")
+
+_CALLEE = re.compile(r"@([\w.$]+)\s*\(")
+
+
+def approx_tokens(text: str) -> int:
+    """~4 characters per token; good enough when no tokenizer is at hand."""
+    return max(1, len(text) // 4)
+
+
+class ProgramGraph:
+    """ProGraML graph as flat arrays with CSR adjacency by source node."""
+
+    def __init__(self, graph: Dict[str, Any]):
+        nodes = graph.get("nodes", [])
+        links = graph.get("links", graph.get("edges", []))
+        n, m = len(nodes), len(links)
+
+        ids = np.fromiter((nd["id"] for nd in nodes), dtype=np.int64, count=n)
+        remap = None
+        if n and not np.array_equal(ids, np.arange(n)):
+            remap = np.full(int(ids.max()) + 1, -1, dtype=np.int64)
+            remap[ids] = np.arange(n)
+
+        self.n_nodes = n
+        self.node_type = np.fromiter((nd.get("type", -1) for nd in nodes), dtype=np.int8, count=n)
+        self.node_function = np.fromiter((nd.get("function", -1) for nd in nodes), dtype=np.int32, count=n)
+        self.node_block = np.fromiter((nd.get("block", -1) for nd in nodes), dtype=np.int32, count=n)
+        self.vocab, inverse = np.unique(np.array([nd.get("text", "") for nd in nodes], dtype=object),
+                                        return_inverse=True)
+        self.node_text = inverse.astype(np.int32)
+        # full_text is only needed for call instructions (callee names)
+        self.full_text = {i: nd["features"]["full_text"][0] for i, nd in enumerate(nodes)
+                          if nd.get("text") == "call" and nd.get("features", {}).get("full_text")}
+
+        src = np.fromiter((e["source"] for e in links), dtype=np.int64, count=m)
+        dst = np.fromiter((e["target"] for e in links), dtype=np.int64, count=m)
+        if remap is not None:
+            src, dst = remap[src], remap[dst]
+        flow = np.fromiter((e.get("flow", 0) for e in links), dtype=np.int8, count=m)
+        pos = np.fromiter((e.get("position", 0) for e in links), dtype=np.int32, count=m)
+
+        order = np.argsort(src, kind="stable")
+        self.src = src[order].astype(np.int32)
+        self.dst = dst[order].astype(np.int32)
+        self.flow = flow[order]
+        self.position = pos[order]
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.src, minlength=n), out=self.indptr[1:])
+
+        meta = graph.get("graph", {})
+        self.function_names = [f.get("name", f"fn{i}") if isinstance(f, dict) else str(f)
+                               for i, f in enumerate(meta.get("function", []))]
+
+    @classmethod
+    def load(cls, path: Path) -> "ProgramGraph":
+        with open(path) as fp:
+            return cls(json.load(fp))
+
+    # -- helpers ------------------------------------------------------------ #
+    def successors(self, node: int, flow: int | None = None) -> np.ndarray:
+        lo, hi = self.indptr[node], self.indptr[node + 1]
+        if flow is None:
+            return self.dst[lo:hi]
+        return self.dst[lo:hi][self.flow[lo:hi] == flow]
+
+    def opcode_mask(self, *opcodes: str) -> np.ndarray:
+        codes = np.flatnonzero(np.isin(self.vocab, list(opcodes)))
+        return (self.node_type == INSTRUCTION) & np.isin(self.node_text, codes)
+
+    def fn_name(self, idx: int) -> str:
+        return self.function_names[idx] if 0 <= idx < len(self.function_names) else f"fn{idx}"
+
+    @property
+    def instructions(self) -> np.ndarray:
+        return (self.node_type == INSTRUCTION) & (self.node_text != self._code(EXTERNAL))
+
+    def _code(self, text: str) -> int:
+        hit = np.flatnonzero(self.vocab == text)
+        return int(hit[0]) if hit.size else -1
+
+    # -- passes ------------------------------------------------------------- #
+    def back_edges(self) -> np.ndarray:
+        """Edge mask of control edges jumping back to an earlier instruction."""
+        inst = self.instructions
+        return ((self.flow == CONTROL) & inst[self.src] & inst[self.dst]
+                & (self.dst <= self.src)
+                & (self.node_function[self.src] == self.node_function[self.dst]))
+
+    def loop_depth(self) -> np.ndarray:
+        """Per-node loop nesting depth (0 outside loops, non-instructions 0)."""
+        inst = self.instructions
+        back = self.back_edges()
+        diff = np.zeros(self.n_nodes + 1, dtype=np.int32)
+        np.add.at(diff, self.dst[back], 1)
+        np.add.at(diff, self.src[back] + 1, -1)
+        depth = np.cumsum(diff[:-1])
+        depth[~inst] = 0
+        return depth
+
+    def loop_summary(self, depth: np.ndarray) -> Dict[str, Any]:
+        inst = self.instructions
+        headers = np.unique(self.dst[self.back_edges()])
+        max_depth = int(depth.max()) if depth.size else 0
+        per_depth = np.bincount(depth[inst], minlength=max_depth + 1)
+        return {"n_loops": int(headers.size),
+                "max_depth": max_depth,
+                "instructions_per_depth": per_depth.tolist(),
+                "innermost_instructions": int(per_depth[-1]) if max_depth else 0}
+
+    def memory_summary(self, depth: np.ndarray) -> Dict[str, Any]:
+        loads, stores = self.opcode_mask("load"), self.opcode_mask("store")
+        geps = self.opcode_mask("getelementptr")
+        arith = self.opcode_mask(*ARITH_OPS)
+        max_depth = int(depth.max()) if depth.size else 0
+        inner = depth == max_depth
+
+        def per_depth(mask):
+            return np.bincount(depth[mask], minlength=max_depth + 1).tolist()
+
+        # pointer operand: data edge var -> load (position 0) / var -> store (position 1)
+        data = self.flow == DATA
+        ptr_edge = data & (self.node_type[self.src] == VARIABLE) & (
+            (loads[self.dst] & (self.position == 0)) | (stores[self.dst] & (self.position == 1)))
+        ptr_edge &= inner[self.dst]
+        elem_types: Dict[str, int] = {}
+        bytes_inner = 0
+        if ptr_edge.any():
+            codes, counts = np.unique(self.node_text[self.src[ptr_edge]], return_counts=True)
+            for code, cnt in zip(codes, counts):
+                ty = str(self.vocab[code])
+                elem = ty[:-1] if ty.endswith("*") else ty
+                elem_types[elem] = elem_types.get(elem, 0) + int(cnt)
+                bytes_inner += int(cnt) * (8 if elem.endswith("*") else SCALAR_BYTES.get(elem, 0))
+
+        mem_inner = int((loads & inner).sum() + (stores & inner).sum())
+        arith_inner = int((arith & inner).sum())
+        return {"loads": int(loads.sum()),
+                "stores": int(stores.sum()),
+                "loads_per_depth": per_depth(loads),
+                "stores_per_depth": per_depth(stores),
+                "geps_innermost": int((geps & inner).sum()),
+                "innermost_element_types": elem_types,
+                "innermost_bytes_per_iter": bytes_inner,
+                "innermost_mem_per_arith": round(mem_inner / max(1, arith_inner), 3),
+                "innermost_fp_ops": int((self.opcode_mask(*FP_OPS) & inner).sum())}
+
+    def call_summary(self) -> Dict[str, Any]:
+        # call site -> callee entry only (the callee's return edge points back)
+        call = (self.flow == CALL) & self.opcode_mask("call", "invoke")[self.src]
+        fsrc = self.node_function[self.src[call]].astype(np.int64)
+        fdst = self.node_function[self.dst[call]].astype(np.int64)
+        inter = fsrc != fdst
+        edges: Dict[str, int] = {}
+        if inter.any():
+            n_fn = int(max(fsrc.max(), fdst.max())) + 1
+            pairs, counts = np.unique(fsrc[inter] * n_fn + fdst[inter], return_counts=True)
+            for pair, cnt in zip(pairs, counts):
+                a, b = divmod(int(pair), n_fn)
+                if not self.fn_name(b).startswith("llvm.dbg."):    # as call_sites / callees
+                    edges[f"{self.fn_name(a)}->{self.fn_name(b)}"] = int(cnt)
+
+        callees: Dict[str, int] = {}
+        for text in self.full_text.values():
+            m = _CALLEE.search(text)
+            if m:
+                callees[m.group(1)] = callees.get(m.group(1), 0) + 1
+        real = {k: v for k, v in callees.items() if not k.startswith("llvm.dbg.")}
+        base = lambda name: name.split(".")[1] if name.startswith("llvm.") else name  # noqa: E731
+        return {"call_sites": sum(real.values()),
+                "callees": dict(sorted(real.items(), key=lambda kv: -kv[1])),
+                "call_graph": edges,
+                "omp_runtime_calls": sum(v for k, v in real.items() if k.startswith("__kmpc")),
+                "fork_calls": real.get("__kmpc_fork_call", 0),
+                "barriers": sum(v for k, v in real.items() if k.startswith("__kmpc_barrier")),
+                "math_calls": sum(v for k, v in real.items() if base(k) in MATH_FUNCS)}
+
+    def function_summary(self, depth: np.ndarray) -> Dict[str, Any]:
+        inst = self.instructions
+        fn = self.node_function[inst]
+        if fn.size == 0:
+            return {}
+        n_fn = int(fn.max()) + 1
+        sizes = np.bincount(fn, minlength=n_fn)
+        deepest = np.zeros(n_fn, dtype=np.int64)
+        np.maximum.at(deepest, fn, depth[inst])
+        return {self.fn_name(i): {"instructions": int(sizes[i]), "loop_depth": int(deepest[i])}
+                for i in np.flatnonzero(sizes)}
+
+    def hot_instructions(self, depth: np.ndarray, top: int = 12) -> Dict[str, int]:
+        """Opcode histogram of the innermost loop body (whole graph if loop-free)."""
+        inst = self.instructions & (depth == (depth.max() if depth.size else 0))
+        codes, counts = np.unique(self.node_text[inst], return_counts=True)
+        order = np.argsort(-counts, kind="stable")[:top]
+        return {str(self.vocab[codes[i]]): int(counts[i]) for i in order}
+
+    def overview(self) -> Dict[str, Any]:
+        inst = self.instructions
+        return {"n_nodes": self.n_nodes,
+                "n_edges": int(self.src.size),
+                "n_instructions": int(inst.sum()),
+                "n_variables": int((self.node_type == VARIABLE).sum()),
+                "n_constants": int((self.node_type == CONSTANT).sum()),
+                "n_functions": int(np.unique(self.node_function[inst]).size),
+                "edges_per_flow": {name: int((self.flow == f).sum())
+                                   for f, name in ((CONTROL, "control"), (DATA, "data"), (CALL, "call"))}}
+
+    def sections(self) -> Dict[str, Any]:
+        depth = self.loop_depth()
+        return {"overview": self.overview(),
+                "loops": self.loop_summary(depth),
+                "memory": self.memory_summary(depth),
+                "calls": self.call_summary(),
+                "functions": self.function_summary(depth),
+                "hot_instructions": self.hot_instructions(depth)}
+
+
+def _shrink(value: Any) -> Any:
+    """Halve the longest list / dict inside *value*; ``None`` when nothing is left."""
+    if isinstance(value, dict):
+        if not value:
+            return None
+        key = max(value, key=lambda k: len(json.dumps(value[k])))
+        inner = value[key]
+        if isinstance(inner, (dict, list)) and len(inner) > 1:
+            out = dict(value)
+            out[key] = _shrink(inner)
+            return out
+        if len(value) > 1:
+            items = list(value.items())
+            return dict(items[:len(items) // 2])
+        return None
+    if isinstance(value, list) and len(value) > 1:
+        return value[:len(value) // 2]
+    return None
+
+
+def fit_budget(sections: Dict[str, Any], max_tokens: int,
+               count_tokens: Callable[[str], int] = approx_tokens) -> Dict[str, Any]:
+    """Largest prefix of *sections* (by ``SECTION_PRIORITY``) within *max_tokens*.
+
+    A section that does not fit is shrunk (longest list / mapping halved)
+    until it does, or dropped.  Sizes are measured on compact JSON.
+    """
+    out: Dict[str, Any] = {}
+    for name in SECTION_PRIORITY:
+        value = sections.get(name)
+        while value is not None:
+            trial = dict(out, **{name: value})
+            if count_tokens(json.dumps(trial, separators=(",", ":"))) <= max_tokens:
+                out = trial
+                break
+            value = _shrink(value)
+    return out
+
+
+def distill(graph: Dict[str, Any] | ProgramGraph, max_tokens: int | None = None,
+            count_tokens: Callable[[str], int] = approx_tokens) -> Dict[str, Any]:
+    """Prompt summary of *graph*, at most *max_tokens* if given."""
+    pg = graph if isinstance(graph, ProgramGraph) else ProgramGraph(graph)
+    sections = pg.sections()
+    return sections if max_tokens is None else fit_budget(sections, max_tokens, count_tokens)
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Distil a ProGraML JSON graph for prompting.")
+    parser.add_argument("graph", type=Path, help="ProGraML node-link JSON file.")
+    parser.add_argument("-max-tokens", type=int, default=None, help="Token budget of the summary.")
+    return parser
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    t0 = time.perf_counter()
+    pg = ProgramGraph.load(args.graph)
+    t1 = time.perf_counter()
+    summary = distill(pg, args.max_tokens)
+    t2 = time.perf_counter()
+    text = json.dumps(summary, separators=(",", ":"))
+    print(json.dumps(summary, indent=2))
+    print(f"# {pg.n_nodes} nodes / {pg.src.size} edges: load {t1 - t0:.3f}s, distil {t2 - t1:.3f}s, "
+          f"~{approx_tokens(text)} tokens (raw file {args.graph.stat().st_size} bytes)")
+
+
+if __name__ == "__main__":
+    main()
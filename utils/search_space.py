@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+search_space.py
+
+Declarative OpenMP search space shared by the seed pickers, the prompt
+generator, the tuner / evaluator and the top-config extractor.
+
+A :class:`SearchSpace` is an ordered list of typed :class:`Dimension` s and
+a list of :class:`Constraint` s:
+
+* ``kind`` is ``"int"`` or ``"categorical"``; ``None`` among the values means
+  "leave the variable unset" (runtime default).
+* ``when`` makes a dimension conditional on earlier ones, e.g. the schedule
+  chunk only exists when ``OMP_SCHEDULE`` is not ``auto``.  An inactive
+  dimension is always ``None``.
+* A constraint ``check(config, machine)`` rejects combinations; it is tested
+  as soon as all its dimensions are assigned, so :meth:`SearchSpace.grid`
+  prunes whole subtrees (thread counts above the machine's core count never
+  reach the product).
+
+``OMP_SCHEDULE_CHUNK`` is a logical knob: :func:`to_env` folds it into
+``OMP_SCHEDULE=dynamic,64`` and :func:`from_env` / :func:`split_schedule`
+split it back out.  :meth:`SearchSpace.choices` gives the plain
+``{knob: [values]}`` dict the seed prompts and the tuner have always used.
+
+Example
+-------
+python search_space.py -machine amd                       # describe + grid size
+python search_space.py -machine intel -knobs OMP_NUM_THREADS OMP_SCHEDULE OMP_SCHEDULE_CHUNK -grid
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from machines import physical_cores, resolve_machine
+
+SEED_KNOBS = ("OMP_NUM_THREADS", "OMP_PROC_BIND", "OMP_SCHEDULE")
+CHUNKED_SCHEDULES = ("static", "dynamic", "guided")
+DEFAULT_THREADS = [4, 8, 16, 24, 32, 40, 48, 64, 96, 128, 160, 192]
+
+Config = Dict[str, Any]
+
+
+@dataclass(frozen=True)
+class Dimension:
+    name: str
+    values: Tuple[Any, ...]
+    kind: str = "categorical"                 # "int" | "categorical"
+    when: Dict[str, Tuple[Any, ...]] = field(default_factory=dict)
+    env: str | None = None                    # environment variable (default: name)
+    doc: str = ""
+
+    def active(self, config: Config) -> bool:
+        return all(config.get(dep) in allowed for dep, allowed in self.when.items())
+
+    def coerce(self, value: Any) -> Any:
+        """*value* as one of :attr:`values` (``"64"`` -> ``64``, case-insensitive), else raise."""
+        if value is None or value in self.values:
+            if value is None and None not in self.values:
+                raise ValueError(f"{self.name} must be set")
+            return value
+        for v in self.values:
+            if v is not None and str(v).lower() == str(value).strip().lower():
+                return v
+        raise ValueError(f"{self.name}={value!r} not in {list(self.values)}")
+
+
+@dataclass(frozen=True)
+class Constraint:
+    name: str
+    dims: Tuple[str, ...]
+    check: Callable[[Config, Dict[str, Any] | None], bool]
+    doc: str = ""
+
+
+class SearchSpace:
+    """Typed, conditional, constrained product of OpenMP knobs."""
+
+    def __init__(self, dimensions: Sequence[Dimension], constraints: Sequence[Constraint] = (),
+                 machine: Dict[str, Any] | None = None):
+        self.dimensions = list(dimensions)
+        self.machine = machine
+        names = [d.name for d in self.dimensions]
+        for i, dim in enumerate(self.dimensions):
+            missing = [dep for dep in dim.when if dep not in names[:i]]
+            if missing:
+                raise ValueError(f"{dim.name} depends on {missing}, which must come earlier")
+        self.constraints = [c for c in constraints if set(c.dims) <= set(names)]
+        self._dims = dict(zip(names, self.dimensions))
+
+    @property
+    def names(self) -> List[str]:
+        return [d.name for d in self.dimensions]
+
+    def __getitem__(self, name: str) -> Dimension:
+        return self._dims[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._dims
+
+    # -- single configurations --------------------------------------------- #
+    def canonical(self, config: Config) -> Config:
+        """Coerced values, inactive dimensions ``None``, unset active ones defaulted.
+
+        Raises ``ValueError`` on values outside a dimension's domain.
+        """
+        out: Config = {}
+        for dim in self.dimensions:
+            if not dim.active(out):
+                out[dim.name] = None
+            elif config.get(dim.name) is None:
+                out[dim.name] = None if None in dim.values else dim.values[0]
+            else:
+                out[dim.name] = dim.coerce(config[dim.name])
+        return out
+
+    def violations(self, config: Config) -> List[str]:
+        """Why *config* is not a point of the space (empty if it is)."""
+        errors = []
+        try:
+            canon = self.canonical(config)
+        except ValueError as exc:
+            return [str(exc)]
+        for dim in self.dimensions:
+            if config.get(dim.name) is not None and canon[dim.name] is None:
+                cond = " and ".join(f"{k} in {list(v)}" for k, v in dim.when.items())
+                errors.append(f"{dim.name} only applies when {cond}")
+        errors += [c.doc or c.name for c in self.constraints if not c.check(canon, self.machine)]
+        return errors
+
+    def is_valid(self, config: Config) -> bool:
+        return not self.violations(config)
+
+    # -- enumeration ------------------------------------------------------- #
+    def grid(self) -> Iterator[Config]:
+        """Every valid configuration (depth-first, constraints pruned early)."""
+        order = self.dimensions
+        ready: Dict[int, List[Constraint]] = {}
+        for c in self.constraints:
+            ready.setdefault(max(self.names.index(d) for d in c.dims), []).append(c)
+
+        def walk(i: int, partial: Config):
+            if i == len(order):
+                yield dict(partial)
+                return
+            dim = order[i]
+            for value in (dim.values if dim.active(partial) else (None,)):
+                partial[dim.name] = value
+                if all(c.check(partial, self.machine) for c in ready.get(i, ())):
+                    yield from walk(i + 1, partial)
+            partial.pop(dim.name, None)
+
+        yield from walk(0, {})
+
+    def size(self) -> int:
+        return sum(1 for _ in self.grid())
+
+    def choices(self, knobs: Iterable[str] | None = None, include_unset: bool = False) -> Dict[str, List[Any]]:
+        """Plain ``{knob: [values]}`` (legacy ``SEARCH_SPACE`` format), constraint-pruned.
+
+        Values a unary constraint rules out (e.g. too many threads) are dropped.
+        """
+        out = {}
+        for name in (knobs or self.names):
+            dim = self._dims[name]
+            unary = [c for c in self.constraints if c.dims == (name,)]
+            out[name] = [v for v in dim.values
+                         if (include_unset or v is not None)
+                         and (v is None or all(c.check({name: v}, self.machine) for c in unary))]
+        return out
+
+    def restrict(self, knobs: Iterable[str]) -> "SearchSpace":
+        """Sub-space over *knobs* (conditions on dropped knobs are lifted)."""
+        keep = set(knobs)
+        dims = [Dimension(d.name, d.values, d.kind, {k: v for k, v in d.when.items() if k in keep},
+                          d.env, d.doc)
+                for d in self.dimensions if d.name in keep]
+        return SearchSpace(dims, self.constraints, self.machine)
+
+    def describe(self) -> Dict[str, Any]:
+        """JSON-able schema (for prompts): values, types, conditions and constraints."""
+        dims = {}
+        for name, values in self.choices(include_unset=True).items():
+            dim = self._dims[name]
+            entry: Dict[str, Any] = {"type": dim.kind, "values": [v for v in values if v is not None]}
+            if None in values:
+                entry["optional"] = True
+            if dim.when:
+                entry["only_when"] = {k: list(v) for k, v in dim.when.items()}
+            if dim.doc:
+                entry["note"] = dim.doc
+            dims[name] = entry
+        out: Dict[str, Any] = {"knobs": dims}
+        if self.constraints:
+            out["constraints"] = [c.doc or c.name for c in self.constraints]
+        return out
+
+    def to_env(self, config: Config) -> Dict[str, str]:
+        return to_env(self.canonical(config))
+
+
+def snap(value: Any, choices: List[Any]) -> Any | None:
+    """*value* if it is a choice, the nearest choice for numbers, else None."""
+    if value in choices:
+        return value
+    for c in choices:
+        if str(c).lower() == str(value).strip().lower():
+            return c
+    if all(isinstance(c, (int, float)) for c in choices):
+        try:
+            v = float(value)
+        except (TypeError, ValueError):
+            return None
+        return min(choices, key=lambda c: abs(c - v))
+    return None
+
+
+# --------------------------------------------------------------------------- #
+# environment encoding                                                        #
+# --------------------------------------------------------------------------- #
+def split_schedule(value: Any) -> Tuple[str, int | None]:
+    """``"dynamic,64"`` -> ``("dynamic", 64)``; ``"guided"`` -> ``("guided", None)``."""
+    kind, _, chunk = str(value).partition(",")
+    return kind.strip().lower(), int(chunk) if chunk.strip() else None
+
+
+def to_env(config: Config) -> Dict[str, str]:
+    """Environment variables for *config* (``None`` values left unset)."""
+    env = {}
+    for knob, value in config.items():
+        if value is None or knob == "OMP_SCHEDULE_CHUNK":
+            continue
+        if isinstance(value, bool):
+            value = "true" if value else "false"
+        env[knob] = str(value)
+    chunk = config.get("OMP_SCHEDULE_CHUNK")
+    if chunk is not None and "OMP_SCHEDULE" in env:
+        env["OMP_SCHEDULE"] = f"{split_schedule(env['OMP_SCHEDULE'])[0]},{int(chunk)}"
+    return env
+
+
+def from_env(env: Dict[str, str], knobs: Iterable[str] | None = None) -> Config:
+    """Inverse of :func:`to_env` for the knobs of a space (default: all known)."""
+    knobs = list(knobs or KNOWN_KNOBS)
+    config: Config = {k: env.get(k) for k in knobs if k != "OMP_SCHEDULE_CHUNK"}
+    if config.get("OMP_SCHEDULE") is not None:
+        config["OMP_SCHEDULE"], chunk = split_schedule(config["OMP_SCHEDULE"])
+        if "OMP_SCHEDULE_CHUNK" in knobs:
+            config["OMP_SCHEDULE_CHUNK"] = chunk
+    return config
+
+
+# --------------------------------------------------------------------------- #
+# presets                                                                     #
+# --------------------------------------------------------------------------- #
+def max_threads(machine: Dict[str, Any], smt: bool = False) -> int:
+    return physical_cores(machine) * (int(machine.get("threads_per_core", 1)) if smt else 1)
+
+
+def thread_ladder(machine: Dict[str, Any], smt: bool = False) -> List[int]:
+    """Powers of two, quarter / half / whole sockets up to the core count."""
+    top = max_threads(machine, smt)
+    per_socket = int(machine["cores_per_socket"])
+    values = {2 ** i for i in range(top.bit_length()) if 2 ** i <= top}
+    values |= {n for k in range(1, int(machine["num_sockets"]) + 1)
+               for n in (k * per_socket // 4, k * per_socket // 2, k * per_socket) if 0 < n <= top}
+    values.add(top)
+    return sorted(values)
+
+
+def threads_within_cores(smt: bool = False) -> Constraint:
+    def check(config: Config, machine: Dict[str, Any] | None) -> bool:
+        return machine is None or int(config["OMP_NUM_THREADS"]) <= max_threads(machine, smt)
+    limit = "hardware threads" if smt else "physical cores"
+    return Constraint("threads_within_cores", ("OMP_NUM_THREADS",), check,
+                      f"OMP_NUM_THREADS <= {limit} of the machine")
+
+
+def omp_dimensions(threads: Sequence[int], runtime: str = "gomp") -> List[Dimension]:
+    """All knobs we tune, in dependency order (*runtime*: ``gomp`` or ``llvm``)."""
+    dims = [
+        Dimension("OMP_NUM_THREADS", tuple(threads), "int"),
+        Dimension("OMP_PROC_BIND", ("true", "false", "close", "spread", "master")),
+        Dimension("OMP_PLACES", (None, "threads", "cores", "sockets"),
+                  when={"OMP_PROC_BIND": ("true", "close", "spread", "master")},
+                  doc="ignored when threads are not bound"),
+        Dimension("OMP_SCHEDULE", ("static", "dynamic", "guided", "auto")),
+        Dimension("OMP_SCHEDULE_CHUNK", (None, 1, 4, 16, 64, 256), "int",
+                  when={"OMP_SCHEDULE": CHUNKED_SCHEDULES}, env="OMP_SCHEDULE",
+                  doc="sent as OMP_SCHEDULE=<kind>,<chunk>"),
+        Dimension("OMP_WAIT_POLICY", (None, "active", "passive")),
+    ]
+    if runtime == "gomp":
+        dims.append(Dimension("GOMP_SPINCOUNT", (None, 0, 10000, 300000, "infinite"),
+                              when={"OMP_WAIT_POLICY": (None,)},
+                              doc="libgomp spin count; overridden by OMP_WAIT_POLICY"))
+    elif runtime == "llvm":
+        dims.append(Dimension("KMP_BLOCKTIME", (None, 0, 1, 200, "infinite"),
+                              when={"OMP_WAIT_POLICY": (None,)},
+                              doc="LLVM/Intel runtime block time (ms); overridden by OMP_WAIT_POLICY"))
+    return dims
+
+
+KNOWN_KNOBS = [d.name for d in omp_dimensions(DEFAULT_THREADS, "gomp")] + ["KMP_BLOCKTIME"]
+
+
+def omp_space(machine: Dict[str, Any] | None = None, knobs: Iterable[str] | None = None,
+              runtime: str = "gomp", smt: bool = False, **values: Sequence[Any]) -> SearchSpace:
+    """The shared space, optionally for a *machine* and a subset of *knobs*.
+
+    ``values`` override a knob's candidates, e.g. ``OMP_NUM_THREADS=[4, 8, 16]``.
+    Without explicit threads the ladder comes from the machine (else the
+    recorded sweep's thread counts).
+    """
+    threads = values.pop("OMP_NUM_THREADS", None) or \
+        (thread_ladder(machine, smt) if machine else DEFAULT_THREADS)
+    dims = []
+    for dim in omp_dimensions(threads, runtime):
+        if dim.name in values:
+            dim = Dimension(dim.name, tuple(values.pop(dim.name)), dim.kind, dim.when, dim.env, dim.doc)
+        dims.append(dim)
+    if values:
+        raise ValueError(f"unknown knob(s): {', '.join(values)}")
+    space = SearchSpace(dims, [threads_within_cores(smt)], machine)
+    return space.restrict(knobs) if knobs is not None else space
+
+
+def seed_space(machine: Dict[str, Any] | None = None, threads: Sequence[int] | None = None) -> SearchSpace:
+    """Threads / bind / schedule-kind space the seed-picker prompts are written for."""
+    return omp_space(machine, SEED_KNOBS, OMP_NUM_THREADS=threads,
+                     OMP_PROC_BIND=["true", "false", "close", "spread"],
+                     OMP_SCHEDULE=["static", "dynamic", "guided"])
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Show the shared OpenMP search space.")
+    parser.add_argument("-machine", type=str, default=None, help="Machine preset (amd/intel) or JSON descriptor.")
+    parser.add_argument("-knobs", nargs="+", default=None, help="Restrict to these knobs.")
+    parser.add_argument("-runtime", choices=["gomp", "llvm"], default="gomp")
+    parser.add_argument("-smt", action="store_true", help="Allow up to hardware threads, not physical cores.")
+    parser.add_argument("-grid", action="store_true", help="Print every valid configuration's environment.")
+    return parser
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    machine = resolve_machine(args.machine) if args.machine else None
+    space = omp_space(machine, args.knobs, args.runtime, args.smt)
+    if args.grid:
+        for config in space.grid():
+            print(json.dumps(to_env(config)))
+        return
+    print(json.dumps(space.describe(), indent=2))
+    full = 1
+    for values in space.choices(include_unset=True).values():
+        full *= len(values)
+    print(f"{space.size()} valid configuration(s) of {full} in the flat product")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+surrogate.py
+
+Surrogate cost model: predicts the runtime of any (kernel, OMP_NUM_THREADS,
+OMP_PROC_BIND, OMP_SCHEDULE) from the kernel's static IR features
+(:mod:`ir_features`, through the feature index) and the configuration, so a
+whole search space can be ranked in milliseconds without touching a node.
+
+* Training rows are the per-configuration medians of a sweep CSV (loaded via
+  ``perf_store``).  The target is log runtime relative to the kernel's own
+  mean log runtime, so kernels of very different scale share one model and
+  predictions rank configurations rather than guess absolute seconds.
+* The regressor is scikit-learn's ``HistGradientBoostingRegressor`` (CPU,
+  native categorical + missing-value support – kernels without an ``.ll``
+  simply have NaN static features).
+* :func:`leave_one_kernel_out` trains on all kernels but one (or on k-1
+  kernel folds) and reports, per held-out kernel, Spearman correlation,
+  regret of the predicted best configuration and whether the predicted
+  top-k contains a configuration within 5 % of the true best.
+
+Use it as a seed source (:meth:`SurrogateModel.seeds`) or to filter LLM
+suggestions before spending node time (:meth:`SurrogateModel.filter`).
+
+Example
+-------
+python surrogate.py -csv ../performance_data/all_results_amd.csv -ir-dir ../llvm-ir -loko -folds 10
+python surrogate.py -csv ../performance_data/all_results_amd.csv -ir-dir ../llvm-ir -save surrogate_amd.pkl
+python surrogate.py -load surrogate_amd.pkl -rank ../llvm-ir/3mm_kernel_p1.ll -top 10
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import pickle
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+try:
+    from sklearn.ensemble import HistGradientBoostingRegressor
+except ImportError:
+    HistGradientBoostingRegressor = None
+
+from machines import physical_cores, resolve_machine
+from perf_store import load_results
+
+KNOBS = ["OMP_NUM_THREADS", "OMP_PROC_BIND", "OMP_SCHEDULE"]
+TIME_COL = "Execution Time (s)"
+STATIC_KEYS = ["mem_intensity", "loop_depth", "n_loops", "flops", "bytes_accessed",
+               "vector_ratio", "atomics", "barriers", "omp_outlined_funcs", "uses_math_lib"]
+BOUND_CODES = {"compute": 0.0, "mixed": 1.0, "memory": 2.0}
+NEAR_BEST = 0.05
+
+
+def kernel_static_features(executables: Iterable[str], ir_dir: Path | None) -> Dict[str, Dict[str, Any]]:
+    """Compact IR features for every executable with ``<ir_dir>/<exe>.ll``."""
+    if ir_dir is None:
+        return {}
+    from feature_index import default_index
+
+    index = default_index()
+    irs = {exe: Path(ir_dir) / f"{exe}.ll" for exe in executables}
+    irs = {exe: p for exe, p in irs.items() if p.exists()}
+    return {exe: index.ir_features(p) for exe, p in irs.items()}
+
+
+def training_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Median runtime per (kernel, config) plus the relative log target."""
+    agg = (df.groupby(["Executable"] + KNOBS, observed=True)[TIME_COL]
+             .median().reset_index())
+    agg["Executable"] = agg["Executable"].astype(str)
+    for knob in KNOBS[1:]:
+        agg[knob] = agg[knob].astype(str)
+    log_t = np.log(agg[TIME_COL].clip(lower=1e-9))
+    agg["target"] = log_t - log_t.groupby(agg["Executable"]).transform("mean")
+    return agg
+
+
+class SurrogateModel:
+    """Gradient-boosted relative-runtime model over static + config features."""
+
+    def __init__(self, machine: Dict[str, Any] | None = None, max_iter: int = 300,
+                 learning_rate: float = 0.1, random_state: int = 0):
+        if HistGradientBoostingRegressor is None:
+            raise ImportError("SurrogateModel needs scikit-learn (pip install scikit-learn)")
+        self.machine = machine or resolve_machine("amd")
+        self.max_iter = max_iter
+        self.learning_rate = learning_rate
+        self.random_state = random_state
+        self.categories: Dict[str, List[str]] = {}
+        self.threads: List[int] = []
+        self.static_cols: List[str] = []
+        self.model = None
+
+    # -- features ----------------------------------------------------------- #
+    def _matrix(self, configs: pd.DataFrame, static: pd.DataFrame) -> np.ndarray:
+        threads = configs["OMP_NUM_THREADS"].to_numpy(dtype=float)
+        cols = [threads,
+                np.log2(threads),
+                threads / physical_cores(self.machine)]
+        for knob in KNOBS[1:]:
+            cats = self.categories[knob]
+            codes = pd.Categorical(configs[knob].astype(str), categories=cats).codes.astype(float)
+            codes[codes < 0] = np.nan
+            cols.append(codes)
+        cols.extend(static[k].to_numpy(dtype=float) for k in self.static_cols)
+        return np.column_stack(cols)
+
+    @staticmethod
+    def _static_rows(kernels: pd.Series, feats: Dict[str, Dict[str, Any]]) -> pd.DataFrame:
+        table = {exe: [float(f.get(k, np.nan)) for k in STATIC_KEYS] + [BOUND_CODES.get(f.get("bound"), np.nan)]
+                 for exe, f in feats.items()}
+        missing = [np.nan] * (len(STATIC_KEYS) + 1)
+        rows = [table.get(exe, missing) for exe in kernels]
+        return pd.DataFrame(rows, columns=STATIC_KEYS + ["bound"], index=kernels.index)
+
+    # -- training / prediction ---------------------------------------------- #
+    def fit(self, frame: pd.DataFrame, feats: Dict[str, Dict[str, Any]]) -> "SurrogateModel":
+        """*frame* from :func:`training_frame`; *feats* from :func:`kernel_static_features`."""
+        self.categories = {knob: sorted(frame[knob].astype(str).unique()) for knob in KNOBS[1:]}
+        self.threads = sorted(int(t) for t in frame["OMP_NUM_THREADS"].unique())
+        static = self._static_rows(frame["Executable"], feats)
+        # static features no training kernel has (no .ll files) carry no signal
+        self.static_cols = [c for c in static.columns if static[c].notna().any()]
+        X = self._matrix(frame, static)
+        cat_mask = np.zeros(X.shape[1], dtype=bool)
+        cat_mask[3:3 + len(KNOBS) - 1] = True
+        self.model = HistGradientBoostingRegressor(
+            max_iter=self.max_iter, learning_rate=self.learning_rate,
+            categorical_features=cat_mask, random_state=self.random_state)
+        self.model.fit(X, frame["target"].to_numpy())
+        return self
+
+    def predict(self, configs: pd.DataFrame, kernel_feats: Dict[str, Any] | None) -> np.ndarray:
+        """Predicted relative log runtime of every row of *configs* for one kernel."""
+        kernels = pd.Series(["_"] * len(configs), index=configs.index)
+        static = self._static_rows(kernels, {"_": kernel_feats} if kernel_feats else {})
+        return self.model.predict(self._matrix(configs, static))
+
+    def rank(self, kernel_feats: Dict[str, Any] | None,
+             space: Dict[str, List[Any]] | pd.DataFrame | None = None) -> pd.DataFrame:
+        """All configurations of *space* (default: the training grid), best first."""
+        configs = space if isinstance(space, pd.DataFrame) else config_grid(space or self.categories_space())
+        configs = configs.reset_index(drop=True).copy()
+        configs["predicted"] = self.predict(configs, kernel_feats)
+        configs["speedup_vs_mean"] = np.exp(-configs["predicted"])
+        return configs.sort_values("predicted", kind="stable").reset_index(drop=True)
+
+    def categories_space(self) -> Dict[str, List[Any]]:
+        return {"OMP_NUM_THREADS": self.threads, **self.categories}
+
+    def filter(self, kernel_feats: Dict[str, Any] | None, candidates: List[Dict[str, Any]],
+               keep: float = 0.5) -> List[Dict[str, Any]]:
+        """Best *keep* fraction (at least one) of *candidates*, best first."""
+        if not candidates:
+            return []
+        ranked = self.rank(kernel_feats, pd.DataFrame(candidates))
+        n = max(1, int(round(len(candidates) * keep)))
+        return ranked.head(n)[list(candidates[0])].to_dict("records")
+
+    def seeds(self, kernel_feats: Dict[str, Any] | None, per_knob: int = 3,
+              space: Dict[str, List[Any]] | None = None) -> Dict[str, List[Any]]:
+        """Seed-picker format: the first *per_knob* distinct values of each knob
+        in predicted order."""
+        ranked = self.rank(kernel_feats, space)
+        out = {}
+        for knob in KNOBS:
+            values = list(dict.fromkeys(ranked[knob].tolist()))[:per_knob]
+            out[knob] = [int(v) if knob == "OMP_NUM_THREADS" else v for v in values]
+        return out
+
+    def save(self, path: Path):
+        # plain dict, so a model trained from the CLI (__main__) loads anywhere
+        with open(path, "wb") as fp:
+            pickle.dump(dict(vars(self)), fp)
+
+    @classmethod
+    def load(cls, path: Path) -> "SurrogateModel":
+        with open(path, "rb") as fp:
+            state = pickle.load(fp)
+        model = cls.__new__(cls)
+        model.__dict__.update(state)
+        return model
+
+
+def config_grid(space: Dict[str, List[Any]]) -> pd.DataFrame:
+    """Cartesian product of *space* restricted to the model's knobs."""
+    values = [list(space[k]) for k in KNOBS]
+    return pd.DataFrame(list(itertools.product(*values)), columns=KNOBS)
+
+
+def train(csv_path: Path, ir_dir: Path | None = None, machine: Dict[str, Any] | None = None,
+          **kwargs) -> SurrogateModel:
+    frame = training_frame(load_results(csv_path))
+    feats = kernel_static_features(frame["Executable"].unique(), ir_dir)
+    return SurrogateModel(machine, **kwargs).fit(frame, feats)
+
+
+# --------------------------------------------------------------------------- #
+# Leave-one-kernel-out harness                                                #
+# --------------------------------------------------------------------------- #
+def _kernel_metrics(truth: pd.DataFrame, predicted: np.ndarray, top_k: int) -> Dict[str, float]:
+    times = truth[TIME_COL].to_numpy()
+    order = np.argsort(predicted, kind="stable")
+    best = times.min()
+    rho = pd.Series(predicted).rank().corr(pd.Series(times).rank())
+    return {"spearman": float(rho),
+            "regret_top1": float(times[order[0]] / best - 1.0),
+            f"regret_top{top_k}": float(times[order[:top_k]].min() / best - 1.0),
+            f"near_best_in_top{top_k}": bool(times[order[:top_k]].min() <= best * (1 + NEAR_BEST))}
+
+
+def leave_one_kernel_out(frame: pd.DataFrame, feats: Dict[str, Dict[str, Any]],
+                         folds: int | None = None, top_k: int = 5,
+                         machine: Dict[str, Any] | None = None, **kwargs) -> pd.DataFrame:
+    """Per-held-out-kernel metrics; *folds* < #kernels groups kernels into folds."""
+    kernels = np.array(sorted(frame["Executable"].unique()))
+    n_folds = len(kernels) if folds is None else min(folds, len(kernels))
+    rng = np.random.default_rng(0)
+    assignment = dict(zip(rng.permutation(kernels), np.arange(len(kernels)) % n_folds))
+    fold_of = frame["Executable"].map(assignment).to_numpy()
+
+    rows = []
+    for fold in range(n_folds):
+        train_rows = frame[fold_of != fold]
+        model = SurrogateModel(machine, **kwargs).fit(train_rows, feats)
+        for exe, truth in frame[fold_of == fold].groupby("Executable", sort=False):
+            pred = model.predict(truth[KNOBS], feats.get(exe))
+            rows.append({"kernel": exe, "fold": fold, **_kernel_metrics(truth, pred, top_k)})
+    return pd.DataFrame(rows)
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Train / evaluate / query the runtime surrogate model.")
+    parser.add_argument("-csv", type=Path, default=None, help="Sweep CSV to train on.")
+    parser.add_argument("-ir-dir", type=Path, default=None, help="Directory of <executable>.ll files.")
+    parser.add_argument("-machine", type=str, default="amd", help="Machine preset or JSON descriptor of the CSV.")
+    parser.add_argument("-loko", action="store_true", help="Run the leave-one-kernel-out evaluation.")
+    parser.add_argument("-folds", type=int, default=None, help="Kernel folds for -loko (default: one per kernel).")
+    parser.add_argument("-top-k", type=int, default=5, help="k for the top-k metrics.")
+    parser.add_argument("-save", type=Path, default=None, help="Pickle the trained model here.")
+    parser.add_argument("-load", type=Path, default=None, help="Load a pickled model instead of training.")
+    parser.add_argument("-rank", type=Path, default=None, help="LLVM-IR file to rank the search space for.")
+    parser.add_argument("-top", type=int, default=10, help="Rows of the ranking to print.")
+    return parser
+
+
+def main():
+    parser = build_arg_parser()
+    args = parser.parse_args()
+    if args.load is None and args.csv is None:
+        parser.error("need -csv (to train) or -load")
+    machine = resolve_machine(args.machine)
+
+    if args.loko:
+        frame = training_frame(load_results(args.csv))
+        feats = kernel_static_features(frame["Executable"].unique(), args.ir_dir)
+        t0 = time.perf_counter()
+        res = leave_one_kernel_out(frame, feats, args.folds, args.top_k, machine)
+        k = args.top_k
+        print(f"Leave-one-kernel-out over {len(res)} kernel(s) "
+              f"({res['fold'].nunique()} fold(s), {time.perf_counter() - t0:.1f}s):")
+        print(f"  Spearman rho         median {res['spearman'].median():.3f}  mean {res['spearman'].mean():.3f}")
+        print(f"  regret of top-1      median {res['regret_top1'].median():.1%}  mean {res['regret_top1'].mean():.1%}")
+        print(f"  regret of best-of-{k}  median {res[f'regret_top{k}'].median():.1%}  "
+              f"mean {res[f'regret_top{k}'].mean():.1%}")
+        print(f"  within {NEAR_BEST:.0%} in top-{k}   {res[f'near_best_in_top{k}'].mean():.1%} of kernels")
+
+    model = SurrogateModel.load(args.load) if args.load else None
+    if model is None and (args.save or args.rank):
+        t0 = time.perf_counter()
+        model = train(args.csv, args.ir_dir, machine)
+        print(f"Trained on '{args.csv}' in {time.perf_counter() - t0:.1f}s.", file=sys.stderr)
+    if args.save:
+        model.save(args.save)
+        print(f"Model written to '{args.save}'.")
+    if args.rank:
+        from feature_index import default_index
+
+        feats = default_index().ir_features(args.rank)
+        t0 = time.perf_counter()
+        ranked = model.rank(feats)
+        print(f"Ranked {len(ranked)} configuration(s) in {(time.perf_counter() - t0) * 1e3:.1f} ms:")
+        print(ranked.head(args.top).to_string(index=False))
+        print(json.dumps(model.seeds(feats)))
+
+
+if __name__ == "__main__":
+    main()
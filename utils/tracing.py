@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+tracing.py
+
+Lightweight spans and counters for finding where a tuning run's wall time
+goes (model load, feature extraction, LLM round trips, reply parsing,
+kernel runs ...).
+
+* ``with span("llm.openrouter", model=m):`` times a nested region;
+  ``@traced("name")`` does the same for a (sync or async) function.
+* ``count("llm.tokens_in", n)`` adds to a counter, both globally and on the
+  innermost open span.
+* Spans nest per thread / asyncio task (``contextvars``), so concurrent
+  requests keep their own parents.
+
+Tracing is off unless ``AATUNE_TRACE=<file>`` is set (or :func:`enable` is
+called).  While off, ``span`` returns one shared no-op object and ``count``
+returns on its first check, well under a microsecond per call site; spans
+therefore wrap whole requests / kernel runs / phases, not inner loops.
+
+Output format follows the file suffix:
+
+* ``.jsonl`` – one record per finished span (streamed), then a final
+  ``{"counters": {...}}`` line;
+* ``.json``  – Chrome trace (``chrome://tracing`` / Perfetto): complete
+  ``"X"`` events plus ``"C"`` counter tracks, written at exit.
+
+Example
+-------
+AATUNE_TRACE=run.jsonl python ../seed/batch_seeds.py --irs ../llvm-ir --backend openai
+python tracing.py -trace run.jsonl -top 15          # where did the time go?
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import atexit
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+_TRACER: "Tracer | None" = None
+_CURRENT: contextvars.ContextVar = contextvars.ContextVar("aatune_span", default=None)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "attrs", "counters", "id", "parent", "start", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.counters: Dict[str, float] = {}
+
+    def __enter__(self):
+        parent = _CURRENT.get()
+        self.parent = parent.id if parent is not None else None
+        self.id = self.tracer.next_id()
+        self._token = _CURRENT.set(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        _CURRENT.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer.record(self, end)
+        return False
+
+    def set(self, **attrs):
+        """Attach attributes known only inside the span (sizes, outcomes ...)."""
+        self.attrs.update(attrs)
+
+
+class Tracer:
+    """Collects finished spans and counter totals; see :func:`enable`."""
+
+    def __init__(self, path: Path, fmt: str | None = None):
+        self.path = Path(path)
+        self.fmt = fmt or ("jsonl" if self.path.suffix == ".jsonl" else "chrome")
+        self.pid = os.getpid()
+        self.origin = time.perf_counter_ns()
+        self.counters: Dict[str, float] = defaultdict(float)
+        self.events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._ids = 0
+        self._fp = None
+        if self.fmt == "jsonl":
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fp = open(self.path, "w", buffering=1)
+
+    def next_id(self) -> int:
+        with self._lock:
+            self._ids += 1
+            return self._ids
+
+    def _us(self, ns: int) -> float:
+        return (ns - self.origin) / 1000.0
+
+    def record(self, sp: _Span, end: int):
+        tid = threading.get_native_id()
+        if self.fmt == "jsonl":
+            rec = {"name": sp.name, "id": sp.id, "parent": sp.parent, "start_us": round(self._us(sp.start), 1),
+                   "dur_us": round((end - sp.start) / 1000.0, 1), "pid": self.pid, "tid": tid}
+            if sp.attrs:
+                rec["attrs"] = sp.attrs
+            if sp.counters:
+                rec["counters"] = sp.counters
+            line = json.dumps(rec, default=str)
+            with self._lock:
+                self._fp.write(line + "\n")
+        else:
+            args = dict(sp.attrs, **sp.counters)
+            event = {"name": sp.name, "ph": "X", "ts": self._us(sp.start), "dur": (end - sp.start) / 1000.0,
+                     "pid": self.pid, "tid": tid, "args": args}
+            with self._lock:
+                self.events.append(event)
+
+    def count(self, name: str, value: float):
+        sp = _CURRENT.get()
+        if sp is not None:
+            sp.counters[name] = sp.counters.get(name, 0) + value
+        with self._lock:
+            self.counters[name] += value
+            if self.fmt == "chrome":
+                self.events.append({"name": name, "ph": "C", "ts": self._us(time.perf_counter_ns()),
+                                    "pid": self.pid, "args": {name: self.counters[name]}})
+
+    def close(self):
+        with self._lock:
+            if self.fmt == "jsonl":
+                if self._fp is not None:
+                    self._fp.write(json.dumps({"counters": dict(self.counters)}) + "\n")
+                    self._fp.close()
+                    self._fp = None
+            else:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, "w") as fp:
+                    json.dump({"traceEvents": self.events, "displayTimeUnit": "ms",
+                               "otherData": {"counters": dict(self.counters)}}, fp, default=str)
+
+
+# --------------------------------------------------------------------------- #
+# public API                                                                  #
+# --------------------------------------------------------------------------- #
+def enable(path: Path, fmt: str | None = None) -> Tracer:
+    """Start tracing into *path* (``jsonl`` / ``chrome`` from the suffix);
+    written out by :func:`disable` or at interpreter exit."""
+    global _TRACER
+    disable()
+    _TRACER = Tracer(path, fmt)
+    return _TRACER
+
+
+def disable():
+    global _TRACER
+    tracer, _TRACER = _TRACER, None
+    if tracer is not None:
+        tracer.close()
+
+
+def enabled() -> bool:
+    return _TRACER is not None
+
+
+def span(name: str, **attrs: Any):
+    """Context manager timing a region (no-op object while tracing is off)."""
+    tracer = _TRACER
+    if tracer is None:
+        return NULL_SPAN
+    return _Span(tracer, name, attrs)
+
+
+def count(name: str, value: float = 1):
+    """Add *value* to counter *name* (and to the innermost open span)."""
+    tracer = _TRACER
+    if tracer is None or not value:
+        return
+    tracer.count(name, value)
+
+
+def traced(name: str | None = None) -> Callable:
+    """Decorator: run the (sync or async) function inside ``span(name)``."""
+    def wrap(fn):
+        label = name or fn.__qualname__
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_inner(*args, **kwargs):
+                if _TRACER is None:
+                    return await fn(*args, **kwargs)
+                with span(label):
+                    return await fn(*args, **kwargs)
+            return async_inner
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if _TRACER is None:
+                return fn(*args, **kwargs)
+            with span(label):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+atexit.register(disable)
+if os.getenv("AATUNE_TRACE"):
+    enable(Path(os.environ["AATUNE_TRACE"]))
+
+
+# --------------------------------------------------------------------------- #
+# report                                                                      #
+# --------------------------------------------------------------------------- #
+def summarise(path: Path) -> tuple:
+    """Per span name: calls, total and self time (ms); plus the counters.
+
+    Reads either output format.
+    """
+    with open(path) as fp:
+        if Path(path).suffix == ".jsonl":
+            lines = [json.loads(ln) for ln in fp if ln.strip()]
+            spans = [r for r in lines if "name" in r]
+            counters = next((r["counters"] for r in lines if "counters" in r and "name" not in r), {})
+        else:
+            trace = json.load(fp)
+            counters = trace.get("otherData", {}).get("counters", {})
+            events = sorted((e for e in trace["traceEvents"] if e["ph"] == "X"),
+                            key=lambda e: (e["tid"], e["ts"], -e["dur"]))
+            # Chrome events carry no parent ids: nest by time containment per thread
+            spans, stack = [], []
+            for i, e in enumerate(events):
+                while stack and (stack[-1]["tid"] != e["tid"]
+                                 or e["ts"] >= stack[-1]["start_us"] + stack[-1]["dur_us"]):
+                    stack.pop()
+                rec = {"name": e["name"], "id": i, "parent": stack[-1]["id"] if stack else None,
+                       "start_us": e["ts"], "dur_us": e["dur"], "tid": e["tid"]}
+                spans.append(rec)
+                stack.append(rec)
+
+    child_time: Dict[Any, float] = defaultdict(float)
+    for s in spans:
+        if s["parent"] is not None:
+            child_time[s["parent"]] += s["dur_us"]
+    stats: Dict[str, Dict[str, float]] = defaultdict(lambda: {"calls": 0, "total_ms": 0.0, "self_ms": 0.0})
+    for s in spans:
+        st = stats[s["name"]]
+        st["calls"] += 1
+        st["total_ms"] += s["dur_us"] / 1000.0
+        st["self_ms"] += (s["dur_us"] - child_time.get(s["id"], 0.0)) / 1000.0
+    return dict(stats), counters
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Summarise a trace written with AATUNE_TRACE.")
+    parser.add_argument("-trace", type=Path, required=True, help="Trace file (.jsonl or Chrome .json).")
+    parser.add_argument("-top", type=int, default=20, help="Span names to show (default: %(default)s).")
+    return parser
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    stats, counters = summarise(args.trace)
+    print(f"{'span':<36}{'calls':>8}{'total ms':>12}{'self ms':>12}")
+    for name, st in sorted(stats.items(), key=lambda kv: -kv[1]["self_ms"])[:args.top]:
+        print(f"{name:<36}{st['calls']:>8}{st['total_ms']:>12.1f}{st['self_ms']:>12.1f}")
+    if counters:
+        print()
+        for name, value in sorted(counters.items()):
+            print(f"{name:<36}{value:>12g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+transfer.py
+
+Cross-machine warm start: turn what one machine's sweep says about a kernel
+into a ranked starting subset for a machine it has never run on.
+
+1. Every recorded configuration is normalised against its machine
+   descriptor: the thread count becomes a fraction of the physical cores
+   (``48/48`` on Skylake and ``192/192`` on Genoa are both ``1.0``) and the
+   runtime becomes relative to the kernel's best configuration there.
+2. Per (bind, schedule) pair that gives a curve of relative runtime over the
+   core fraction.  A target configuration is scored by interpolating the
+   curve of its pair at the target's own core fraction (log-log, clamped at
+   the ends); pairs the source never ran (or that are missing from a top
+   subset) fall back to the mean curve of the same schedule, then of
+   everything, times ``UNSEEN_PENALTY``.
+3. With several source machines the predictions are averaged in log space.
+
+The target configurations come from ``search_space.seed_space(target)`` (the
+machine's thread ladder, or explicit ``threads``), so the result is always
+valid for the new node.  :func:`warm_start` returns the ranked subset in the
+``extract_top_configs`` JSON format (``best_<kernel>_<machine>.json``) plus
+a ``ranked`` list; :func:`transfer_seeds` gives the seed-picker /
+``TPETuner`` format.
+
+A top-config JSON (e.g. ``best_3mm_kernel_p1_amd.json``) can stand in for a
+sweep: its ``stats`` records are used when present, otherwise every
+combination of the listed values counts as equally good.
+
+Example
+-------
+python transfer.py -csv ../performance_data/all_results_amd.csv -source amd -target intel \
+    -executable 3mm_kernel_p1 -o best_3mm_kernel_p1_intel_warm.json
+python transfer.py -subset ../best_3mm_kernel_p1_amd.json -source amd -target intel -top 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import math
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from machines import physical_cores, resolve_machine
+from search_space import SEED_KNOBS, seed_space
+
+TIME_COL = "Execution Time (s)"
+PAIR = ["OMP_PROC_BIND", "OMP_SCHEDULE"]
+TOP_FRACTION = 0.10
+UNSEEN_PENALTY = math.log(1.25)   # log-runtime added for pairs the source has no curve for
+
+
+def normalise(configs: pd.DataFrame, machine: Dict[str, Any]) -> pd.DataFrame:
+    """``frac`` (threads / physical cores) and ``log_rel`` (vs the best median)
+    for a frame with one ``median`` per (threads, bind, schedule)."""
+    out = configs[list(SEED_KNOBS) + ["median"]].copy()
+    out["OMP_PROC_BIND"] = out["OMP_PROC_BIND"].astype(str).str.lower()
+    out["OMP_SCHEDULE"] = out["OMP_SCHEDULE"].astype(str).str.lower()
+    out["frac"] = out["OMP_NUM_THREADS"].astype(float) / physical_cores(machine)
+    out["log_rel"] = np.log(out["median"] / out["median"].min())
+    return out.reset_index(drop=True)
+
+
+def profile_from_runs(df: pd.DataFrame, executable: str, machine: Dict[str, Any]) -> pd.DataFrame:
+    """Normalised per-config profile of *executable* from raw sweep rows."""
+    rows = df[df["Executable"] == executable]
+    if rows.empty:
+        raise ValueError(f"No rows found for executable '{executable}'")
+    medians = rows.groupby(list(SEED_KNOBS), observed=True)[TIME_COL].median()
+    return normalise(medians.rename("median").reset_index(), machine)
+
+
+def profile_from_subset(subset: Dict[str, Any], machine: Dict[str, Any]) -> pd.DataFrame:
+    """Profile from a top-config JSON: its ``stats`` if present, else the
+    product of the listed values, all equally good."""
+    if subset.get("stats"):
+        return normalise(pd.DataFrame(subset["stats"]), machine)
+    combos = itertools.product(*(subset[k] for k in SEED_KNOBS))
+    frame = pd.DataFrame(list(combos), columns=list(SEED_KNOBS))
+    frame["median"] = 1.0
+    return normalise(frame, machine)
+
+
+def _curves(profile: pd.DataFrame, keys: List[str]) -> Dict[Any, tuple]:
+    """(log fraction, log_rel) curves per *keys* group, averaged per fraction."""
+    curves = {}
+    for key, grp in profile.groupby(keys, observed=True) if keys else [((), profile)]:
+        if len(keys) == 1:
+            key = key[0]          # a one-element list groups by 1-tuples
+        pts = grp.groupby("frac")["log_rel"].mean().sort_index()
+        curves[key] = (np.log(pts.index.to_numpy()), pts.to_numpy())
+    return curves
+
+
+def predict(profile: pd.DataFrame, configs: pd.DataFrame, machine: Dict[str, Any]) -> np.ndarray:
+    """Predicted log runtime (relative to the source's best) of *configs* on *machine*."""
+    by_pair = _curves(profile, PAIR)
+    by_sched = _curves(profile, ["OMP_SCHEDULE"])
+    overall = _curves(profile, [])[()]
+    x = np.log(configs["OMP_NUM_THREADS"].to_numpy(dtype=float) / physical_cores(machine))
+    out = np.empty(len(configs))
+    for i, (bind, sched) in enumerate(zip(configs["OMP_PROC_BIND"], configs["OMP_SCHEDULE"])):
+        if (bind, sched) in by_pair:
+            xs, ys = by_pair[(bind, sched)]
+            out[i] = np.interp(x[i], xs, ys)
+        else:
+            xs, ys = by_sched.get(sched) or overall
+            out[i] = np.interp(x[i], xs, ys) + UNSEEN_PENALTY
+    return out
+
+
+def transfer_rank(sources: Sequence[tuple], target: Dict[str, Any],
+                  threads: Sequence[int] | None = None) -> pd.DataFrame:
+    """Every seed-space configuration of *target*, best predicted first.
+
+    *sources* are ``(profile, machine)`` pairs (:func:`profile_from_runs` /
+    :func:`profile_from_subset`).
+    """
+    configs = pd.DataFrame(list(seed_space(target, threads).grid()))
+    configs = configs[list(SEED_KNOBS)]
+    scores = np.mean([predict(profile, configs, target) for profile, _ in sources], axis=0)
+    configs["predicted_rel"] = np.exp(scores)
+    configs["core_fraction"] = configs["OMP_NUM_THREADS"] / physical_cores(target)
+    return configs.sort_values(["predicted_rel", "OMP_NUM_THREADS"], ascending=[True, False],
+                               kind="stable").reset_index(drop=True)
+
+
+def warm_start(ranked: pd.DataFrame, top_fraction: float = TOP_FRACTION,
+               top: int | None = None) -> Dict[str, Any]:
+    """Best ``top`` (else ``ceil(top_fraction * n)``) configs in the
+    ``extract_top_configs`` format, plus the ``ranked`` records."""
+    n = top or max(1, math.ceil(top_fraction * len(ranked)))
+    head = ranked.head(n)
+    result: Dict[str, Any] = {
+        "OMP_NUM_THREADS": sorted(map(int, head["OMP_NUM_THREADS"].unique())),
+        "OMP_PROC_BIND": sorted(map(str, head["OMP_PROC_BIND"].unique())),
+        "OMP_SCHEDULE": sorted(map(str, head["OMP_SCHEDULE"].unique())),
+    }
+    result["ranked"] = [{"OMP_NUM_THREADS": int(r.OMP_NUM_THREADS),
+                         "OMP_PROC_BIND": str(r.OMP_PROC_BIND),
+                         "OMP_SCHEDULE": str(r.OMP_SCHEDULE),
+                         "predicted_rel": round(float(r.predicted_rel), 4),
+                         "core_fraction": round(float(r.core_fraction), 4)}
+                        for r in head.itertuples(index=False)]
+    return result
+
+
+def transfer_seeds(ranked: pd.DataFrame, per_knob: int = 3) -> Dict[str, List[Any]]:
+    """Seed-picker format: first *per_knob* distinct values of each knob in ranked order."""
+    out = {}
+    for knob in SEED_KNOBS:
+        values = list(dict.fromkeys(ranked[knob].tolist()))[:per_knob]
+        out[knob] = [int(v) if knob == "OMP_NUM_THREADS" else v for v in values]
+    return out
+
+
+def transfer_from_csv(csv_path: Path, executables: Iterable[str], source: Dict[str, Any],
+                      target: Dict[str, Any], threads: Sequence[int] | None = None) -> Dict[str, pd.DataFrame]:
+    """``{executable: ranked}`` for every requested kernel of one source sweep."""
+    from perf_store import load_results
+
+    df = load_results(csv_path)
+    return {exe: transfer_rank([(profile_from_runs(df, exe, source), source)], target, threads)
+            for exe in executables}
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Rank a new machine's configurations from another machine's data.")
+    parser.add_argument("-csv", type=Path, default=None, help="Source sweep CSV.")
+    parser.add_argument("-executable", nargs="+", default=None, help="Executables or glob patterns (with -csv).")
+    parser.add_argument("-subset", type=Path, nargs="+", default=None,
+                        help="Top-config JSON(s) from the source machine instead of a sweep.")
+    parser.add_argument("-source", type=str, nargs="+", default=["amd"],
+                        help="Source machine preset / JSON (one per -subset, or one for -csv).")
+    parser.add_argument("-target", type=str, required=True, help="Target machine preset or JSON descriptor.")
+    parser.add_argument("-threads", type=int, nargs="+", default=None, help="Target thread counts (default: ladder).")
+    parser.add_argument("-top-fraction", type=float, default=TOP_FRACTION, help="Share of the space kept.")
+    parser.add_argument("-top", type=int, default=None, help="Keep exactly this many configurations.")
+    parser.add_argument("-o", "--output_json", type=Path, default=None, help="Write the warm-start subset here.")
+    return parser
+
+
+def main():
+    parser = build_arg_parser()
+    args = parser.parse_args()
+    target = resolve_machine(args.target)
+    sources = [resolve_machine(s) for s in args.source]
+
+    if args.subset:
+        if len(sources) not in (1, len(args.subset)):
+            parser.error("give one -source, or one per -subset")
+        sources = sources * len(args.subset) if len(sources) == 1 else sources
+        profiles = []
+        for path, machine in zip(args.subset, sources):
+            with open(path) as fp:
+                profiles.append((profile_from_subset(json.load(fp), machine), machine))
+        results = {"subset": warm_start(transfer_rank(profiles, target, args.threads),
+                                        args.top_fraction, args.top)}
+    elif args.csv and args.executable:
+        from get_best_subset_of_params import resolve_executables
+        from perf_store import load_results
+
+        names = resolve_executables(load_results(args.csv)["Executable"].unique(), args.executable)
+        ranked = transfer_from_csv(args.csv, names, sources[0], target, args.threads)
+        results = {exe: warm_start(r, args.top_fraction, args.top) for exe, r in ranked.items()}
+    else:
+        parser.error("give -subset, or -csv with -executable")
+
+    out = next(iter(results.values())) if len(results) == 1 else results
+    if args.output_json:
+        args.output_json.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output_json, "w") as fp:
+            json.dump(out, fp, indent=4)
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()